@@ -13,9 +13,10 @@ config.set_main_option("sqlalchemy.url",
                        f'postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}')
 
 # Interpret the config file for Python logging.
-# This line sets up loggers basically.
+# This line sets up loggers basically. Migrations also run in process (app.cli migrate, or
+# at startup with DATABASE_MIGRATE_ON_STARTUP), keep the app's loggers enabled
 if config.config_file_name is not None:
-    fileConfig(config.config_file_name)
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -25,6 +26,19 @@ from app.models import SQLModel
 
 target_metadata = SQLModel.metadata
 
+# Expression indexes that are created by hand in their migrations. Autogenerate can't
+# compare them with the models, so it must not try to drop or recreate them.
+MANUAL_INDEXES = {
+    "ix_businesses_name_trgm",
+    "ix_businesses_name_prefix",
+}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "index" and name in MANUAL_INDEXES:
+        return False
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -49,6 +63,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -70,7 +85,8 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
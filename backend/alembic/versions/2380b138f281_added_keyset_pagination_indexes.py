@@ -0,0 +1,40 @@
+"""added keyset pagination indexes
+
+Revision ID: 2380b138f281
+Revises: ff42da5a36b7
+Create Date: 2026-10-18 11:02:47.905114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2380b138f281'
+down_revision: Union[str, None] = 'ff42da5a36b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_businesses_name_business_id', 'businesses', ['name', 'business_id']),
+    ('ix_businesses_category_id_name_business_id', 'businesses', ['category_id', 'name', 'business_id']),
+    ('ix_reviews_business_id_created_at_review_id', 'reviews', ['business_id', 'created_at', 'review_id']),
+    ('ix_reviews_created_at_review_id', 'reviews', ['created_at', 'review_id']),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY so the tables stay writable while the indexes are built,
+    # which can't happen inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,42 @@
+"""added leaderboard dirty
+
+Revision ID: 4a7c2e9b1d63
+Revises: c5d1e8a4f237
+Create Date: 2026-10-18 23:59:03.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a7c2e9b1d63'
+down_revision: Union[str, None] = 'c5d1e8a4f237'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('leaderboard_dirty',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('marked_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.category_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('category_id')
+    )
+    # Every category is rebuilt once by the first refresh, the writes made before the deploy
+    # were tracked by the refresh times dropped here
+    op.execute("INSERT INTO leaderboard_dirty (category_id, marked_at) SELECT category_id, now() FROM categories")
+    op.drop_table('leaderboard_refreshes')
+
+
+def downgrade() -> None:
+    # Empty, every leaderboard is stale to the previous refresh
+    op.create_table('leaderboard_refreshes',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('refreshed_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.category_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('category_id')
+    )
+    op.drop_table('leaderboard_dirty')
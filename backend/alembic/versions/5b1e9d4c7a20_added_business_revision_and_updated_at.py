@@ -0,0 +1,28 @@
+"""added business revision and updated_at
+
+Revision ID: 5b1e9d4c7a20
+Revises: c69d293ba82b
+Create Date: 2026-10-18 14:12:36.582914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e9d4c7a20'
+down_revision: Union[str, None] = 'c69d293ba82b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('businesses', sa.Column('revision', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('businesses', sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('businesses', 'updated_at')
+    op.drop_column('businesses', 'revision')
@@ -0,0 +1,50 @@
+"""added secondary indexes
+
+Revision ID: 7413ee99629f
+Revises: 2380b138f281
+Create Date: 2026-10-18 11:41:09.263518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7413ee99629f'
+down_revision: Union[str, None] = '2380b138f281'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# reviews.business_id, reviews.created_at and businesses.category_id are already covered as the
+# leading columns of the keyset pagination indexes, review_votes.review_id by the primary key
+INDEXES = [
+    ('ix_reviews_user_id', 'reviews', ['user_id'], False),
+    ('ix_review_votes_user_id_review_id', 'review_votes', ['user_id', 'review_id'], False),
+    ('ix_review_replies_review_id', 'review_replies', ['review_id'], True),
+    ('ix_review_replies_supervisor_id', 'review_replies', ['supervisor_id'], False),
+    ('ix_businesses_supervisor_id', 'businesses', ['supervisor_id'], False),
+]
+
+
+def upgrade() -> None:
+    # The API only ever allowed one reply per review, drop any duplicates left over from
+    # before that check so the unique index can be built
+    op.execute("""
+        DELETE FROM review_replies r
+        USING review_replies keep
+        WHERE r.review_id = keep.review_id
+          AND r.review_reply_id > keep.review_reply_id
+    """)
+
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,47 @@
+"""added votes_count to reviews
+
+Revision ID: 8d2f6a1c3e95
+Revises: 5b1e9d4c7a20
+Create Date: 2026-10-18 15:03:21.447018
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2f6a1c3e95'
+down_revision: Union[str, None] = '5b1e9d4c7a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('reviews', sa.Column('votes_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill the counts from the existing votes
+    op.execute("""
+        UPDATE reviews r
+        SET votes_count = v.votes_count
+        FROM (
+            SELECT review_id, count(*) AS votes_count
+            FROM review_votes
+            GROUP BY review_id
+        ) v
+        WHERE v.review_id = r.review_id
+    """)
+
+    # CONCURRENTLY so reviews stay writable while the index is built
+    with op.get_context().autocommit_block():
+        op.create_index('ix_reviews_business_id_votes_count_review_id', 'reviews',
+                        ['business_id', 'votes_count', 'review_id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_reviews_business_id_votes_count_review_id', table_name='reviews',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_column('reviews', 'votes_count')
@@ -0,0 +1,46 @@
+"""keyed leaderboard dirty by business
+
+Revision ID: 9d3f6b2a8e41
+Revises: 4a7c2e9b1d63
+Create Date: 2026-10-19 10:12:37.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3f6b2a8e41'
+down_revision: Union[str, None] = '4a7c2e9b1d63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_table('leaderboard_dirty')
+    op.create_table('leaderboard_dirty',
+    sa.Column('business_id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('marked_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.category_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('business_id', 'category_id')
+    )
+    # Every leaderboard is rebuilt once by the first refresh, the category marks dropped
+    # here may be pending
+    op.execute(
+        "INSERT INTO leaderboard_dirty (business_id, category_id, marked_at) "
+        "SELECT business_id, category_id, now() FROM businesses"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('leaderboard_dirty')
+    op.create_table('leaderboard_dirty',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('marked_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.category_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('category_id')
+    )
+    op.execute("INSERT INTO leaderboard_dirty (category_id, marked_at) SELECT category_id, now() FROM categories")
@@ -0,0 +1,37 @@
+"""added business sort indexes
+
+Revision ID: b47e2c9d815a
+Revises: f3a8c51d9e72
+Create Date: 2026-10-18 23:06:41.527390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b47e2c9d815a'
+down_revision: Union[str, None] = 'f3a8c51d9e72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Sorts of the business listings, over all businesses and within a category
+INDEXES = [
+    (f'ix_businesses_{prefix}{column}_business_id', [*columns, column, 'business_id'])
+    for column in ('average_rating', 'review_count', 'created_at')
+    for prefix, columns in (('', []), ('category_id_', ['category_id']))
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY so the table stays writable while the indexes are built
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(name, 'businesses', columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='businesses', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,42 @@
+"""added business daily stats
+
+Revision ID: c5d1e8a4f237
+Revises: b47e2c9d815a
+Create Date: 2026-10-18 23:48:12.640285
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d1e8a4f237'
+down_revision: Union[str, None] = 'b47e2c9d815a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Empty until `python -m app.cli backfill-rollups` runs, the writes meanwhile add their
+    # deltas and the backfill replaces them
+    op.create_table('business_daily_stats',
+    sa.Column('business_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('review_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_1_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_2_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_3_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_4_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rating_5_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('replied_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('vote_count', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['business_id'], ['businesses.business_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('business_id', 'day')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('business_daily_stats')
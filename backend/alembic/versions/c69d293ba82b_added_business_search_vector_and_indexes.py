@@ -0,0 +1,72 @@
+"""added business search vector and indexes
+
+Revision ID: c69d293ba82b
+Revises: 7413ee99629f
+Create Date: 2026-10-18 12:20:33.716042
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c69d293ba82b'
+down_revision: Union[str, None] = '7413ee99629f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The name expressions must stay identical to the ones built in app/services/search.py,
+# otherwise the planner won't match the queries to these indexes
+NAME_INDEXES = {
+    # Typo tolerant (similarity) and substring matching on the name
+    'ix_businesses_name_trgm': "USING gin (lower(name) gin_trgm_ops)",
+    # Autocomplete, lower(name) LIKE 'prefix%'
+    'ix_businesses_name_prefix': "(lower(name) text_pattern_ops)",
+}
+# Only created when pg_trgm is available. It is part of PostgreSQL's contrib, which some
+# installs leave out, the search then does without typo tolerance (see app/services/search.py)
+TRIGRAM_INDEXES = {'ix_businesses_name_trgm'}
+
+
+def upgrade() -> None:
+    trigrams = op.get_bind().execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).first() is not None
+    if trigrams:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Stored generated column, this rewrites the businesses table once
+    op.add_column('businesses', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(location, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'C')",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_businesses_search_vector', 'businesses', ['search_vector'],
+                        postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+        for name, definition in NAME_INDEXES.items():
+            if name in TRIGRAM_INDEXES and not trigrams:
+                continue
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON businesses {definition}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in reversed(list(NAME_INDEXES)):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        op.drop_index('ix_businesses_search_vector', table_name='businesses',
+                      postgresql_concurrently=True, if_exists=True)
+
+    op.drop_column('businesses', 'search_vector')
+    # pg_trgm is left installed, other objects in the database may rely on it
@@ -0,0 +1,55 @@
+"""added export timestamps and indexes
+
+The existing rows are dated from the best source there is rather than the migration time:
+a review's updated_at starts at its created_at, a vote takes the created_at of its review,
+the earliest it can have been cast. now() would have put every past vote on the migration
+day in the daily stats and their trends (see services/rollups.py), a spike that never
+happened. Only rows without a date to take it from (reviews with a NULL created_at, and
+the votes on them) are dated at migration time. New rows default to now().
+
+Revision ID: e6b3a9d27f14
+Revises: 8d2f6a1c3e95
+Create Date: 2026-10-18 19:42:08.913254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b3a9d27f14'
+down_revision: Union[str, None] = '8d2f6a1c3e95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Added empty, filled from the reviews (see above), then required
+    op.add_column('reviews', sa.Column('updated_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.add_column('review_votes', sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.execute("UPDATE reviews SET updated_at = coalesce(created_at, now())")
+    op.execute(
+        "UPDATE review_votes v SET created_at = coalesce(r.created_at, now()) "
+        "FROM reviews r WHERE r.review_id = v.review_id"
+    )
+    op.alter_column('reviews', 'updated_at', server_default=sa.text('now()'), nullable=False)
+    op.alter_column('review_votes', 'created_at', server_default=sa.text('now()'), nullable=False)
+
+    # CONCURRENTLY so the tables stay writable while the indexes are built
+    with op.get_context().autocommit_block():
+        op.create_index('ix_reviews_updated_at_review_id', 'reviews', ['updated_at', 'review_id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_businesses_updated_at_business_id', 'businesses', ['updated_at', 'business_id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_businesses_updated_at_business_id', table_name='businesses',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_reviews_updated_at_review_id', table_name='reviews',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_column('review_votes', 'created_at')
+    op.drop_column('reviews', 'updated_at')
@@ -0,0 +1,47 @@
+"""added category leaderboards
+
+Revision ID: f3a8c51d9e72
+Revises: e6b3a9d27f14
+Create Date: 2026-10-18 21:06:37.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8c51d9e72'
+down_revision: Union[str, None] = 'e6b3a9d27f14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Filled by the first leaderboard refresh after the deploy
+    op.create_table('category_leaderboards',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('business_id', sa.Integer(), nullable=False),
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('logo', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('location', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('average_rating', sa.Float(), nullable=False),
+    sa.Column('review_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.category_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('category_id', 'rank')
+    )
+    op.create_table('leaderboard_refreshes',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('refreshed_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.category_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('category_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('leaderboard_refreshes')
+    op.drop_table('category_leaderboards')
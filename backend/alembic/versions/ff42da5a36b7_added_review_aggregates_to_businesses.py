@@ -0,0 +1,65 @@
+"""added review aggregates to businesses
+
+Revision ID: ff42da5a36b7
+Revises: 027dbafe3128
+Create Date: 2026-10-18 10:30:12.418337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ff42da5a36b7'
+down_revision: Union[str, None] = '027dbafe3128'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+AGGREGATE_COLUMNS = [
+    'review_count',
+    'rating_sum',
+    'rating_1_count',
+    'rating_2_count',
+    'rating_3_count',
+    'rating_4_count',
+    'rating_5_count',
+]
+
+
+def upgrade() -> None:
+    for column in AGGREGATE_COLUMNS:
+        op.add_column('businesses', sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill the aggregates (and the average rating) from the existing reviews
+    op.execute("""
+        UPDATE businesses b
+        SET review_count = r.review_count,
+            rating_sum = r.rating_sum,
+            rating_1_count = r.rating_1_count,
+            rating_2_count = r.rating_2_count,
+            rating_3_count = r.rating_3_count,
+            rating_4_count = r.rating_4_count,
+            rating_5_count = r.rating_5_count,
+            average_rating = round(r.rating_sum::numeric / r.review_count, 1)
+        FROM (
+            SELECT business_id,
+                   count(*) AS review_count,
+                   sum(rating) AS rating_sum,
+                   count(*) FILTER (WHERE rating = 1) AS rating_1_count,
+                   count(*) FILTER (WHERE rating = 2) AS rating_2_count,
+                   count(*) FILTER (WHERE rating = 3) AS rating_3_count,
+                   count(*) FILTER (WHERE rating = 4) AS rating_4_count,
+                   count(*) FILTER (WHERE rating = 5) AS rating_5_count
+            FROM reviews
+            GROUP BY business_id
+        ) r
+        WHERE r.business_id = b.business_id
+    """)
+
+
+def downgrade() -> None:
+    for column in reversed(AGGREGATE_COLUMNS):
+        op.drop_column('businesses', column)
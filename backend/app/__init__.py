@@ -0,0 +1,4 @@
+import time
+
+# When the app package started loading, the start of a worker's cold start (see core/readiness.py)
+STARTED = time.perf_counter()
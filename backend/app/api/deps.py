@@ -1,9 +1,11 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from .. import models
-from ..schemas import UserRole
-from ..core.database import engine
+from ..schemas import TokenData, UserRole
+from ..core.database import async_engine, engine
+from ..core.principals import principal_cache
 from ..core.security import verify_access_token
 
 
@@ -15,21 +17,46 @@ def get_session():
         yield session
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
-    credentials_exception = HTTPException(
+async def get_async_session():
+    # Objects are not expired on commit, reloading them lazily afterwards would need
+    # IO outside of an await and fail on an async session
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"}
     )
-    token_data = verify_access_token(token, credentials_exception)
 
-    user = session.exec(select(models.User).where(models.User.user_id == token_data.user_id)).first()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_async_session)):
+    token_data = verify_access_token(token, credentials_exception())
+
+    # Served from the principal cache when the user was seen recently, only a miss
+    # queries the users table
+    user = principal_cache.get(token_data.user_id)
+    if user:
+        return user
+
+    generation = principal_cache.generation
+    user = (await session.exec(select(models.User).where(models.User.user_id == token_data.user_id))).first()
     if not user:
-        raise credentials_exception 
+        raise credentials_exception()
 
+    principal_cache.set(user, generation)
     return user
 
 
+def get_token_principal(token: str = Depends(oauth2_scheme)) -> TokenData:
+    """The user id and role from the token claims, without touching the database. The role
+    is the one the user had when logging in, so only use this where it doesn't grant more
+    than a regular user has (e.g. voting), and the user may have been deleted since."""
+    return verify_access_token(token, credentials_exception())
+
+
 def check_admin(user: models.User):
     if user.role != UserRole.ADMIN:
         raise HTTPException(
@@ -1,12 +1,18 @@
 from fastapi import APIRouter
 
-from .routes import businesses, users, reviews, categories, login, vote, review_replies
+from .routes import businesses, users, reviews, categories, login, vote, review_replies, monitoring, exports, imports, leaderboards, stats
 api_router = APIRouter()
 
 api_router.include_router(businesses.router)
 api_router.include_router(users.router)
 api_router.include_router(reviews.router)
 api_router.include_router(categories.router)
+api_router.include_router(leaderboards.router)
 api_router.include_router(login.router)
 api_router.include_router(vote.router)
-api_router.include_router(review_replies.router)
\ No newline at end of file
+api_router.include_router(review_replies.router)
+api_router.include_router(exports.router)
+api_router.include_router(imports.router)
+api_router.include_router(stats.router)
+api_router.include_router(monitoring.router)
+api_router.include_router(monitoring.metrics_router)
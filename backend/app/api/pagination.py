@@ -0,0 +1,100 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Callable, Literal, Sequence
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import DateTime, Float, Integer
+from sqlmodel import tuple_
+
+from .. import models
+
+# Header carrying the cursor of the next page. List endpoints keep returning plain lists
+# so existing offset-based clients are unaffected.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Page keys, each backed by a composite index with the same columns.
+# Businesses are listed by name, business_id only matters if two names ever compare equal
+BUSINESS_PAGE_KEYS = (models.Business.name, models.Business.business_id)
+# The other orders of the business listings: (keys, descending), each backed by an index on
+# the keys and one on category_id + the keys for the listings of a category
+BusinessSort = Literal["name", "rating", "reviews", "newest"]
+BUSINESS_SORTS = {
+    "name": (BUSINESS_PAGE_KEYS, False),
+    "rating": ((models.Business.average_rating, models.Business.business_id), True),
+    "reviews": ((models.Business.review_count, models.Business.business_id), True),
+    "newest": ((models.Business.created_at, models.Business.business_id), True),
+}
+# Reviews are listed newest first, review_id breaks ties between reviews created at the same time
+REVIEW_PAGE_KEYS = (models.Review.created_at, models.Review.review_id)
+# Users are listed by id, the primary key
+USER_PAGE_KEYS = (models.User.user_id,)
+# Leaderboards are listed by rank, the primary key with the category
+LEADERBOARD_PAGE_KEYS = (models.LeaderboardEntry.rank,)
+
+
+def business_sort_key(sort: BusinessSort) -> Callable[[models.Business], tuple]:
+    keys, _ = BUSINESS_SORTS[sort]
+    return lambda business: tuple(getattr(business, key.key) for key in keys)
+
+
+def review_page_key(review: models.Review):
+    return review.created_at, review.review_id
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: str, keys: Sequence[Any]) -> tuple:
+    invalid_cursor = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise invalid_cursor
+
+    if not isinstance(payload, list) or len(payload) != len(keys):
+        raise invalid_cursor
+
+    values = []
+    for key, value in zip(keys, payload):
+        if isinstance(key.type, DateTime):
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise invalid_cursor
+        elif isinstance(key.type, Integer):
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise invalid_cursor
+        elif isinstance(key.type, Float):
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise invalid_cursor
+        elif not isinstance(value, str):
+            raise invalid_cursor
+        values.append(value)
+    return tuple(values)
+
+
+def paginate(query, keys: Sequence[Any], *, cursor: str | None, offset: int, limit: int,
+             descending: bool = False):
+    """Order `query` by `keys` and page it.
+
+    With a cursor the page starts right after the row the cursor was taken from, using a
+    row comparison on the keys ((a, b) > (x, y)) that a composite index on the same columns
+    can seek to directly. Without one it falls back to offset."""
+    if cursor:
+        values = decode_cursor(cursor, keys)
+        condition = tuple_(*keys) < tuple_(*values) if descending else tuple_(*keys) > tuple_(*values)
+        query = query.where(condition)
+    else:
+        query = query.offset(offset)
+
+    return query.order_by(*[key.desc() if descending else key.asc() for key in keys]).limit(limit)
+
+
+def set_next_cursor(response: Response, rows: Sequence[Any], limit: int, key_values: Callable[[Any], Sequence[Any]]):
+    # A full page means there may be more rows after the last one
+    if rows and len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key_values(rows[-1]))
@@ -1,145 +1,145 @@
-from fastapi import Depends, HTTPException, status, APIRouter
-from sqlmodel import Session, select
+from typing import Annotated
+from fastapi import Depends, HTTPException, Query, Response, status, APIRouter
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ... import models, schemas
-from sqlalchemy import func
 
 from ...api.deps import (
-    get_session,
+    get_async_session,
     get_current_user
 )
+from ...core.cache import CachedRoute, cached, response_cache
+from ...api.conditional import business_revision_headers
+from ...api.pagination import BUSINESS_SORTS, BusinessSort, business_sort_key, paginate, set_next_cursor
+from ...services import search as search_service
+from ...services.leaderboards import mark_leaderboards_stale
+from ...services.revisions import bump_business_revisions
+from ...services.listings import (
+    business_listing_filters,
+    business_listing_page,
+    get_business_with_review_count,
+    to_business_with_review_count
+)
 
 router = APIRouter(
     prefix="/businesses",
-    tags=["Businesses"]
+    tags=["Businesses"],
+    route_class=CachedRoute
 )
 
+# Fields of a business its category leaderboard shows
+LEADERBOARD_FIELDS = {"name", "logo", "location", "category_id"}
 
 
+# List businesses, by name unless another sort is asked for
 @router.get("/", response_model=list[schemas.BusinessWithReviewCount])
-def get_businesses(session: Session = Depends(get_session),
+async def get_businesses(response: Response,
+                   session: AsyncSession = Depends(get_async_session),
                    offset: int = 0,
                    limit: int = 100,
-                   search: str | None = ""):
-    query = select(models.Business)
-
+                   search: str | None = "",
+                   sort: BusinessSort = "name",
+                   category_id: int | None = None,
+                   min_rating: Annotated[float | None, Query(ge=0, le=5)] = None,
+                   has_website: bool | None = None,
+                   cursor: str | None = None):
     if search:
-        query = query.where(func.lower(models.Business.name).contains(search.lower()))
+        # Ranked like /businesses/search/, the best matches first whatever the sort, a page at
+        # a time by offset
+        return await session.run_sync(search_service.search_businesses, search, category_id=category_id,
+                                      min_rating=min_rating, has_website=has_website, offset=offset, limit=limit)
 
-    businesses = session.exec(query.limit(limit).offset(offset)).all()
-    
-    # Create response with review count for each business
-    result = []
-    for business in businesses:
-        review_count = session.exec(
-            select(func.count(models.Review.review_id))
-            .where(models.Review.business_id == business.business_id)
-        ).first() or 0
-        
-        result.append({
-            "business": business,
-            "reviews_count": review_count
-        })
-    
-    return result
+    filters = business_listing_filters(category_id=category_id, min_rating=min_rating, has_website=has_website)
+
+    # Businesses and their review counts come back from a single query
+    keys, descending = BUSINESS_SORTS[sort]
+    page = paginate(select(models.Business).where(*filters), keys, cursor=cursor, offset=offset, limit=limit,
+                    descending=descending)
+    businesses = (await session.exec(business_listing_page(page, keys, descending))).all()
+
+    set_next_cursor(response, businesses, limit, business_sort_key(sort))
+    return to_business_with_review_count(businesses)
 
 
 # Get businesses by category
 @router.get("/category/{category_id}", response_model=list[schemas.BusinessWithReviewCount])
-def get_businesses_by_category(
+async def get_businesses_by_category(
     category_id: int,
-    session: Session = Depends(get_session),
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    sort: BusinessSort = "name",
+    min_rating: Annotated[float | None, Query(ge=0, le=5)] = None,
+    has_website: bool | None = None,
+    cursor: str | None = None
 ):
     # Check if category exists
-    category = session.get(models.Category, category_id)
+    category = await session.get(models.Category, category_id)
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
     
-    # Get businesses by category
-    businesses = session.exec(
-        select(models.Business)
-        .where(models.Business.category_id == category_id)
-        .limit(limit)
-        .offset(offset)
-    ).all()
-    
-    # Create response with review count for each business
-    result = []
-    for business in businesses:
-        review_count = session.exec(
-            select(func.count(models.Review.review_id))
-            .where(models.Review.business_id == business.business_id)
-        ).first() or 0
-        
-        result.append({
-            "business": business,
-            "reviews_count": review_count
-        })
-    
-    return result
+    # Get businesses by category along with their review counts
+    filters = business_listing_filters(category_id=category_id, min_rating=min_rating, has_website=has_website)
+    keys, descending = BUSINESS_SORTS[sort]
+    page = paginate(select(models.Business).where(*filters), keys, cursor=cursor, offset=offset, limit=limit,
+                    descending=descending)
+    businesses = (await session.exec(business_listing_page(page, keys, descending))).all()
+
+    set_next_cursor(response, businesses, limit, business_sort_key(sort))
+    return to_business_with_review_count(businesses)
 
 # Get an individual business
-@router.get("/{business_id}", response_model=schemas.BusinessWithReviewCount)
-def get_business(business_id: int, session: Session = Depends(get_session)):
-    business = session.get(models.Business, business_id) 
-    if not business:
+@router.get("/{business_id}", response_model=schemas.BusinessWithReviewCount,
+            dependencies=[Depends(business_revision_headers)])
+@cached("business:{business_id}", "categories")
+async def get_business(business_id: int, session: AsyncSession = Depends(get_async_session)):
+    result = await session.run_sync(get_business_with_review_count, business_id)
+    if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Business not found")
     
-    # Get review count for the business
-    review_count = session.exec(
-        select(func.count(models.Review.review_id))
-        .where(models.Review.business_id == business.business_id)
-    ).first() or 0
-    
-    # Create response with business and review count
-    result = {
-        "business": business,
-        "reviews_count": review_count
-    }
-    
     return result
 
 # Create a business
 @router.post("/", response_model=schemas.BusinessWithReviewCount, status_code=status.HTTP_201_CREATED)
-def create_business(business: schemas.BusinessCreate, session: Session = Depends(get_session),
+async def create_business(business: schemas.BusinessCreate, session: AsyncSession = Depends(get_async_session),
                     current_user: models.User = Depends(get_current_user)):
 
     # Check if the category exists
-    db_category = session.get(models.Category, business.category_id)  
+    db_category = await session.get(models.Category, business.category_id)  
     if not db_category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
     
     db_business = models.Business(**business.model_dump())
     session.add(db_business)
-    session.commit()
-    session.refresh(db_business)
-    
-    # New business has no reviews yet
-    result = {
-        "business": db_business,
-        "reviews_count": 0
-    }
+    await session.flush()
+    await session.run_sync(mark_leaderboards_stale, [db_business.business_id])
+    await session.commit()
     
-    return result
+    # Reload the business with its category, a new business has no reviews yet
+    return await session.run_sync(get_business_with_review_count, db_business.business_id)
 
 # Delete a business
 @router.delete("/{business_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_business(business_id: int, session: Session = Depends(get_session),
+async def delete_business(business_id: int, session: AsyncSession = Depends(get_async_session),
                     current_user: models.User = Depends(get_current_user)):
     
-    business = session.get(models.Business, business_id)
+    # Locked, its mark is only written by the transactions holding it
+    business = await session.get(models.Business, business_id, with_for_update=True)
     if not business:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Business not found")
-    session.delete(business)
-    session.commit()
+    # Marked in its category while it's still there
+    await session.run_sync(mark_leaderboards_stale, [business_id])
+    await session.delete(business)
+    await session.commit()
+    await response_cache.invalidate(f"business:{business_id}", f"reviews:{business_id}")
 
 # Update a business
 @router.patch("/{business_id}", response_model=schemas.BusinessWithReviewCount)
-def update_business(business_id: int, business: schemas.BusinessUpdate, session: Session = Depends(get_session),
+async def update_business(business_id: int, business: schemas.BusinessUpdate, session: AsyncSession = Depends(get_async_session),
                     current_user: models.User = Depends(get_current_user)):
-    db_business = session.get(models.Business, business_id)
+    db_business = await session.get(models.Business, business_id, with_for_update=True)
     if not db_business:
         raise HTTPException(status_code=404, detail="Business not found")
     
@@ -147,47 +147,43 @@ def update_business(business_id: int, business: schemas.BusinessUpdate, session:
 
     # Check if category_id is present in the request body
     if "category_id" in business_data:
-        db_category = session.get(models.Category, business.category_id)  
+        db_category = await session.get(models.Category, business.category_id)  
         if not db_category:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
    
+    # Both leaderboards when it moves to another category: marked before and after
+    if LEADERBOARD_FIELDS & business_data.keys():
+        await session.run_sync(mark_leaderboards_stale, [business_id])
     db_business.sqlmodel_update(business_data)
     session.add(db_business)
-    session.commit()
-    session.refresh(db_business)
-    
-    # Get review count for the business
-    review_count = session.exec(
-        select(func.count(models.Review.review_id))
-        .where(models.Review.business_id == db_business.business_id)
-    ).first() or 0
-    
-    # Create response with business and review count
-    result = {
-        "business": db_business,
-        "reviews_count": review_count
-    }
+    if "category_id" in business_data:
+        await session.flush()
+        await session.run_sync(mark_leaderboards_stale, [business_id])
+    await session.run_sync(bump_business_revisions, models.Business.business_id == business_id)
+    await session.commit()
+    await response_cache.invalidate(f"business:{business_id}")
     
-    return result
+    # Reload the business with its review count
+    return await session.run_sync(get_business_with_review_count, db_business.business_id)
 
-# Search for businesses by name
+# Search for businesses by name, location, description or category, best matches first
 @router.get("/search/", response_model=list[schemas.BusinessWithReviewCount])
-def search_businesses(name: str, session: Session = Depends(get_session)):
-    businesses = session.exec(select(models.Business).where(models.Business.name.contains(name))).all()
-    if not businesses:
+async def search_businesses(name: str,
+                      session: AsyncSession = Depends(get_async_session),
+                      category_id: int | None = None,
+                      min_rating: Annotated[float | None, Query(ge=0, le=5)] = None,
+                      offset: int = 0,
+                      limit: Annotated[int, Query(le=100)] = 20):
+    result = await session.run_sync(search_service.search_businesses, name, category_id=category_id,
+                                    min_rating=min_rating, offset=offset, limit=limit)
+    if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No businesses found")
     
-    # Create response with review count for each business
-    result = []
-    for business in businesses:
-        review_count = session.exec(
-            select(func.count(models.Review.review_id))
-            .where(models.Review.business_id == business.business_id)
-        ).first() or 0
-        
-        result.append({
-            "business": business,
-            "reviews_count": review_count
-        })
-    
-    return result
\ No newline at end of file
+    return result
+
+# Suggest businesses while the user is typing
+@router.get("/autocomplete/", response_model=list[schemas.BusinessSuggestion])
+async def autocomplete_businesses(q: str,
+                            session: AsyncSession = Depends(get_async_session),
+                            limit: Annotated[int, Query(le=20)] = 10):
+    return await session.run_sync(search_service.autocomplete_businesses, q, limit=limit)
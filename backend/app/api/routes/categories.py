@@ -1,10 +1,13 @@
 from typing import Annotated
 from fastapi import APIRouter, Depends, Query, status, HTTPException
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ... import models, schemas
+from ...core.cache import CachedRoute, cached, response_cache
+from ...services.revisions import bump_business_revisions
 from ...api.deps import (
-    get_session,
+    get_async_session,
     get_current_user,
     check_admin
 )
@@ -12,37 +15,40 @@ from ...api.deps import (
 
 router = APIRouter(
     prefix="/categories",
-    tags=["Categories"]
+    tags=["Categories"],
+    route_class=CachedRoute
 )
 
 # Create category
 @router.post("/", response_model=schemas.CategoryPublic, status_code=status.HTTP_201_CREATED)
-def create_category(category: schemas.CategoryCreate, session: Session = Depends(get_session),
+async def create_category(category: schemas.CategoryCreate, session: AsyncSession = Depends(get_async_session),
                 current_user: models.User = Depends(get_current_user)):
     new_category = models.Category(**category.model_dump())
     session.add(new_category)
-    session.commit()
-    session.refresh(new_category)
+    await session.commit()
+    await session.refresh(new_category)
+    await response_cache.invalidate("categories")
     return new_category
 
 # Get all categories
 @router.get("/", response_model=list[schemas.CategoryPublic])
-def get_categories(session: Session = Depends(get_session),
+@cached("categories")
+async def get_categories(session: AsyncSession = Depends(get_async_session),
                     offset: int = 0,
                     limit: Annotated[int, Query(le=100)] = 100):
-    categories = session.exec(select(models.Category).offset(offset).limit(limit)).all()
+    categories = (await session.exec(select(models.Category).offset(offset).limit(limit))).all()
     return categories
 
 # Update a category
 @router.patch("/{category_id}", response_model=schemas.CategoryPublic)
-def update_category(
+async def update_category(
     category_id: int,
     category_update: schemas.CategoryUpdate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
 ):
     check_admin(current_user)
-    db_category = session.get(models.Category, category_id)
+    db_category = await session.get(models.Category, category_id)
     if not db_category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
     
@@ -51,22 +57,26 @@ def update_category(
         setattr(db_category, key, value)
     
     session.add(db_category)
-    session.commit()
-    session.refresh(db_category)
+    # Businesses are shown with their category
+    await session.run_sync(bump_business_revisions, models.Business.category_id == category_id)
+    await session.commit()
+    await session.refresh(db_category)
+    await response_cache.invalidate("categories")
     return db_category
 
 # Delete a category
 @router.delete("/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_category(
+async def delete_category(
     category_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
 ):
     check_admin(current_user)
-    category = session.get(models.Category, category_id)
+    category = await session.get(models.Category, category_id)
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
     
-    session.delete(category)
-    session.commit()
+    await session.delete(category)
+    await session.commit()
+    await response_cache.invalidate("categories")
     return None
\ No newline at end of file
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from ...api.deps import check_admin, get_current_user
+from ... import models
+from ...core.config import settings
+from ...services.exports import EXPORTS, MEDIA_TYPES, ExportFilters, ExportFormat, ExportName, stream_export
+
+router = APIRouter(
+    prefix="/exports",
+    tags=["Exports"]
+)
+
+
+# Stream a whole table (admin only), ordered by id. Filters: business_id (not for users),
+# created_from / created_to, updated_since (reviews and businesses), after_id (and
+# after_user_id for the votes) to resume
+@router.get("/{name}")
+async def export_table(
+    name: ExportName,
+    format: ExportFormat = "ndjson",
+    business_id: int | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    updated_since: datetime | None = None,
+    after_id: int | None = None,
+    after_user_id: int | None = None,
+    current_user: models.User = Depends(get_current_user)
+):
+    check_admin(current_user)
+    export = EXPORTS[name]
+    filters = ExportFilters(business_id=business_id, created_from=created_from, created_to=created_to,
+                            updated_since=updated_since, after_id=after_id, after_user_id=after_user_id)
+    statement = export.statement(filters)
+
+    return StreamingResponse(
+        stream_export(export, statement, format, settings.export_batch_size),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'},
+    )
@@ -0,0 +1,50 @@
+import io
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session
+
+from ...api.deps import check_admin, get_current_user
+from ... import models, schemas
+from ...core.cache import response_cache
+from ...core.database import engine
+from ...services.imports import ImportFormat, ImportKind, import_file, import_format
+
+router = APIRouter(
+    prefix="/imports",
+    tags=["Imports"]
+)
+
+
+def run_import(kind: ImportKind, file, format: ImportFormat):
+    # COPY needs the psycopg2 engine, the import runs in the threadpool
+    with Session(engine) as session:
+        return import_file(session, kind, io.TextIOWrapper(file, encoding="utf-8-sig", newline=""), format)
+
+
+# Bulk import of businesses or reviews from a CSV or NDJSON file (admin only). Invalid
+# rows are listed in the report, the others are imported
+@router.post("/{kind}", response_model=schemas.ImportReport)
+async def import_rows(
+    kind: ImportKind,
+    file: UploadFile,
+    format: ImportFormat | None = None,
+    current_user: models.User = Depends(get_current_user)
+):
+    check_admin(current_user)
+    format = format or import_format(file.filename)
+    if format is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unknown file format, name the file .csv or .ndjson or pass format="
+        )
+
+    try:
+        result = await run_in_threadpool(run_import, kind, file.file, format)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The file isn't UTF-8 text")
+
+    await response_cache.invalidate(
+        *(f"{tag}:{business_id}" for business_id in result.business_ids for tag in ("business", "reviews"))
+    )
+    return result.report()
@@ -0,0 +1,44 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends, Query, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ... import models, schemas
+from ...api.deps import get_async_session
+from ...api.pagination import LEADERBOARD_PAGE_KEYS, paginate, set_next_cursor
+from ...core.cache import CachedRoute, cached
+
+router = APIRouter(
+    prefix="/leaderboards",
+    tags=["Leaderboards"],
+    route_class=CachedRoute
+)
+
+
+# Podium of every category, the first `top` businesses of each
+@router.get("/", response_model=list[schemas.LeaderboardEntryPublic])
+@cached("leaderboards")
+async def get_leaderboards(session: AsyncSession = Depends(get_async_session),
+                           top: Annotated[int, Query(ge=1, le=10)] = 3):
+    entries = (await session.exec(
+        select(models.LeaderboardEntry)
+        .where(models.LeaderboardEntry.rank <= top)
+        .order_by(models.LeaderboardEntry.category_id, models.LeaderboardEntry.rank)
+    )).all()
+    return entries
+
+# Best businesses of a category, by rank. Empty until the category has ranked businesses
+@router.get("/{category_id}", response_model=list[schemas.LeaderboardEntryPublic])
+@cached("leaderboard:{category_id}")
+async def get_category_leaderboard(category_id: int,
+                                   response: Response,
+                                   session: AsyncSession = Depends(get_async_session),
+                                   offset: int = 0,
+                                   limit: Annotated[int, Query(le=100)] = 20,
+                                   cursor: str | None = None):
+    query = select(models.LeaderboardEntry).where(models.LeaderboardEntry.category_id == category_id)
+    entries = (await session.exec(
+        paginate(query, LEADERBOARD_PAGE_KEYS, cursor=cursor, offset=offset, limit=limit)
+    )).all()
+    set_next_cursor(response, entries, limit, lambda entry: (entry.rank,))
+    return entries
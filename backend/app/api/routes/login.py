@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ...core import security
+from ...core.passwords import password_pool
 from ... import models, schemas
 from ...api.deps import (
-    get_session
+    get_async_session
 )
 
 
@@ -15,13 +17,23 @@ router = APIRouter(
 )
 
 @router.post('/login', response_model = schemas.Token)
-def login(user_credentials: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)):
-    user = session.exec(select(models.User).where(models.User.email == user_credentials.username)).first()
+async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), session: AsyncSession = Depends(get_async_session)):
+    user = (await session.exec(select(models.User).where(models.User.email == user_credentials.username))).first()
     if not user:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Email or Password is wrong")
     
-    if not security.verify_password(user_credentials.password, user.password):
+    # bcrypt is slow on purpose, it runs in the password pool. End the transaction first so
+    # the connection goes back to the pool for the time of the hash
+    await session.commit()
+    verified, new_hash = await password_pool.verify_and_update(user_credentials.password, user.password)
+    if not verified:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Email or Password is wrong")
+
+    # Hashed with an outdated cost, store it again with the current one
+    if new_hash:
+        user.password = new_hash
+        session.add(user)
+        await session.commit()
     
     access_token = security.create_access_token(data = {
         "user_id": user.user_id,
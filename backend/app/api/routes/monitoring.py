@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Response, status
+from fastapi.responses import PlainTextResponse
+
+from ...core.cache import response_cache
+from ...core.database import pool_metrics
+from ...core.metrics import render_metrics
+from ...core.passwords import password_pool
+from ...core.principals import principal_cache
+from ...core.readiness import readiness
+from ...core.security import token_cache
+
+router = APIRouter(
+    prefix="/monitoring",
+    tags=["Monitoring"]
+)
+
+# Served at /metrics, where Prometheus scrapes by default
+metrics_router = APIRouter(
+    tags=["Monitoring"]
+)
+
+
+# Metrics of this worker in the Prometheus text format: request latencies and SQL
+# statements per route, in-flight requests, threadpool, connection pool, caches and
+# password hashing
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# Readiness of this worker: schema checked, pool connected and caches primed. 503 until
+# then, so a load balancer only routes to warm workers
+@router.get("/ready")
+async def get_readiness(response: Response):
+    if not readiness.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return readiness.status()
+
+
+# Connection pool usage of this worker. It doesn't touch the database, so it still
+# answers when every connection is checked out
+@router.get("/pool")
+async def get_pool_metrics():
+    return pool_metrics()
+
+
+# Response cache hits and misses of this worker, per route
+@router.get("/cache")
+async def get_cache_metrics():
+    return response_cache.metrics()
+
+
+# Users served from the principal cache instead of the users table, in this worker
+@router.get("/principals")
+async def get_principal_metrics():
+    return principal_cache.metrics()
+
+
+# Verified tokens served from the token cache in this worker
+@router.get("/tokens")
+async def get_token_metrics():
+    return token_cache.metrics()
+
+
+# Password hashes running and waiting in this worker, and requests turned away
+@router.get("/passwords")
+async def get_password_metrics():
+    return password_pool.metrics()
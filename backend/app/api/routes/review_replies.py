@@ -1,26 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select, and_
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.orm import joinedload
+from sqlmodel import select, and_
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ... import models, schemas
 from ...api.deps import (
-    get_session,
+    get_async_session,
     get_current_user
 )
+from ...core.cache import CachedRoute, cached, response_cache
+from ...api.conditional import business_revision_headers
+from ...api.pagination import REVIEW_PAGE_KEYS, paginate, review_page_key, set_next_cursor
 from ...schemas import UserRole
+from ...services.revisions import bump_business_revisions
+from ...services.rollups import apply_reply_stats
 
 router = APIRouter(
     prefix="/review-replies",
-    tags=["Review Replies"]
+    tags=["Review Replies"],
+    route_class=CachedRoute
 )
 
 
 # Get reviews for a supervisor's business
 @router.get("/supervisor/reviews", response_model=list[schemas.ReviewPublic])
-def get_supervisor_reviews(
-    session: Session = Depends(get_session),
+async def get_supervisor_reviews(
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user),
     offset: int = 0,
-    limit: int = 20
+    limit: int = 20,
+    cursor: str | None = None
 ):
     # Check if user is a supervisor
     if current_user.role != UserRole.SUPERVISOR:
@@ -30,10 +40,10 @@ def get_supervisor_reviews(
         )
     
     # Find businesses where this user is a supervisor
-    business = session.exec(
+    business = (await session.exec(
         select(models.Business)
         .where(models.Business.supervisor_id == current_user.user_id)
-    ).first()
+    )).first()
     
     if not business:
         raise HTTPException(
@@ -42,95 +52,62 @@ def get_supervisor_reviews(
         )
     
     # Get reviews for the supervisor's business
-    reviews = session.exec(
-        select(models.Review)
-        .where(models.Review.business_id == business.business_id)
-        .order_by(models.Review.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-    ).all()
+    reviews = (await session.exec(
+        paginate(select(models.Review)
+                 .where(models.Review.business_id == business.business_id)
+                 .options(joinedload(models.Review.reviewer)),
+                 REVIEW_PAGE_KEYS, cursor=cursor, offset=offset, limit=limit, descending=True)
+    )).all()
     
+    set_next_cursor(response, reviews, limit, review_page_key)
     return reviews
 
 
 # Get reviews with their replies for a specific business
-@router.get("/business/{business_id}", response_model=list[dict])
-def get_reviews_with_replies(
+@router.get("/business/{business_id}", response_model=list[schemas.ReviewWithReply],
+            dependencies=[Depends(business_revision_headers)])
+@cached("reviews:{business_id}", "users")
+async def get_reviews_with_replies(
     business_id: int,
-    session: Session = Depends(get_session),
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
     offset: int = 0,
-    limit: int = 20
+    limit: int = 20,
+    cursor: str | None = None
 ):
     # Check if business exists
-    business = session.get(models.Business, business_id)
+    business = await session.get(models.Business, business_id)
     if not business:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Business not found"
         )
     
-    # Get reviews for the business
-    reviews = session.exec(
-        select(models.Review)
+    # Reviews, reviewers, replies and the replying supervisors all come back in one query
+    reviews_query = (
+        select(models.Review, models.Review.votes_count)
         .where(models.Review.business_id == business_id)
-        .order_by(models.Review.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-    ).all()
-    
-    result = []
-    for review in reviews:
-        # Get the reply for this review if it exists
-        reply = session.exec(
-            select(models.ReviewReply)
-            .where(models.ReviewReply.review_id == review.review_id)
-        ).first()
-        
-        # Get reviewer information
-        reviewer = session.get(models.User, review.user_id)
-        
-        # Get vote count for this review
-        vote_count = session.exec(
-            select(models.ReviewVote)
-            .where(models.ReviewVote.review_id == review.review_id)
-        ).all()
-        
-        # Create response object
-        review_data = {
-            "review": {
-                "review_id": review.review_id,
-                "rating": review.rating,
-                "review_title": review.review_title,
-                "review_text": review.review_text,
-                "user_id": review.user_id,
-                "created_at": review.created_at,
-                "reviewer": {
-                    "username": reviewer.username,
-                    "email": reviewer.email,
-                    "role": reviewer.role
-                } if reviewer else None
-            },
-            "reply": None,
-            "votes_count": len(vote_count)
-        }
-        
-        # Add reply data if it exists
-        if reply:
-            supervisor = session.get(models.User, reply.supervisor_id)
-            review_data["reply"] = {
-                "review_reply_id": reply.review_reply_id,
-                "reply_text": reply.reply_text,
-                "created_at": reply.created_at,
-                "supervisor": {
-                    "username": supervisor.username,
-                    "email": supervisor.email,
-                    "role": supervisor.role
-                } if supervisor else None
-            }
-        
-        result.append(review_data)
+        .options(
+            joinedload(models.Review.reviewer),
+            joinedload(models.Review.reply).joinedload(models.ReviewReply.supervisor)
+        )
+    )
+    reviews = (await session.exec(
+        paginate(reviews_query, REVIEW_PAGE_KEYS, cursor=cursor, offset=offset, limit=limit, descending=True)
+    )).all()
     
-    return result
+    set_next_cursor(response, reviews, limit, lambda row: review_page_key(row.Review))
+    return [
+        {"review": review, "reply": review.reply, "votes_count": votes_count}
+        for review, votes_count in reviews
+    ]
+
+
+async def touch_reply_business(session: AsyncSession, reply: models.ReviewReply) -> int:
+    # Bump the revision of the business whose page shows the reply, returns its id
+    review = await session.get(models.Review, reply.review_id)
+    await session.run_sync(bump_business_revisions, models.Business.business_id == review.business_id)
+    return review.business_id
 
 
 # Create a schema for review reply creation
@@ -140,10 +117,10 @@ class ReviewReplyCreate(schemas.SQLModel):
 
 # Add a reply to a review
 @router.post("/reviews/{review_id}", response_model=dict)
-def add_review_reply(
+async def add_review_reply(
     review_id: int,
     reply: ReviewReplyCreate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
 ):
     # Check if user is a supervisor
@@ -154,7 +131,7 @@ def add_review_reply(
         )
     
     # Check if review exists
-    review = session.get(models.Review, review_id)
+    review = await session.get(models.Review, review_id)
     if not review:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -162,7 +139,7 @@ def add_review_reply(
         )
     
     # Check if supervisor is assigned to the business that owns this review
-    business = session.get(models.Business, review.business_id)
+    business = await session.get(models.Business, review.business_id)
     if not business or business.supervisor_id != current_user.user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -170,10 +147,10 @@ def add_review_reply(
         )
     
     # Check if a reply already exists
-    existing_reply = session.exec(
+    existing_reply = (await session.exec(
         select(models.ReviewReply)
         .where(models.ReviewReply.review_id == review_id)
-    ).first()
+    )).first()
     
     if existing_reply:
         raise HTTPException(
@@ -189,11 +166,14 @@ def add_review_reply(
     )
     
     session.add(db_reply)
-    session.commit()
-    session.refresh(db_reply)
+    await session.run_sync(bump_business_revisions, models.Business.business_id == review.business_id)
+    await session.run_sync(apply_reply_stats, review, 1)
+    await session.commit()
+    await session.refresh(db_reply)
+    await response_cache.invalidate(f"reviews:{review.business_id}")
     
     # Get supervisor info
-    supervisor = session.get(models.User, current_user.user_id)
+    supervisor = await session.get(models.User, current_user.user_id)
     
     # Return the reply with supervisor info
     return {
@@ -211,10 +191,10 @@ def add_review_reply(
 
 # Update a review reply
 @router.patch("/replies/{reply_id}", response_model=dict)
-def update_review_reply(
+async def update_review_reply(
     reply_id: int,
     reply_update: ReviewReplyCreate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
 ):
     # Check if user is a supervisor
@@ -225,7 +205,7 @@ def update_review_reply(
         )
     
     # Check if reply exists
-    db_reply = session.get(models.ReviewReply, reply_id)
+    db_reply = await session.get(models.ReviewReply, reply_id)
     if not db_reply:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -243,11 +223,13 @@ def update_review_reply(
     db_reply.reply_text = reply_update.reply_text
     
     session.add(db_reply)
-    session.commit()
-    session.refresh(db_reply)
+    business_id = await touch_reply_business(session, db_reply)
+    await session.commit()
+    await session.refresh(db_reply)
+    await response_cache.invalidate(f"reviews:{business_id}")
     
     # Get supervisor info
-    supervisor = session.get(models.User, current_user.user_id)
+    supervisor = await session.get(models.User, current_user.user_id)
     
     # Return the updated reply with supervisor info
     return {
@@ -265,9 +247,9 @@ def update_review_reply(
 
 # Delete a review reply
 @router.delete("/replies/{reply_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_review_reply(
+async def delete_review_reply(
     reply_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
 ):
     # Check if user is a supervisor or admin
@@ -278,7 +260,7 @@ def delete_review_reply(
         )
     
     # Check if reply exists
-    db_reply = session.get(models.ReviewReply, reply_id)
+    db_reply = await session.get(models.ReviewReply, reply_id)
     if not db_reply:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -293,5 +275,8 @@ def delete_review_reply(
         )
     
     # Delete the reply
-    session.delete(db_reply)
-    session.commit()
+    business_id = await touch_reply_business(session, db_reply)
+    await session.run_sync(apply_reply_stats, await session.get(models.Review, db_reply.review_id), -1)
+    await session.delete(db_reply)
+    await session.commit()
+    await response_cache.invalidate(f"reviews:{business_id}")
@@ -1,60 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, func, select
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ... import models, schemas
 from ...api.deps import (
-    get_session,
+    get_async_session,
     get_current_user,
     check_supervisor
 )
+from ...core.cache import CachedRoute, cached, response_cache
+from ...api.conditional import business_revision_headers
+from ...api.pagination import REVIEW_PAGE_KEYS, paginate, review_page_key, set_next_cursor
 from ...models import User  # Assuming User model has a 'role' attribute
+from ...services.aggregates import apply_review_delta
+from ...services.revisions import bump_business_revisions
+from ...services.rollups import apply_review_stats, remove_review_stats, utc_day
 
 router = APIRouter(
     prefix="/reviews",
-    tags=["Reviews"]
+    tags=["Reviews"],
+    route_class=CachedRoute
 )
 
-def update_business_average_rating(business_id: int, session: Session):
-    # Calculate new average rating
-    result = session.exec(
-        select(func.avg(models.Review.rating))
-        .where(models.Review.business_id == business_id)
-    ).first()
-    
-    # Get the business and update its average rating
-    business = session.get(models.Business, business_id)
-    if business:
-        business.average_rating = round(float(result), 1) if result else 0.0
-        session.add(business)
-        session.commit()
 
+def locked_review(review_id: int):
+    # The review, locked FOR UPDATE before its rating is taken out of the aggregates
+    return select(models.Review).where(models.Review.review_id == review_id).with_for_update()
 
-@router.get("/{business_id}", response_model=list[schemas.ReviewPublicWithVote])
-def get_reviews(business_id: int, session: Session = Depends(get_session),
+
+@router.get("/{business_id}", response_model=list[schemas.ReviewPublicWithVote],
+            dependencies=[Depends(business_revision_headers)])
+@cached("reviews:{business_id}", "users")
+async def get_reviews(business_id: int, response: Response, session: AsyncSession = Depends(get_async_session),
                     offset: int = 0,
-                    limit: int = 20):
-    votes_count = func.count(models.ReviewVote.review_id).label("votes_count")
-    reviews = session.exec(
-        select(models.Review, votes_count)
-        .join(models.ReviewVote, models.Review.review_id == models.ReviewVote.review_id, isouter=True)
+                    limit: int = 20,
+                    cursor: str | None = None):
+    reviews_query = (
+        select(models.Review, models.Review.votes_count)
         .where(models.Review.business_id == business_id)
-        .limit(limit)
-        .offset(offset)
-        .group_by(models.Review.review_id)
-        .order_by(votes_count.desc())
-    ).all()
+        .options(joinedload(models.Review.reviewer))
+    )
+    # Most voted first, read in order from the (business_id, votes_count, review_id) index
+    reviews = (await session.exec(
+        paginate(reviews_query, (models.Review.votes_count, models.Review.review_id), cursor=cursor, offset=offset,
+                 limit=limit, descending=True)
+    )).all()
 
     if not reviews:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No reviews assigned to that business")
+
+    set_next_cursor(response, reviews, limit, lambda row: (row.votes_count, row.Review.review_id))
     return reviews
 
 
 @router.get("/admin/all", response_model=list[schemas.ReviewPublicWithVote])
-def get_all_reviews_admin(
-    session: Session = Depends(get_session),
+async def get_all_reviews_admin(
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user),
     offset: int = 0,
-    limit: int = 50  # Default limit for admin view
+    limit: int = 50,  # Default limit for admin view
+    cursor: str | None = None
 ):
     if current_user.role != "admin":  # Assuming 'admin' is the role string
         raise HTTPException(
@@ -62,46 +69,47 @@ def get_all_reviews_admin(
             detail="Not authorized to access this resource"
         )
 
-    votes_count = func.count(models.ReviewVote.review_id).label("votes_count")
-    reviews_query = (
-        select(models.Review, votes_count)
-        .join(models.ReviewVote, models.Review.review_id == models.ReviewVote.review_id, isouter=True)
-        .limit(limit)
-        .offset(offset)
-        .group_by(models.Review.review_id)
-        .order_by(models.Review.created_at.desc())  # Order by creation date for admin view
-    )
-    reviews = session.exec(reviews_query).all()
+    reviews_query = select(models.Review, models.Review.votes_count).options(joinedload(models.Review.reviewer))
+    # Order by creation date for admin view
+    reviews = (await session.exec(
+        paginate(reviews_query, REVIEW_PAGE_KEYS, cursor=cursor, offset=offset, limit=limit, descending=True)
+    )).all()
 
     if not reviews:
         # Return empty list if no reviews, not a 404, as it's a list endpoint
         return []
+
+    set_next_cursor(response, reviews, limit, lambda row: review_page_key(row.Review))
     return reviews
 
     
 # Add a review to a business
 @router.post("/{business_id}", response_model=schemas.ReviewPublic)
-def add_review(business_id: int, review: schemas.ReviewCreate, session: Session = Depends(get_session),
+async def add_review(business_id: int, review: schemas.ReviewCreate, session: AsyncSession = Depends(get_async_session),
                     current_user: models.User = Depends(get_current_user)):
     check_supervisor(current_user)
-    db_business = session.get(models.Business, business_id)
+    db_business = await session.get(models.Business, business_id)
     if not db_business:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Business not found")
     
     db_review = models.Review(user_id=current_user.user_id, business_id=business_id, **review.model_dump())
     session.add(db_review)
-    session.commit()
-    session.refresh(db_review)
-    
-    update_business_average_rating(business_id, session)
+    # Business aggregates and today's stats are updated in the same transaction as the review
+    await session.run_sync(apply_review_delta, business_id, added_rating=db_review.rating)
+    await session.run_sync(apply_review_stats, business_id, None, added_rating=db_review.rating)
+    await session.commit()
+    await session.refresh(db_review, ["created_at", "reviewer"])
+    await response_cache.invalidate(f"business:{business_id}", f"reviews:{business_id}")
     
     return db_review
 
 # Delete a review
 @router.delete("/{review_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_review(review_id: int, session: Session = Depends(get_session),
+async def delete_review(review_id: int, session: AsyncSession = Depends(get_async_session),
                     current_user: models.User = Depends(get_current_user)):
-    review = session.get(models.Review, review_id)
+    # Locked until the commit: a concurrent delete or rating change waits, then finds the
+    # review gone or reads its new rating, and the aggregates are only shifted once
+    review = (await session.exec(locked_review(review_id))).first()
     if not review:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found")
 
@@ -109,17 +117,18 @@ def delete_review(review_id: int, session: Session = Depends(get_session),
     if review.user_id != current_user.user_id and current_user.role != "admin":  # Assuming 'admin' is the role string
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to do this action")
     
-    business_id = review.business_id
-    session.delete(review)
-    session.commit()
-    
-    update_business_average_rating(business_id, session)
+    await session.run_sync(apply_review_delta, review.business_id, removed_rating=review.rating)
+    await session.run_sync(remove_review_stats, review)
+    await session.delete(review)
+    await session.commit()
+    await response_cache.invalidate(f"business:{review.business_id}", f"reviews:{review.business_id}")
 
 # Update a review
 @router.patch("/{review_id}", response_model=schemas.ReviewPublic)
-def update_review(review_id: int, review: schemas.ReviewUpdate, session: Session = Depends(get_session),
+async def update_review(review_id: int, review: schemas.ReviewUpdate, session: AsyncSession = Depends(get_async_session),
                     current_user: models.User = Depends(get_current_user)):
-    db_review = session.get(models.Review, review_id)
+    # Locked like in delete_review, the rating the deltas remove is the current one
+    db_review = (await session.exec(locked_review(review_id))).first()
     if not db_review:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found")
     
@@ -131,14 +140,25 @@ def update_review(review_id: int, review: schemas.ReviewUpdate, session: Session
 
     review_data = review.model_dump(exclude_unset=True)
     
+    if 'rating' in review_data and review_data['rating'] != db_review.rating:
+        await session.run_sync(apply_review_delta, db_review.business_id,
+                               added_rating=review_data['rating'], removed_rating=db_review.rating)
+        await session.run_sync(apply_review_stats, db_review.business_id, utc_day(db_review.created_at),
+                               added_rating=review_data['rating'], removed_rating=db_review.rating)
+    else:
+        # Aggregates are unchanged, the business page still shows the new text
+        await session.run_sync(bump_business_revisions, models.Business.business_id == db_review.business_id)
+
     for key, value in review_data.items():
         setattr(db_review, key, value)
 
     session.add(db_review)
-    session.commit()
-    session.refresh(db_review)
-    
+    await session.commit()
+    await session.refresh(db_review, ["reviewer"])
+    # The business only shows the rating
     if 'rating' in review_data:
-        update_business_average_rating(db_review.business_id, session)
+        await response_cache.invalidate(f"business:{db_review.business_id}", f"reviews:{db_review.business_id}")
+    else:
+        await response_cache.invalidate(f"reviews:{db_review.business_id}")
     
     return db_review
\ No newline at end of file
@@ -0,0 +1,48 @@
+from datetime import date, datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ... import models, schemas
+from ...api.deps import get_async_session, get_current_user
+from ...core.config import settings
+from ...schemas import UserRole
+from ...services.rollups import StatsInterval, business_trend
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["Stats"]
+)
+
+
+# Reviews, ratings, reply rate and votes of a business over a range of days, for the
+# dashboards of the admins and of the business's supervisor. The last 30 days by default
+@router.get("/businesses/{business_id}", response_model=schemas.BusinessTrend)
+async def get_business_trend(business_id: int,
+                             session: AsyncSession = Depends(get_async_session),
+                             current_user: models.User = Depends(get_current_user),
+                             start: date | None = None,
+                             end: date | None = None,
+                             interval: StatsInterval = "day"):
+    business = await session.get(models.Business, business_id)
+    if not business:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Business not found")
+
+    # Admins see every business, supervisors their own
+    if current_user.role != UserRole.ADMIN and business.supervisor_id != current_user.user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this resource"
+        )
+
+    # Days are UTC days
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start is after end")
+    if (end - start).days + 1 > settings.stats_max_days:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The range can't be longer than {settings.stats_max_days} days"
+        )
+
+    return await session.run_sync(business_trend, business_id, start, end, interval)
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import delete
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Annotated, List
 import re
 
-from ...core import security
 from ...api.deps import (
     check_admin,
-    get_session,
+    get_async_session,
     get_current_user
 )
 from ... import models, schemas
+from ...api.pagination import USER_PAGE_KEYS, paginate, set_next_cursor
+from ...core.cache import response_cache
+from ...core.passwords import password_pool
+from ...core.principals import principal_cache
+from ...services.aggregates import remove_user_reviews_from_aggregates
+from ...services.revisions import bump_business_revisions, businesses_showing_user
+from ...services.rollups import remove_user_stats
+from ...services.votes import apply_vote_deltas
 
 
 
@@ -28,7 +37,7 @@ def validate_username(username: str) -> bool:
 
 # Create user (public endpoint)
 @router.post("/", response_model=schemas.UserPublic, status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.UserCreate, session: Session = Depends(get_session)):
+async def create_user(user: schemas.UserCreate, session: AsyncSession = Depends(get_async_session)):
     # Validate username format
     if not validate_username(user.username):
         raise HTTPException(
@@ -51,12 +60,12 @@ def create_user(user: schemas.UserCreate, session: Session = Depends(get_session
         )
 
     # Check if user with same email or username already exists
-    existing_user = session.exec(
+    existing_user = (await session.exec(
         select(models.User).where(
             (models.User.email == user.email) | 
             (models.User.username == user.username)
         )
-    ).first()
+    )).first()
     
     if existing_user:
         if existing_user.email == user.email:
@@ -70,17 +79,19 @@ def create_user(user: schemas.UserCreate, session: Session = Depends(get_session
                 detail="User with this username already exists"
             )
 
-    # Hashing the password 
-    user.password = security.hash_password(user.password)
+    # Hashing the password in the password pool, bcrypt is slow on purpose. The connection
+    # goes back to the pool meanwhile
+    await session.commit()
+    user.password = await password_pool.hash(user.password)
     
     new_user = models.User(**user.model_dump())
     session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
+    await session.commit()
+    await session.refresh(new_user)
     return new_user
 
 @router.get("/me", response_model=schemas.UserPublic)
-def get_my_user(
+async def get_my_user(
     current_user: models.User = Depends(get_current_user)
 ):
     return current_user
@@ -90,36 +101,43 @@ def get_my_user(
 
 # Get a user based on Id
 @router.get("/{user_id}", response_model=schemas.UserPublic)
-def get_user(
+async def get_user(
     user_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
     ):
     check_admin(current_user)
-    user = session.get(models.User, user_id) 
+    user = await session.get(models.User, user_id) 
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="user not found")
     return user
 
-# List all users
+# List users, a page at a time. The whole table is streamed by /exports/users
 @router.get("/", response_model=List[schemas.UserPublic])
-def list_users(
-    session: Session = Depends(get_session),
-    current_user: models.User = Depends(get_current_user)
+async def list_users(
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: models.User = Depends(get_current_user),
+    offset: int = 0,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 1000,
+    cursor: str | None = None
 ):
     check_admin(current_user)
-    users = session.exec(select(models.User)).all()
+    users = (await session.exec(
+        paginate(select(models.User), USER_PAGE_KEYS, cursor=cursor, offset=offset, limit=limit)
+    )).all()
+    set_next_cursor(response, users, limit, lambda user: (user.user_id,))
     return users
 
 # Delete user (admin only)
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(
+async def delete_user(
     user_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
 ):
     check_admin(current_user)
-    user = session.get(models.User, user_id)
+    user = await session.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
@@ -129,20 +147,41 @@ def delete_user(
             detail="Administrators cannot delete their own account"
         )
     
-    session.delete(user)
-    session.commit()
+    # Locked before anything else: a vote of the user inserted from now on waits on the
+    # row (foreign key check) and fails, so the votes deleted below are all they have
+    await session.refresh(user, with_for_update=True)
+
+    # The user's reviews go away with them (ON DELETE CASCADE), so take them out of the
+    # business aggregates in the same transaction
+    await session.run_sync(bump_business_revisions, businesses_showing_user(user.user_id))
+    business_ids = await session.run_sync(remove_user_reviews_from_aggregates, user.user_id)
+    await session.run_sync(remove_user_stats, user.user_id)
+    # Their votes go away too, each one taken off its review's count in this transaction
+    voted_review_ids = (await session.exec(
+        delete(models.ReviewVote).where(models.ReviewVote.user_id == user.user_id)
+        .returning(models.ReviewVote.review_id)
+    )).scalars().all()
+    voted_business_ids = await session.run_sync(apply_vote_deltas, dict.fromkeys(voted_review_ids, -1))
+    await session.delete(user)
+    await session.commit()
+    principal_cache.invalidate(user_id)
+    await response_cache.invalidate(
+        "users",
+        *(f"{tag}:{business_id}" for business_id in business_ids for tag in ("business", "reviews")),
+        *(f"reviews:{business_id}" for business_id in voted_business_ids),
+    )
     return None
 
 # Update user role (admin only)
 @router.patch("/{user_id}/role", response_model=schemas.UserPublic)
-def update_user_role(
+async def update_user_role(
     user_id: int,
     role_update: schemas.RoleUpdate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: models.User = Depends(get_current_user)
 ):
     check_admin(current_user)
-    user = session.get(models.User, user_id)
+    user = await session.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
@@ -154,6 +193,10 @@ def update_user_role(
     
     user.role = role_update.role
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    # Reviewers and reply authors are shown with their role
+    await session.run_sync(bump_business_revisions, businesses_showing_user(user.user_id))
+    await session.commit()
+    await session.refresh(user)
+    principal_cache.invalidate(user_id)
+    await response_cache.invalidate("users")
     return user
\ No newline at end of file
@@ -1,10 +1,17 @@
-from fastapi import Depends, HTTPException, status, APIRouter
-from sqlmodel import Session, select
+from typing import Annotated
+from fastapi import Depends, HTTPException, Query, status, APIRouter
+from sqlalchemy import delete, exists, literal
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ... import models, schemas
+from ...services.rollups import apply_vote_stats, utc_day
+from ...services.votes import vote_counter
 from ...api.deps import (
-    get_session,
-    get_current_user
+    credentials_exception,
+    get_async_session,
+    get_token_principal
 )
 
 router = APIRouter(
@@ -12,29 +19,83 @@ router = APIRouter(
     tags=["Votes"]
 )
 
+# The current user's votes on a page of reviews, either every review of a business or the
+# given review ids. Only voted reviews are returned, the others have no vote
+@router.get("/me", response_model=list[schemas.UserVote])
+async def get_my_votes(session: AsyncSession = Depends(get_async_session),
+                       current_user: schemas.TokenData = Depends(get_token_principal),
+                       business_id: int | None = None,
+                       review_ids: Annotated[list[int] | None, Query(max_length=100)] = None):
+    if business_id is None and not review_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Provide a business_id or review_ids")
+
+    # One query on the (user_id, review_id) index
+    votes_query = select(models.ReviewVote.review_id).where(models.ReviewVote.user_id == current_user.user_id)
+    if business_id is not None:
+        votes_query = (
+            votes_query
+            .join(models.Review, models.Review.review_id == models.ReviewVote.review_id)
+            .where(models.Review.business_id == business_id)
+        )
+    if review_ids:
+        votes_query = votes_query.where(models.ReviewVote.review_id.in_(review_ids))
+
+    voted = (await session.exec(votes_query)).all()
+    return [{"review_id": review_id} for review_id in voted]
+
+
 # Vote "I find this useful on a review"
 @router.post("/", status_code=status.HTTP_201_CREATED)
-def review_vote(vote: schemas.Vote, session: Session = Depends(get_session),
-                current_user: models.User = Depends(get_current_user)):
-    # Check if the review exists
-    review = session.get(models.Review, vote.review_id)
-    if not review:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Review {vote.review_id} not found")
+async def review_vote(vote: schemas.Vote, session: AsyncSession = Depends(get_async_session),
+                current_user: schemas.TokenData = Depends(get_token_principal)):
+    # Only the vote row and its day in the daily stats are written here, votes_count is
+    # updated by the next flush. Any user may vote, so the token claims are enough and the
+    # user isn't loaded
 
-    vote_query = session.exec(select(models.ReviewVote).where(
-        models.ReviewVote.review_id == vote.review_id, models.ReviewVote.user_id == current_user.user_id))
-    found_vote = vote_query.first()
+    # The review and its business are locked FOR KEY SHARE, so a deletion of the review or a
+    # rebuild of the business's stats (both FOR UPDATE) counts its votes before or after this
+    # one, never during. Other votes don't wait
+    business_id = (await session.exec(
+        select(models.Review.business_id)
+        .join(models.Business, models.Business.business_id == models.Review.business_id)
+        .where(models.Review.review_id == vote.review_id)
+        .with_for_update(read=True, key_share=True)
+    )).first()
+    if business_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Review {vote.review_id} not found")
 
     if vote.direction == 1:
-        if found_vote:
+        # Inserted only if the review and the user exist and the user hasn't voted on it yet
+        added = (await session.exec(
+            insert(models.ReviewVote)
+            .from_select(
+                ["review_id", "user_id"],
+                select(models.Review.review_id, literal(current_user.user_id))
+                .where(models.Review.review_id == vote.review_id,
+                       exists().where(models.User.user_id == current_user.user_id)),
+            )
+            .on_conflict_do_nothing()
+            .returning(models.ReviewVote.created_at)
+        )).first()
+        if added is None:
+            # The token outlived its user
+            if not await session.get(models.User, current_user.user_id):
+                raise credentials_exception()
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"User {current_user.user_id} has already voted on review {vote.review_id}")
-        new_vote = models.ReviewVote(review_id=vote.review_id, user_id=current_user.user_id)
-        session.add(new_vote)
-        session.commit()
+        await session.run_sync(apply_vote_stats, business_id, None, 1)
+        await session.commit()
+        vote_counter.record(vote.review_id, 1)
         return {"State": "Successfully added vote"}
     else:
-        if not found_vote:
+        deleted = (await session.exec(
+            delete(models.ReviewVote)
+            .where(models.ReviewVote.review_id == vote.review_id, models.ReviewVote.user_id == current_user.user_id)
+            .returning(models.ReviewVote.created_at)
+        )).first()
+        if deleted is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Vote does not exist")
-        session.delete(found_vote)
-        session.commit()
+        await session.run_sync(apply_vote_stats, business_id, utc_day(deleted.created_at), -1)
+        await session.commit()
+        vote_counter.record(vote.review_id, -1)
         return {"State": "Successfully deleted vote"}
\ No newline at end of file
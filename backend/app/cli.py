@@ -0,0 +1,279 @@
+"""Maintenance commands, run from the backend directory:
+
+    python -m app.cli migrate [revision]
+    python -m app.cli reconcile-aggregates [--repair]
+    python -m app.cli reconcile-votes [--repair]
+    python -m app.cli check-indexes
+    python -m app.cli import {businesses,reviews} FILE [--format csv|ndjson]
+    python -m app.cli refresh-leaderboards [--all]
+    python -m app.cli backfill-rollups [--business-id ID]
+    python -m app.cli bench-auth [--iterations N]
+"""
+import argparse
+import sys
+
+from sqlmodel import Session
+
+from .core.database import engine
+
+
+def migrate(args: argparse.Namespace) -> int:
+    from .core.migrations import migrate as upgrade
+
+    # Waits for any other process migrating, then finds nothing left to do
+    upgrade(args.revision)
+    return 0
+
+
+def reconcile_aggregates(args: argparse.Namespace) -> int:
+    from .services.aggregates import reconcile_business_aggregates
+
+    with Session(engine) as session:
+        drifted = reconcile_business_aggregates(session, repair=args.repair)
+
+    for entry in drifted:
+        changes = ", ".join(
+            f"{column} {entry['stored'][column]} -> {entry['actual'][column]}"
+            for column in entry["stored"]
+            if entry["stored"][column] != entry["actual"][column]
+        )
+        print(f"business {entry['business_id']}: {changes}")
+
+    if not drifted:
+        print("Business aggregates are in sync with the reviews table")
+    elif args.repair:
+        print(f"Repaired {len(drifted)} business(es)")
+    else:
+        print(f"{len(drifted)} business(es) drifted, run again with --repair to fix them")
+
+    # Non-zero exit when drift was found and left in place, so this can run as a cron check
+    return 1 if drifted and not args.repair else 0
+
+
+def reconcile_votes(args: argparse.Namespace) -> int:
+    from .services.votes import reconcile_vote_counts
+
+    with Session(engine) as session:
+        drifted = reconcile_vote_counts(session, repair=args.repair)
+
+    for entry in drifted:
+        print(f"review {entry['review_id']}: votes_count {entry['stored']} -> {entry['actual']}")
+
+    if not drifted:
+        print("Review vote counts are in sync with the review_votes table")
+    elif args.repair:
+        print(f"Repaired {len(drifted)} review(s)")
+    else:
+        print(f"{len(drifted)} review(s) drifted, run again with --repair to fix them")
+
+    return 1 if drifted and not args.repair else 0
+
+
+def check_indexes(args: argparse.Namespace) -> int:
+    from .services.index_advisor import check_hot_paths
+
+    findings, skipped = check_hot_paths()
+
+    for path in skipped:
+        print(f"skipped {path}: no sample data for it, seed the database first")
+    for finding in findings:
+        print(f"{finding['path']}: {finding['scan']} on {finding['relation']}")
+        print(f"    {' '.join(finding['statement'].split())}")
+
+    if findings:
+        print(f"{len(findings)} hot path queries fall back to a full table scan")
+        return 1
+    print("Every hot path query can use an index")
+    return 0
+
+
+def import_rows(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from .core.cache import response_cache
+    from .services.imports import import_file, import_format
+
+    format = args.format or import_format(args.file)
+    if format is None:
+        print("Unknown file format, name the file .csv or .ndjson or pass --format")
+        return 2
+
+    with open(args.file, encoding="utf-8-sig", newline="") as file, Session(engine) as session:
+        result = import_file(session, args.kind, file, format)
+
+    async def invalidate():
+        # Reaches the other workers with CACHE_BACKEND=redis, otherwise their copies expire
+        await response_cache.invalidate(
+            *(f"{tag}:{business_id}" for business_id in result.business_ids for tag in ("business", "reviews"))
+        )
+        await response_cache.close()
+
+    asyncio.run(invalidate())
+
+    report = result.report()
+    for error in report.errors:
+        print(f"line {error.line}: {error.error}")
+    if report.rejected > len(report.errors):
+        print(f"... {report.rejected - len(report.errors)} more rejected row(s)")
+    print(f"{report.imported} of {report.received} {args.kind} imported, {report.rejected} rejected"
+          + (f", aggregates of {report.businesses_updated} business(es) recomputed" if args.kind == "reviews" else ""))
+
+    # Non-zero exit when rows were rejected, the valid ones are imported regardless
+    return 1 if report.rejected else 0
+
+
+def refresh_leaderboards(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from sqlmodel import select
+
+    from . import models
+    from .core.cache import response_cache
+    from .services.leaderboards import refresh_leaderboards as refresh
+
+    with Session(engine) as session:
+        category_ids = list(session.exec(select(models.Category.category_id))) if args.all else None
+        refreshed = refresh(session, category_ids)
+
+    if not refreshed:
+        print("No leaderboard rebuilt: none is stale")
+        return 0
+
+    async def invalidate():
+        await response_cache.invalidate("leaderboards", *[f"leaderboard:{category_id}" for category_id in refreshed])
+        await response_cache.close()
+
+    asyncio.run(invalidate())
+    print(f"Rebuilt the leaderboards of {len(refreshed)} categories")
+    return 0
+
+
+def backfill_rollups(args: argparse.Namespace) -> int:
+    import time
+
+    from sqlmodel import select
+
+    from . import models
+    from .core.config import settings
+    from .services.rollups import rebuild_daily_stats
+
+    with Session(engine) as session:
+        query = select(models.Business.business_id).order_by(models.Business.business_id)
+        if args.business_id:
+            query = query.where(models.Business.business_id.in_(args.business_id))
+        business_ids = session.exec(query).all()
+
+    # A transaction per batch, the businesses of a batch are locked while it runs
+    started, rows = time.perf_counter(), 0
+    batch_size = settings.rollup_backfill_batch_size
+    for first in range(0, len(business_ids), batch_size):
+        with Session(engine) as session:
+            rows += rebuild_daily_stats(session, business_ids[first:first + batch_size])
+            session.commit()
+        print(f"{min(first + batch_size, len(business_ids))}/{len(business_ids)} businesses, {rows} days",
+              file=sys.stderr)
+
+    print(f"Rebuilt the daily stats of {len(business_ids)} businesses, {rows} days, "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+def bench_auth(args: argparse.Namespace) -> int:
+    import timeit
+
+    from .core import security
+
+    token = security.create_access_token({"user_id": 1, "role": "user"})
+    credentials_exception = Exception("invalid token")
+
+    def uncached():
+        # Every call verifies the signature, as before the token cache
+        security.token_cache.entries.clear()
+        security.verify_access_token(token, credentials_exception)
+
+    def cached():
+        security.verify_access_token(token, credentials_exception)
+
+    def clear_only():
+        security.token_cache.entries.clear()
+
+    # Clearing the cache is part of the uncached loop, take its cost out
+    overhead = min(timeit.repeat(clear_only, number=args.iterations, repeat=5))
+    before = min(timeit.repeat(uncached, number=args.iterations, repeat=5)) - overhead
+    security.verify_access_token(token, credentials_exception)
+    after = min(timeit.repeat(cached, number=args.iterations, repeat=5))
+
+    print(f"verify_access_token, best of 5 x {args.iterations} calls")
+    print(f"    signature verified every time: {before / args.iterations * 1e6:8.2f} us/call")
+    print(f"    token cache hit:               {after / args.iterations * 1e6:8.2f} us/call")
+    print(f"    {before / after:.1f}x faster")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migration = subparsers.add_parser(
+        "migrate",
+        help="Upgrade the database schema, one process at a time (advisory lock). Run it before starting the workers",
+    )
+    migration.add_argument("revision", nargs="?", default="head", help="Alembic revision to upgrade to")
+    migration.set_defaults(func=migrate)
+
+    reconcile = subparsers.add_parser(
+        "reconcile-aggregates",
+        help="Detect (and optionally repair) drift between business review aggregates and the reviews table",
+    )
+    reconcile.add_argument("--repair", action="store_true", help="Overwrite drifted aggregates with the actual values")
+    reconcile.set_defaults(func=reconcile_aggregates)
+
+    votes = subparsers.add_parser(
+        "reconcile-votes",
+        help="Detect (and optionally repair) drift between review vote counts and the review_votes table",
+    )
+    votes.add_argument("--repair", action="store_true", help="Recount the drifted reviews")
+    votes.set_defaults(func=reconcile_votes)
+
+    indexes = subparsers.add_parser(
+        "check-indexes",
+        help="EXPLAIN the queries behind the hot API paths and fail if any falls back to a full table scan",
+    )
+    indexes.set_defaults(func=check_indexes)
+
+    imports = subparsers.add_parser(
+        "import",
+        help="Bulk import businesses or historical reviews from a CSV or NDJSON file, through COPY",
+    )
+    imports.add_argument("kind", choices=["businesses", "reviews"])
+    imports.add_argument("file", help="CSV with a header row, or NDJSON")
+    imports.add_argument("--format", choices=["csv", "ndjson"], help="Taken from the file extension by default")
+    imports.set_defaults(func=import_rows)
+
+    leaderboards = subparsers.add_parser(
+        "refresh-leaderboards",
+        help="Rebuild the stale category leaderboards now, or all of them (e.g. after changing the ranking settings)",
+    )
+    leaderboards.add_argument("--all", action="store_true", help="Rebuild every category, stale or not")
+    leaderboards.set_defaults(func=refresh_leaderboards)
+
+    rollups = subparsers.add_parser(
+        "backfill-rollups",
+        help="Rebuild the daily stats of the businesses from the reviews, replies and votes",
+    )
+    rollups.add_argument("--business-id", type=int, action="append", help="Only this business, may be repeated")
+    rollups.set_defaults(func=backfill_rollups)
+
+    bench = subparsers.add_parser(
+        "bench-auth",
+        help="Time the verification of an access token with and without the token cache",
+    )
+    bench.add_argument("--iterations", type=int, default=10000, help="Calls per measurement")
+    bench.set_defaults(func=bench_auth)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""Cache of serialized responses for the public read endpoints.
+
+A cached route declares tags built from its path parameters, e.g. "business:{business_id}".
+Every tag has a version number that is part of the cache key, so a write invalidates all
+the responses depending on a tag by bumping its version after it commits. Versions are read
+before the route queries the database, so a response computed while a write was committing
+is stored under the old versions and never served afterwards.
+
+The in-process backend only sees the writes of its own worker, other workers keep serving
+their copy until it expires. Set CACHE_BACKEND=redis to share one cache between workers.
+
+Responses also carry ETag / Last-Modified validators (see api/conditional.py), a cached
+response answers conditional requests with a 304 as well."""
+import json
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from .config import settings
+
+# Response headers kept with the body
+CACHED_HEADERS = ("content-type", "x-next-cursor", "etag", "last-modified", "cache-control")
+# Headers a 304 repeats from the full response
+NOT_MODIFIED_HEADERS = ("etag", "last-modified", "cache-control")
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison, as If-None-Match uses
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def is_not_modified(request: Request, etag: str | None, last_modified: datetime | str | None) -> bool:
+    """Whether the client's copy is still current. If-Modified-Since is only looked at when
+    the request has no If-None-Match, and only trusted when the resource changed in an
+    earlier second than the date it carries: HTTP dates drop the fraction, so a write in
+    the same second as the client's copy is indistinguishable from it"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag is not None and etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            if isinstance(last_modified, str):
+                last_modified = parsedate_to_datetime(last_modified)
+            return last_modified.replace(microsecond=0) < parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class MemoryBackend:
+    """LRU of entries with a TTL. Versions live apart from the entries and are never
+    evicted, an evicted version would start again from 0 and bring back old entries"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self.versions: dict[str, int] = {}
+
+    async def get_versions(self, tags: list[str]) -> list[int]:
+        return [self.versions.get(tag, 0) for tag in tags]
+
+    async def bump_versions(self, tags: list[str]):
+        for tag in tags:
+            self.versions[tag] = self.versions.get(tag, 0) + 1
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def close(self):
+        pass
+
+
+class RedisBackend:
+    """Any server speaking the Redis protocol. Entries expire, versions don't, so the server
+    should evict with a volatile-* policy that leaves keys without a TTL alone"""
+
+    def __init__(self, url: str, prefix: str = "rato:cache:"):
+        # Optional dependency, only needed with CACHE_BACKEND=redis
+        import redis.asyncio as redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    async def get_versions(self, tags: list[str]) -> list[int]:
+        versions = await self.client.mget([f"{self.prefix}version:{tag}" for tag in tags])
+        return [int(version or 0) for version in versions]
+
+    async def bump_versions(self, tags: list[str]):
+        async with self.client.pipeline(transaction=False) as pipeline:
+            for tag in tags:
+                pipeline.incr(f"{self.prefix}version:{tag}")
+            await pipeline.execute()
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(f"{self.prefix}{key}")
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await self.client.set(f"{self.prefix}{key}", value, ex=ttl)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        # Route path -> {"hits": n, "misses": n}
+        self.stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    def metrics(self) -> dict:
+        return {route: dict(counts) for route, counts in self.stats.items()}
+
+    async def invalidate(self, *tags: str):
+        """Call after the write has committed"""
+        if self.backend and tags:
+            await self.backend.bump_versions(list(tags))
+
+    async def serve(self, request: Request, route_path: str, tags: list[str], handler) -> Response:
+        versions = await self.backend.get_versions(tags)
+        query = "&".join(sorted(request.url.query.split("&"))) if request.url.query else ""
+        key = f"{request.url.path}?{query}@{'.'.join(map(str, versions))}"
+
+        cached = await self.backend.get(key)
+        if cached is not None:
+            self.stats[route_path]["hits"] += 1
+            headers, body = cached.split(b"\n", 1)
+            headers = json.loads(headers)
+            if is_not_modified(request, headers.get("etag"), headers.get("last-modified")):
+                return Response(status_code=304, headers={
+                    **{name: value for name, value in headers.items() if name in NOT_MODIFIED_HEADERS},
+                    "X-Cache": "HIT",
+                })
+            return Response(content=body, headers={**headers, "X-Cache": "HIT"})
+
+        self.stats[route_path]["misses"] += 1
+        response = await handler(request)
+        if response.status_code == 200:
+            headers = {name: value for name, value in response.headers.items() if name in CACHED_HEADERS}
+            await self.backend.set(key, json.dumps(headers).encode() + b"\n" + response.body, self.ttl)
+        response.headers["X-Cache"] = "MISS"
+        return response
+
+    async def close(self):
+        if self.backend:
+            await self.backend.close()
+
+
+def create_backend():
+    if settings.cache_backend == "redis":
+        return RedisBackend(settings.cache_redis_url)
+    if settings.cache_backend == "memory":
+        return MemoryBackend(settings.cache_max_entries)
+    return None
+
+
+response_cache = ResponseCache(create_backend(), settings.cache_ttl_seconds)
+
+
+def cached(*tags: str):
+    """Marks a GET endpoint as cacheable. Tags are formatted with the path parameters,
+    the router has to use CachedRoute"""
+    def decorator(endpoint):
+        endpoint.cache_tags = tags
+        return endpoint
+    return decorator
+
+
+class CachedRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        tags = getattr(self.endpoint, "cache_tags", None)
+        if not tags:
+            return handler
+
+        route_path = self.path_format
+
+        async def cached_handler(request: Request) -> Response:
+            if request.method != "GET" or response_cache.backend is None:
+                return await handler(request)
+            # Ids as the writes format them, /businesses/05 depends on business:5
+            params = {name: int(value) if value.isdigit() else value
+                      for name, value in request.path_params.items()}
+            return await response_cache.serve(request, route_path, [tag.format(**params) for tag in tags], handler)
+
+        return cached_handler
@@ -13,6 +13,78 @@ class Settings(BaseSettings):
     algorithm: str
     access_token_expire_minutes: int
     backend_cors_origins: str = ""
+
+    # Connection pool, per engine and per process
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    database_pool_timeout: float = 30
+    database_pool_recycle: int = 1800
+    database_pool_pre_ping: bool = False
+    # Milliseconds, 0 leaves the server default. Not sent in PgBouncer mode, set it on the
+    # database role there
+    database_statement_timeout: int = 0
+    database_echo: bool = False
+    # Connecting through PgBouncer in transaction mode, where server-side prepared
+    # statements can't be kept across transactions
+    database_pgbouncer: bool = False
+    # Statements of the API taking longer are logged, 0 turns the log off
+    database_slow_query_ms: float = 200
+    # Apply the migrations when a worker starts instead of as a deploy step, convenient in
+    # development. Workers starting together take turns (advisory lock)
+    database_migrate_on_startup: bool = False
+
+    # Response cache of the public read endpoints: "memory", "redis" or "none"
+    cache_backend: str = "memory"
+    # e.g. redis://localhost:6379/0, needs the redis package
+    cache_redis_url: str = ""
+    cache_ttl_seconds: int = 60
+    # Responses kept by the in-process cache
+    cache_max_entries: int = 10000
+    # How long a CDN may serve a public response without revalidating, browsers always
+    # revalidate (cheap, the business revision answers with a 304)
+    http_cache_s_maxage: int = 30
+
+    # Seconds between two flushes of the vote counts, how long a vote takes to show
+    # in the votes count
+    vote_flush_interval_seconds: float = 2.0
+
+    # Category leaderboards: businesses kept per category, seconds between two looks for
+    # stale ones, and the Bayesian ranking (ratings at the category mean added to every
+    # business, reviews a business needs to be ranked)
+    leaderboard_size: int = 100
+    leaderboard_refresh_interval_seconds: float = 5.0
+    ranking_prior_weight: float = 10.0
+    ranking_min_reviews: int = 1
+
+    # Business daily stats: the longest range of days a trend may cover, businesses rebuilt
+    # per transaction by the backfill. Each batch reads review_votes once and holds the
+    # review writes of its businesses while it runs
+    stats_max_days: int = 1096
+    rollup_backfill_batch_size: int = 10000
+
+    # Requested through the app by every worker after it started, to fill the caches
+    # before it reports ready. Comma separated
+    warmup_paths: str = "/categories/,/businesses/?limit=20"
+
+    # Users of authenticated requests kept in memory, per process. The TTL is how long a
+    # role change or deletion made through another worker takes to apply, 0 disables it
+    auth_principal_cache_ttl_seconds: float = 30
+    auth_principal_cache_max_entries: int = 10000
+    # Verified tokens whose claims are kept until they expire, 0 disables it
+    auth_token_cache_max_entries: int = 10000
+
+    # bcrypt cost factor (log2 of the iterations), existing hashes are upgraded at login
+    password_bcrypt_rounds: int = 12
+    # Processes hashing passwords, per worker, and how many more hashes may wait for one
+    # before the requests are turned away with a 503
+    password_hash_workers: int = 2
+    password_hash_max_queue: int = 16
+
+    # Rows fetched per round trip by the admin exports, what one export holds in memory
+    export_batch_size: int = 5000
+    # Rows per COPY round trip of the bulk imports, and rejected rows listed in their report
+    import_batch_size: int = 10000
+    import_max_errors: int = 1000
     
     @property
     def all_cors_origins(self) -> list[str]:
@@ -20,4 +92,8 @@ class Settings(BaseSettings):
             return []
         return [origin.strip() for origin in self.backend_cors_origins.split(",")]
 
+    @property
+    def all_warmup_paths(self) -> list[str]:
+        return [path.strip() for path in self.warmup_paths.split(",") if path.strip()]
+
 settings = Settings()
\ No newline at end of file
@@ -1,11 +1,102 @@
+import time
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlmodel import create_engine
 from .config import settings
+from .instrumentation import instrument_engine
 
 # # Get the database URL from environment variables
 SQLALCHEMY_DATABASE_URL = f'postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}'
 
-# database engine
-engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=True)
+# Same database through asyncpg, used by the API routes
+ASYNC_SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://', 1)
+
+
+class PoolWaitStats:
+    """How long getting a connection from the pool took, including opening a new one"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    # Checkouts all happen on the event loop, so the stats need no lock
+    wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.wait_stats.record(time.perf_counter() - start)
+
+
+def pool_options() -> dict:
+    return {
+        "echo": settings.database_echo,
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_timeout": settings.database_pool_timeout,
+        "pool_recycle": settings.database_pool_recycle,
+        "pool_pre_ping": settings.database_pool_pre_ping,
+    }
+
+
+def sync_connect_args() -> dict:
+    # PgBouncer refuses startup options, set the timeout on the database role there instead
+    if settings.database_statement_timeout and not settings.database_pgbouncer:
+        return {"options": f"-c statement_timeout={settings.database_statement_timeout}"}
+    return {}
+
+
+def async_connect_args() -> dict:
+    connect_args = {}
+    if settings.database_statement_timeout and not settings.database_pgbouncer:
+        connect_args["server_settings"] = {"statement_timeout": str(settings.database_statement_timeout)}
+    if settings.database_pgbouncer:
+        # A server connection may serve another client after each transaction, so asyncpg
+        # must not cache prepared statements, and the names of the ones it prepares must
+        # not collide between clients
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+    return connect_args
+
+
+# database engine, kept for Alembic and the command line tools
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=sync_connect_args(), **pool_options())
+
+# async database engine
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=TimedAsyncQueuePool,
+                                   connect_args=async_connect_args(), **pool_options())
+# Per request statement counts and timings, and the slow query log (see instrumentation.py)
+instrument_engine(async_engine.sync_engine)
+
+
+def pool_metrics() -> dict:
+    """Current state of the async engine's pool, for monitoring"""
+    pool = async_engine.pool
+    wait_stats = pool.wait_stats
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        # Connections opened beyond pool_size, negative while the pool itself isn't full
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.database_max_overflow,
+        "checkouts": wait_stats.count,
+        "wait_seconds_total": wait_stats.total_seconds,
+        "wait_seconds_max": wait_stats.max_seconds,
+    }
 
 # This code is commented out now that I switched to a migration tool called Alembic
 # So I don't need to manually run this script whenever I need to create tables
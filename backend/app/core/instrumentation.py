@@ -0,0 +1,186 @@
+"""Request instrumentation: latency and SQL statements of each request.
+
+Engine events time every statement and add it to the stats of the request being served,
+found through a context variable the middleware sets. The middleware reports them in a
+Server-Timing header (visible in the browser dev tools) and adds the request to totals per
+route template, exported by /metrics (see metrics.py). Statements slower than
+DATABASE_SLOW_QUERY_MS are logged with the shape of their parameters, never their values.
+
+Statements sent outside of a request (e.g. the vote flushes) are only checked for slowness.
+
+Everything is plain counters updated from the event loop thread, recording a request is a
+few dict lookups and additions."""
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+
+from .config import settings
+
+log = logging.getLogger("uvicorn")
+
+# Upper bounds of the statements per request histogram
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+# Upper bounds of the request latency histogram, seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+@dataclass
+class RequestQueries:
+    # ASGI scope of the request, the router adds the matched route to it
+    scope: dict
+    statements: int = 0
+    seconds: float = 0.0
+    slowest_seconds: float = 0.0
+
+
+@dataclass
+class RouteQueries:
+    requests: int = 0
+    statements: int = 0
+    seconds: float = 0.0
+    slow_statements: int = 0
+    # Requests per STATEMENT_BUCKETS bound, the last one counts the requests above them all
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(STATEMENT_BUCKETS) + 1))
+
+
+@dataclass
+class RouteLatency:
+    count: int = 0
+    seconds: float = 0.0
+    # Requests per LATENCY_BUCKETS bound, the last one counts the requests above them all
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+
+current_queries: ContextVar[RequestQueries | None] = ContextVar("current_queries", default=None)
+# Route template -> totals
+route_queries: dict[str, RouteQueries] = {}
+# (route template, method, status) -> latencies
+route_latencies: dict[tuple[str, str, int], RouteLatency] = {}
+# Requests being served
+in_flight = 0
+
+
+def route_template(scope: dict) -> str:
+    # "/reviews/{business_id}" rather than the path, so every business adds to the same route
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or "unmatched"
+
+
+def parameters_shape(parameters) -> str:
+    # Types of the bound parameters (lengths for sequences), e.g. "(int, str, list[3])"
+    def shape(value) -> str:
+        if isinstance(value, (list, tuple)):
+            return f"{type(value).__name__}[{len(value)}]"
+        return type(value).__name__
+
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{name}: {shape(value)}" for name, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(shape(value) for value in parameters) + ")"
+    return shape(parameters)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+
+    queries = current_queries.get()
+    if queries is not None:
+        queries.statements += 1
+        queries.seconds += elapsed
+        queries.slowest_seconds = max(queries.slowest_seconds, elapsed)
+
+    if settings.database_slow_query_ms and elapsed * 1000 >= settings.database_slow_query_ms:
+        route = route_template(queries.scope) if queries is not None else None
+        if route is not None:
+            route_stats(route).slow_statements += 1
+        log.warning("Slow query, %.1f ms on %s, parameters %s: %s",
+                    elapsed * 1000, route or "-", parameters_shape(parameters), " ".join(statement.split()))
+
+
+def handle_error(context):
+    # after_cursor_execute doesn't run for a failed statement
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+def route_stats(route: str) -> RouteQueries:
+    stats = route_queries.get(route)
+    if stats is None:
+        stats = route_queries[route] = RouteQueries()
+    return stats
+
+
+def record_request(route: str, method: str, status: int, seconds: float, queries: RequestQueries):
+    stats = route_stats(route)
+    stats.requests += 1
+    stats.statements += queries.statements
+    stats.seconds += queries.seconds
+    # Index of the first bound >= the value, len(bounds) past the last one
+    stats.buckets[bisect_left(STATEMENT_BUCKETS, queries.statements)] += 1
+
+    key = (route, method, status)
+    latency = route_latencies.get(key)
+    if latency is None:
+        latency = route_latencies[key] = RouteLatency()
+    latency.count += 1
+    latency.seconds += seconds
+    latency.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+
+def server_timing(queries: RequestQueries, total_seconds: float) -> str:
+    return (f'db;dur={queries.seconds * 1000:.1f};desc="{queries.statements} statements", '
+            f'db-slowest;dur={queries.slowest_seconds * 1000:.1f}, '
+            f'app;dur={total_seconds * 1000:.1f}')
+
+
+class InstrumentationMiddleware:
+    """Plain ASGI middleware, so the context variables it sets are the ones the route
+    handlers (and the engine events they trigger) see"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global in_flight
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        queries = RequestQueries(scope)
+        token = current_queries.set(queries)
+        started = time.perf_counter()
+        # A request that fails before answering is counted as a 500
+        status = 500
+        in_flight += 1
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Statements sent while streaming the body aren't in the header
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(queries, time.perf_counter() - started).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            in_flight -= 1
+            record_request(route_template(scope), scope["method"], status, time.perf_counter() - started, queries)
+            current_queries.reset(token)
+
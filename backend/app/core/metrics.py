@@ -0,0 +1,124 @@
+"""Metrics of this worker in the Prometheus text exposition format, served at /metrics.
+
+Nothing is computed ahead of a scrape: the counters are the ones the components keep for
+themselves (see instrumentation.py, the caches, the pools) and are only formatted here.
+Every worker process answers for itself, scrape each one or aggregate with a label per
+instance."""
+from anyio import to_thread
+
+from . import instrumentation
+from .cache import response_cache
+from .database import pool_metrics
+from .passwords import password_pool
+from .principals import principal_cache
+from .readiness import readiness
+from .security import token_cache
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+class Exposition:
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def family(self, name: str, kind: str, description: str, samples):
+        """samples: (labels, value) pairs, or a single value for a metric without labels"""
+        self.lines.append(f"# HELP {name} {description}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        if not isinstance(samples, list):
+            samples = [({}, samples)]
+        for labels, value in samples:
+            self.lines.append(f"{name}{format_labels(labels)} {value}")
+
+    def histogram(self, name: str, description: str, bounds, series):
+        """series: (labels, per bound counts with the overflow last, count, sum)"""
+        self.lines.append(f"# HELP {name} {description}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for labels, buckets, count, total in series:
+            cumulative = 0
+            for bound, bucket in zip(bounds, buckets):
+                cumulative += bucket
+                self.lines.append(f"{name}_bucket{format_labels({**labels, 'le': bound})} {cumulative}")
+            self.lines.append(f"{name}_bucket{format_labels({**labels, 'le': '+Inf'})} {count}")
+            self.lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            self.lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render_metrics() -> str:
+    out = Exposition()
+
+    # Cold start of the worker
+    out.family("rato_cold_start_seconds", "gauge", "Duration of each phase of the worker's cold start.",
+               [({"phase": phase}, seconds) for phase, seconds in readiness.cold_start().items()])
+
+    # Requests
+    out.histogram(
+        "rato_http_request_duration_seconds", "Time to answer a request, by route template, method and status.",
+        instrumentation.LATENCY_BUCKETS,
+        [({"route": route, "method": method, "status": status}, latency.buckets, latency.count, latency.seconds)
+         for (route, method, status), latency in sorted(instrumentation.route_latencies.items())],
+    )
+    out.family("rato_http_requests_in_flight", "gauge", "Requests being served.", instrumentation.in_flight)
+
+    # SQL statements of the requests
+    routes = sorted(instrumentation.route_queries.items())
+    out.histogram(
+        "rato_db_statements_per_request", "SQL statements sent by a request.",
+        instrumentation.STATEMENT_BUCKETS,
+        [({"route": route}, stats.buckets, stats.requests, stats.statements) for route, stats in routes],
+    )
+    out.family("rato_db_seconds_total", "counter", "Time requests spent waiting on SQL statements.",
+               [({"route": route}, stats.seconds) for route, stats in routes])
+    out.family("rato_db_slow_statements_total", "counter", "SQL statements slower than DATABASE_SLOW_QUERY_MS.",
+               [({"route": route}, stats.slow_statements) for route, stats in routes])
+
+    # Connection pool of the async engine
+    pool = pool_metrics()
+    out.family("rato_db_pool_size", "gauge", "Connections kept by the pool.", pool["size"])
+    out.family("rato_db_pool_checked_out", "gauge", "Connections in use.", pool["checked_out"])
+    out.family("rato_db_pool_overflow", "gauge", "Connections open beyond the pool size.", pool["overflow"])
+    out.family("rato_db_pool_max_overflow", "gauge", "Connections allowed beyond the pool size.", pool["max_overflow"])
+    out.family("rato_db_pool_checkouts_total", "counter", "Connections handed out.", pool["checkouts"])
+    out.family("rato_db_pool_wait_seconds_total", "counter", "Time spent waiting for a connection.",
+               pool["wait_seconds_total"])
+
+    # Threads running sync code (run_in_threadpool, sync dependencies)
+    limiter = to_thread.current_default_thread_limiter()
+    statistics = limiter.statistics()
+    out.family("rato_threadpool_threads", "gauge", "Threads available to run sync code.", limiter.total_tokens)
+    out.family("rato_threadpool_threads_in_use", "gauge", "Threads running sync code.", statistics.borrowed_tokens)
+    out.family("rato_threadpool_tasks_waiting", "gauge", "Calls waiting for a free thread.", statistics.tasks_waiting)
+
+    # Caches
+    cache_stats = sorted(response_cache.metrics().items())
+    out.family("rato_response_cache_hits_total", "counter", "Responses served from the response cache.",
+               [({"route": route}, counts["hits"]) for route, counts in cache_stats])
+    out.family("rato_response_cache_misses_total", "counter", "Responses computed for the response cache.",
+               [({"route": route}, counts["misses"]) for route, counts in cache_stats])
+    out.family("rato_principal_cache_hits_total", "counter", "Users served from the principal cache.",
+               principal_cache.hits)
+    out.family("rato_principal_cache_misses_total", "counter", "Users loaded from the users table.",
+               principal_cache.misses)
+    out.family("rato_token_cache_hits_total", "counter", "Access tokens served from the token cache.", token_cache.hits)
+    out.family("rato_token_cache_misses_total", "counter", "Access tokens decoded and verified.", token_cache.misses)
+
+    # Password hashing
+    passwords = password_pool.metrics()
+    out.family("rato_password_hash_workers", "gauge", "Processes hashing passwords.", passwords["workers"])
+    out.family("rato_password_hash_in_flight", "gauge", "Password hashes running or waiting.", passwords["in_flight"])
+    out.family("rato_password_hash_queued", "gauge", "Password hashes waiting for a process.", passwords["queued"])
+    out.family("rato_password_hash_rejected_total", "counter", "Requests refused with a 503, the queue being full.",
+               passwords["rejected"])
+
+    return out.render()
@@ -0,0 +1,79 @@
+"""Schema migrations, out of the workers' startup path.
+
+Migrations are applied by `python -m app.cli migrate` (a deploy step, run once) and the
+workers only check at startup that the database is at the revision their code expects,
+which is one query. Whoever migrates first takes a Postgres advisory lock, so several
+processes starting a migration at once (e.g. DATABASE_MIGRATE_ON_STARTUP with N workers)
+run it one after the other, the later ones finding nothing left to do.
+
+Alembic (and Mako with it) is only imported to migrate. The check reads the revision
+identifiers of the scripts itself, so a worker starts without importing it."""
+import os
+import re
+
+from sqlalchemy import text
+
+from .database import async_engine, engine
+
+# Key of the advisory lock held while migrating, any constant shared by every process
+MIGRATION_LOCK_KEY = 72_617_401
+
+ALEMBIC_DIRECTORY = os.path.join(os.path.dirname(__file__), "../..")
+VERSIONS_DIRECTORY = os.path.join(ALEMBIC_DIRECTORY, "alembic/versions")
+
+# The identifiers at the top of a migration script, as Alembic generates them
+REVISION = re.compile(r"^revision\b[^=]*=\s*['\"](\w+)['\"]", re.MULTILINE)
+DOWN_REVISION = re.compile(r"^down_revision\b[^=]*=(.*)$", re.MULTILINE)
+
+
+def alembic_config():
+    from alembic.config import Config
+
+    return Config(os.path.join(ALEMBIC_DIRECTORY, "alembic.ini"))
+
+
+def migrate(revision: str = "head"):
+    """Upgrade the database to `revision`, waiting for any other process migrating it"""
+    from alembic import command
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            command.upgrade(alembic_config(), revision)
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def expected_heads() -> set[str]:
+    # Revisions no other script revises, read from the scripts without importing them
+    revisions, revised = set(), set()
+    for name in os.listdir(VERSIONS_DIRECTORY):
+        if not name.endswith(".py"):
+            continue
+        with open(os.path.join(VERSIONS_DIRECTORY, name)) as file:
+            source = file.read()
+        revision = REVISION.search(source)
+        if revision is None:
+            continue
+        revisions.add(revision.group(1))
+        down_revision = DOWN_REVISION.search(source)
+        if down_revision is not None:
+            # A string, None, or a tuple of strings for a merge
+            revised.update(re.findall(r"['\"](\w+)['\"]", down_revision.group(1)))
+    return revisions - revised
+
+
+async def check_schema_revision():
+    """Raise if the database isn't at the revision of the code"""
+    async with async_engine.connect() as connection:
+        if (await connection.execute(text("SELECT to_regclass('alembic_version')"))).scalar() is None:
+            current = set()
+        else:
+            current = set((await connection.execute(text("SELECT version_num FROM alembic_version"))).scalars())
+
+    expected = expected_heads()
+    if current != expected:
+        raise RuntimeError(
+            f"Database schema is at {', '.join(sorted(current)) or 'no revision'}, the code expects "
+            f"{', '.join(sorted(expected))}. Run `python -m app.cli migrate` first."
+        )
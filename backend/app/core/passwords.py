@@ -0,0 +1,72 @@
+"""bcrypt runs in a pool of processes of its own. Run in the request threadpool, a burst of
+logins took every thread and stalled the sync work of the other endpoints, and a bcrypt
+hash in this process would compete with the event loop for the GIL.
+
+The pool holds `password_hash_workers` processes, and at most `password_hash_max_queue`
+hashes wait for one. Past that the request is refused with a 503 and a Retry-After, rather
+than queueing logins that would time out client-side anyway."""
+import asyncio
+
+from fastapi import HTTPException, status
+
+from . import security
+from .config import settings
+
+
+class PasswordPool:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        # concurrent.futures.ProcessPoolExecutor, imported when the pool starts
+        self.executor = None
+        # Hashes running or waiting
+        self.in_flight = 0
+        self.rejected = 0
+
+    def start(self):
+        if self.executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Spawned rather than forked, forking a process running an event loop and
+            # other threads can copy their locks in a held state
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def run(self, fn, *args):
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many password checks in progress, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        self.start()
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(security.hash_password, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await self.run(security.verify_and_update_password, password, hashed_password)
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queued": max(self.in_flight - self.workers, 0),
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+
+password_pool = PasswordPool(settings.password_hash_workers, settings.password_hash_max_queue)
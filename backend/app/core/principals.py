@@ -0,0 +1,54 @@
+"""Users loaded by get_current_user, kept for a short time so an authenticated request
+doesn't have to SELECT its user again.
+
+Entries are invalidated by the writes that change what a user may do (role update, delete)
+in the worker that made them. Other workers keep their entry until it expires, which bounds
+how long a demoted or deleted user keeps their rights there."""
+import time
+from collections import OrderedDict
+
+from .. import models
+from .config import settings
+
+
+class PrincipalCache:
+    """LRU of detached users with a TTL. The users are shared between requests, treat them
+    as read only."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict[int, tuple[float, models.User]] = OrderedDict()
+        # Bumped by every invalidation, a user loaded before one may be stale and isn't stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> models.User | None:
+        entry = self.entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            self.entries.pop(user_id, None)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, user: models.User, generation: int):
+        if self.ttl <= 0 or generation != self.generation:
+            return
+        self.entries[user.user_id] = (time.monotonic() + self.ttl, user)
+        self.entries.move_to_end(user.user_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """Call after the write has committed"""
+        self.generation += 1
+        self.entries.pop(user_id, None)
+
+    def metrics(self) -> dict:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+principal_cache = PrincipalCache(settings.auth_principal_cache_max_entries, settings.auth_principal_cache_ttl_seconds)
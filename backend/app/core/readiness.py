@@ -0,0 +1,103 @@
+"""Readiness of this worker, for the load balancer or orchestrator.
+
+The worker starts answering requests as soon as the schema check passed, and warms up in
+the background: it opens the pool's connections and requests the WARMUP_PATHS through the
+app, which fills the response cache and runs each route once. /monitoring/ready answers 503
+until that is done, so traffic is only sent to warm workers.
+
+Modules only some requests need (jose for tokens, httpx here) aren't imported at boot, the
+warm-up imports them instead. How long each phase of the cold start took is logged once the
+worker is warm, and reported by /monitoring/ready and /metrics."""
+import asyncio
+import importlib
+import logging
+import time
+
+from sqlalchemy import text
+
+from .. import STARTED
+from .config import settings
+from .database import async_engine
+
+log = logging.getLogger("uvicorn")
+
+# Imported by the warm-up rather than at boot
+DEFERRED_IMPORTS = ("jose.jwt",)
+
+
+class Readiness:
+    def __init__(self):
+        self.schema_checked = False
+        self.pool_connected = False
+        self.caches_primed = False
+        # Seconds from STARTED to each step of the cold start: "imported" (app.main loaded),
+        # "serving" (startup done), "ready" (warm)
+        self.timeline: dict[str, float] = {}
+
+    def mark(self, step: str):
+        self.timeline[step] = round(time.perf_counter() - STARTED, 4)
+
+    def cold_start(self) -> dict:
+        # Duration of each phase, those not over yet left out
+        phases, previous = {}, 0.0
+        for phase, step in (("imports", "imported"), ("startup", "serving"), ("warmup", "ready")):
+            if step not in self.timeline:
+                break
+            phases[phase] = round(self.timeline[step] - previous, 4)
+            previous = self.timeline[step]
+        if "ready" in self.timeline:
+            phases["total"] = self.timeline["ready"]
+        return phases
+
+    @property
+    def ready(self) -> bool:
+        return self.schema_checked and self.pool_connected and self.caches_primed
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "schema_checked": self.schema_checked,
+            "pool_connected": self.pool_connected,
+            "caches_primed": self.caches_primed,
+            "cold_start_seconds": self.cold_start(),
+        }
+
+
+readiness = Readiness()
+
+
+async def connect_pool():
+    # Opens pool_size connections at once, they stay in the pool afterwards
+    async def ping():
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    await asyncio.gather(*[ping() for _ in range(settings.database_pool_size)])
+
+
+async def prime_caches(app):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://warmup") as client:
+        for path in settings.all_warmup_paths:
+            response = await client.get(path)
+            if response.status_code >= 500:
+                log.warning("Warming up %s answered %s", path, response.status_code)
+
+
+async def warm_up(app):
+    try:
+        await connect_pool()
+        readiness.pool_connected = True
+        for module in DEFERRED_IMPORTS:
+            importlib.import_module(module)
+        await prime_caches(app)
+        readiness.caches_primed = True
+        readiness.mark("ready")
+        phases = readiness.cold_start()
+        log.info("Worker is warm, cold start %.2fs (imports %.2fs, startup %.2fs, warm-up %.2fs)",
+                 phases["total"], phases["imports"], phases["startup"], phases["warmup"])
+    except Exception:
+        # Stays not ready, the orchestrator restarts or stops routing to it
+        log.exception("Warming up the worker failed")
@@ -1,8 +1,14 @@
-from jose import JWTError, jwt
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
+from functools import cache
 from .. import schemas
 from .config import settings
-from passlib.context import CryptContext
+
+# jose (through its cryptography backends) and passlib are imported on first use: a worker
+# signs and checks its first token after it started, and only the password hashing
+# processes need passlib
 
 # SECRET_KEY
 # Algorithm
@@ -13,13 +19,69 @@ ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
 def create_access_token(data: dict):
+    from jose import jwt
+
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+class TokenCache:
+    """Claims of the tokens verified recently, kept until the token expires. Keyed by a
+    digest so the tokens themselves aren't kept in memory"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[bytes, tuple[float, schemas.TokenData]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> schemas.TokenData | None:
+        key = self.key(token)
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, token: str, expires_at: float, token_data: schemas.TokenData):
+        if self.max_entries <= 0:
+            return
+        key = self.key(token)
+        self.entries[key] = (expires_at, token_data)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+token_cache = TokenCache(settings.auth_token_cache_max_entries)
+
+
 def verify_access_token(token: str, credentials_exception):
+    # A token seen before and not expired yet has a valid signature
+    token_data = token_cache.get(token)
+    if token_data:
+        return token_data
+
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("user_id")
@@ -31,15 +93,34 @@ def verify_access_token(token: str, credentials_exception):
         token_data = schemas.TokenData(user_id=user_id, role=role)
     except JWTError:
         raise credentials_exception
+
+    # Tokens without an expiry aren't cached, they would never leave the cache
+    if payload.get("exp") is not None:
+        token_cache.set(token, payload["exp"], token_data)
     
     return token_data
 
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. Hashes made with another cost are reported as needing an update, and
+# rehashed at the next login
+@cache
+def pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=settings.password_bcrypt_rounds,
+        bcrypt__min_desired_rounds=settings.password_bcrypt_rounds,
+        bcrypt__max_desired_rounds=settings.password_bcrypt_rounds,
+    )
 
 def hash_password(password: str):
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return pwd_context().verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    # (matches, new hash if the stored one should be replaced)
+    return pwd_context().verify_and_update(plain_password, hashed_password)
\ No newline at end of file
@@ -1,28 +1,58 @@
+import asyncio
 import logging
-import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
 from .api.main import api_router
+from .api.pagination import NEXT_CURSOR_HEADER
 from .core.config import settings
-
-from alembic import command
-from alembic.config import Config
+from .core.cache import response_cache
+from .core.database import async_engine
+from .core.instrumentation import InstrumentationMiddleware
+from .core.migrations import check_schema_revision, migrate
+from .core.passwords import password_pool
+from .core.readiness import readiness, warm_up
+from .services.leaderboards import run_leaderboard_refresh
+from .services.votes import vote_counter
 
 log = logging.getLogger("uvicorn")
 
-# Add this function to run migrations
-def run_migrations():
-    alembic_cfg = Config(os.path.join(os.path.dirname(__file__), '../alembic.ini'))
-    command.upgrade(alembic_cfg, "head")
+
+async def cancel(task: asyncio.Task):
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    log.info("Running migrations at startup...")
-    run_migrations()
+    # Migrations are a deploy step (python -m app.cli migrate), a worker only checks the
+    # schema is the one its code expects
+    if settings.database_migrate_on_startup:
+        log.info("Running migrations at startup...")
+        await run_in_threadpool(migrate)
+    await check_schema_revision()
+    readiness.schema_checked = True
+
+    password_pool.start()
+    vote_flush = asyncio.create_task(vote_counter.run(settings.vote_flush_interval_seconds))
+    leaderboard_refresh = asyncio.create_task(run_leaderboard_refresh(settings.leaderboard_refresh_interval_seconds))
+    warmup = asyncio.create_task(warm_up(app))
+    readiness.mark("serving")
     yield
     log.info("Application shutdown...")
+    await cancel(warmup)
+    await cancel(vote_flush)
+    await cancel(leaderboard_refresh)
+    # Count what was voted on since the last flush
+    await vote_counter.flush()
+    await response_cache.close()
+    password_pool.shutdown()
+    await async_engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -30,6 +60,9 @@ app = FastAPI(lifespan=lifespan)
 # Include the routes
 app.include_router(api_router)
 
+# Latency and SQL statements of every request, in the Server-Timing header and /metrics
+app.add_middleware(InstrumentationMiddleware)
+
 # Set all CORS enabled origins
 if settings.all_cors_origins:
     app.add_middleware(
@@ -38,8 +71,13 @@ if settings.all_cors_origins:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER],
     )
 
 @app.get('/')
 def root():
-    return {"message": "Access /docs to see the API documentation"}
\ No newline at end of file
+    return {"message": "Access /docs to see the API documentation"}
+
+
+# End of the imports of a worker's cold start
+readiness.mark("imported")
\ No newline at end of file
@@ -1,6 +1,7 @@
-from datetime import datetime
-from sqlmodel import TIMESTAMP, Column, Field, Float, Relationship, SQLModel
-from sqlalchemy import CheckConstraint, func
+from datetime import date, datetime
+from sqlmodel import TIMESTAMP, Column, Date, Field, Float, Integer, Relationship, SQLModel
+from sqlalchemy import CheckConstraint, Computed, Index, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from .schemas import UserRole
 from typing import Optional
 
@@ -25,6 +26,21 @@ class Category(SQLModel, table=True):
 
 class Business(SQLModel, table=True):
     __tablename__ = "businesses"
+    __table_args__ = (
+        # Keyset pagination of the business listings
+        Index("ix_businesses_name_business_id", "name", "business_id"),
+        Index("ix_businesses_category_id_name_business_id", "category_id", "name", "business_id"),
+        # The other sorts of the listings (see BUSINESS_SORTS), read backwards for the best first
+        Index("ix_businesses_average_rating_business_id", "average_rating", "business_id"),
+        Index("ix_businesses_category_id_average_rating_business_id", "category_id", "average_rating", "business_id"),
+        Index("ix_businesses_review_count_business_id", "review_count", "business_id"),
+        Index("ix_businesses_category_id_review_count_business_id", "category_id", "review_count", "business_id"),
+        Index("ix_businesses_created_at_business_id", "created_at", "business_id"),
+        Index("ix_businesses_category_id_created_at_business_id", "category_id", "created_at", "business_id"),
+        Index("ix_businesses_supervisor_id", "supervisor_id"),
+        # Incremental exports, businesses changed since the last pull
+        Index("ix_businesses_updated_at_business_id", "updated_at", "business_id"),
+    )
     business_id: int | None = Field(default=None, primary_key=True)
     name: str = Field(unique=True, nullable=False)
     description: str | None = None
@@ -38,20 +54,66 @@ class Business(SQLModel, table=True):
     category: Category | None = Relationship()
     supervisor_id: int | None = Field(foreign_key="users.user_id", nullable=True)
 
+    # Review aggregates, kept up to date by every review write (see services/aggregates.py)
+    # so reads never have to count or average the reviews table
+    review_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    rating_sum: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    rating_1_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    rating_2_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    rating_3_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    rating_4_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    rating_5_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+
+    # Bumped by every write that changes what the business page shows (see
+    # services/revisions.py), the read endpoints answer conditional requests from them
+    revision: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    updated_at: datetime = Field(sa_column=Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False))
+
+# Full text search document of a business (see services/search.py): name, location and
+# description, weighted in that order. It is a generated column that lives on the table but
+# is deliberately not mapped on the model, so loading businesses never drags it along.
+Business.__table__.append_column(
+    Column(
+        "search_vector",
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(location, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'C')",
+            persisted=True,
+        ),
+    )
+)
+Index("ix_businesses_search_vector", Business.__table__.c.search_vector, postgresql_using="gin")
+
 class ReviewReply(SQLModel, table=True):
     __tablename__ = "review_replies"
+    __table_args__ = (
+        # A review has at most one reply
+        Index("ix_review_replies_review_id", "review_id", unique=True),
+        Index("ix_review_replies_supervisor_id", "supervisor_id"),
+    )
     review_reply_id: int | None = Field(default=None, primary_key=True)
     review_id: int = Field(foreign_key="reviews.review_id", ondelete="CASCADE", nullable=False)
     supervisor_id: int = Field(foreign_key="users.user_id", ondelete="CASCADE", nullable=False)
     reply_text: str = Field(nullable=False)
     created_at: datetime = Field(sa_column=Column(TIMESTAMP(timezone=True), server_default=func.now()))
     review: Optional["Review"] = Relationship(back_populates="reply")
+    supervisor: User | None = Relationship()
 
 
 class Review(SQLModel, table=True):
     __tablename__ = "reviews"
     __table_args__ = (
         CheckConstraint('rating BETWEEN 1 AND 5', name='check_rating_range'),
+        # Keyset pagination of reviews, newest first
+        Index("ix_reviews_business_id_created_at_review_id", "business_id", "created_at", "review_id"),
+        Index("ix_reviews_created_at_review_id", "created_at", "review_id"),
+        Index("ix_reviews_user_id", "user_id"),
+        # Most voted reviews of a business first
+        Index("ix_reviews_business_id_votes_count_review_id", "business_id", "votes_count", "review_id"),
+        # Incremental exports, reviews changed since the last pull
+        Index("ix_reviews_updated_at_review_id", "updated_at", "review_id"),
     )
     review_id: int | None = Field(default=None, primary_key=True)
     rating: int = Field(nullable=False)
@@ -60,6 +122,11 @@ class Review(SQLModel, table=True):
     user_id: int = Field(foreign_key="users.user_id", ondelete="CASCADE", nullable=False)
     business_id: int = Field(foreign_key="businesses.business_id", ondelete="CASCADE", nullable=False)
     created_at: datetime = Field(sa_column=Column(TIMESTAMP(timezone=True), server_default=func.now()))
+    # Number of rows in review_votes, set by the periodic vote flush (see services/votes.py)
+    votes_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    # Any UPDATE of the row sets it, edits as well as vote count flushes
+    updated_at: datetime = Field(sa_column=Column(TIMESTAMP(timezone=True), server_default=func.now(),
+                                                  onupdate=func.clock_timestamp(), nullable=False))
 
     # This is not actually a column in the db, we are just using it to return a user object when 
     # we retrive a review
@@ -68,5 +135,54 @@ class Review(SQLModel, table=True):
 
 class ReviewVote(SQLModel, table=True):
     __tablename__ = "review_votes"
+    __table_args__ = (
+        # The primary key (review_id, user_id) covers lookups by review, this one covers lookups by user
+        Index("ix_review_votes_user_id_review_id", "user_id", "review_id"),
+    )
     review_id: int = Field(foreign_key="reviews.review_id", ondelete="CASCADE", primary_key=True, nullable=False)
-    user_id: int = Field(foreign_key="users.user_id", ondelete="CASCADE", primary_key=True, nullable=False)
\ No newline at end of file
+    user_id: int = Field(foreign_key="users.user_id", ondelete="CASCADE", primary_key=True, nullable=False)
+    created_at: datetime = Field(sa_column=Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False))
+
+# Best businesses of each category, rebuilt from the business aggregates by the periodic
+# leaderboard refresh (see services/leaderboards.py). The leaderboard endpoints read this
+# table alone, so it carries what they show
+class LeaderboardEntry(SQLModel, table=True):
+    __tablename__ = "category_leaderboards"
+    category_id: int = Field(foreign_key="categories.category_id", ondelete="CASCADE", primary_key=True)
+    rank: int = Field(primary_key=True)
+    # Not a foreign key, the entry of a deleted business stays until its category is rebuilt
+    business_id: int = Field(nullable=False)
+    name: str = Field(nullable=False)
+    logo: str = Field(nullable=False)
+    location: str = Field(nullable=False)
+    score: float = Field(sa_column=Column(Float, nullable=False))
+    average_rating: float = Field(sa_column=Column(Float, nullable=False))
+    review_count: int = Field(nullable=False)
+
+# Businesses changed since the leaderboard of their category was last rebuilt, marked in the
+# transaction of the write changing them and taken by the leaderboard refresh. No foreign key
+# to businesses: the mark of a deleted business stays until its leaderboard is rebuilt
+class LeaderboardDirty(SQLModel, table=True):
+    __tablename__ = "leaderboard_dirty"
+    business_id: int = Field(primary_key=True)
+    category_id: int = Field(foreign_key="categories.category_id", ondelete="CASCADE", primary_key=True)
+    marked_at: datetime = Field(sa_column=Column(TIMESTAMP(timezone=True), nullable=False))
+
+# Activity of a business per UTC day, for the dashboards (see services/rollups.py). Kept up to
+# date by deltas in the transactions of the writes, rebuilt by `app.cli backfill-rollups`
+class BusinessDailyStats(SQLModel, table=True):
+    __tablename__ = "business_daily_stats"
+    business_id: int = Field(foreign_key="businesses.business_id", ondelete="CASCADE", primary_key=True)
+    day: date = Field(sa_column=Column(Date, primary_key=True))
+    # Reviews written that day and their ratings
+    review_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    rating_sum: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    rating_1_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    rating_2_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    rating_3_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    rating_4_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    rating_5_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    # Reviews written that day that got a reply
+    replied_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
+    # Votes cast that day on the reviews of the business
+    vote_count: int = Field(default=0, sa_column=Column(Integer, server_default="0", nullable=False))
@@ -1,8 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Literal
 from enum import Enum
-from sqlmodel import Column, Field, Float, SQLModel
-from pydantic import BaseModel, EmailStr
+from sqlmodel import Field, SQLModel
+from pydantic import BaseModel, EmailStr, field_validator
 
 
 # Role enum
@@ -59,7 +59,6 @@ class CategoryPublic(CategoryBase):
 class BusinessBase(SQLModel):
     name: str = Field(unique=True, nullable=False)
     description: str | None = None
-    average_rating: float = Field(default=0.0, sa_column=Column(Float, server_default="0.0"))
     location: str = Field(nullable=False)
     logo: str = Field(nullable=False)
     number: str | None = None
@@ -67,6 +66,8 @@ class BusinessBase(SQLModel):
 
 class BusinessPublic(BusinessBase):
     business_id: int
+    # Derived from the reviews (see services/aggregates.py), never written by clients
+    average_rating: float
     category_id: int
     supervisor_id : int | None = None
     category: CategoryBase | None
@@ -79,7 +80,6 @@ class BusinessUpdate(BusinessBase):
     category_id: int | None = None
     name: str | None = None
     description: str | None = None
-    average_rating: float | None = None
     location: str | None = None
     logo: str | None = None
     number: str | None = None
@@ -96,10 +96,18 @@ class ReviewCreate(ReviewBase):
     pass
 
 class ReviewUpdate(ReviewBase):
-    rating: int | None = None
+    rating: int | None = Field(default=None, ge=1, le=5)
     review_text: str | None = None
     review_title: str | None = None
 
+    # Left out to keep the current value, the columns can't be null
+    @field_validator("rating", "review_text", "review_title")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("can be left out but not null")
+        return value
+
 class ReviewPublic(ReviewBase):
     review_id: int
     user_id: int
@@ -110,15 +118,100 @@ class ReviewPublicWithVote(SQLModel):
     Review: ReviewPublic
     votes_count: int
 
+# Review reply classes
+class ReviewReplyPublic(SQLModel):
+    review_reply_id: int
+    reply_text: str
+    created_at: datetime
+    supervisor: UserBase | None
+
+# A review together with its reply and vote count, as shown on a business page
+class ReviewWithReply(SQLModel):
+    review: ReviewPublic
+    reply: ReviewReplyPublic | None
+    votes_count: int
+
 
 # Business with review count
 class BusinessWithReviewCount(SQLModel):
     business: BusinessPublic
     reviews_count: int
 
+# Autocomplete suggestion
+class BusinessSuggestion(SQLModel):
+    business_id: int
+    name: str
+    logo: str
+
 # Vote classes
 class Vote(SQLModel):
     review_id: int
     # Direction just means : 0 no vote, 1 vote, in any social media you will click on like (direction=1) and 
     # you can click again to remove it (direction=0)
-    direction: Literal[0, 1]
\ No newline at end of file
+    direction: Literal[0, 1]
+
+# A review the current user has voted on
+class UserVote(SQLModel):
+    review_id: int
+
+# Bulk import classes
+# A historical review, for another user and business than the importer's
+class ReviewImport(ReviewCreate):
+    business_id: int
+    user_id: int
+    created_at: datetime | None = None
+
+class ImportRowError(SQLModel):
+    # Line of the file, the header of a CSV file being line 1
+    line: int
+    error: str
+
+class ImportReport(SQLModel):
+    kind: str
+    received: int
+    imported: int
+    rejected: int
+    # The first IMPORT_MAX_ERRORS rejected rows
+    errors: list[ImportRowError]
+    businesses_updated: int = 0
+
+
+# A business on its category's leaderboard
+class LeaderboardEntryPublic(SQLModel):
+    category_id: int
+    rank: int
+    business_id: int
+    name: str
+    logo: str
+    location: str
+    # Bayesian average rating, what the rank is based on
+    score: float
+    average_rating: float
+    review_count: int
+
+
+# Activity of a business over a day, a week or a month starting on `start`
+class StatsPoint(SQLModel):
+    start: date
+    review_count: int
+    rating_sum: int
+    rating_1_count: int
+    rating_2_count: int
+    rating_3_count: int
+    rating_4_count: int
+    rating_5_count: int
+    # Of the reviews written in the period, those with a reply
+    replied_count: int
+    vote_count: int
+    # None without reviews in the period
+    average_rating: float | None
+    reply_rate: float | None
+
+class BusinessTrend(SQLModel):
+    business_id: int
+    start: date
+    end: date
+    interval: Literal["day", "week", "month"]
+    # The whole range, then each period of it (every one, the quiet ones at 0)
+    totals: StatsPoint
+    points: list[StatsPoint]
@@ -0,0 +1,168 @@
+from collections import Counter
+
+from sqlmodel import Session, case, cast, func, select, tuple_, update
+from sqlalchemy import Float, Numeric
+
+from .. import models
+from .leaderboards import mark_leaderboards_stale
+from .revisions import revision_values
+
+RATINGS = (1, 2, 3, 4, 5)
+AGGREGATE_COLUMNS = ("review_count", "rating_sum", *[f"rating_{rating}_count" for rating in RATINGS])
+
+
+def average_rating_expression(review_count, rating_sum):
+    return case(
+        (review_count > 0, func.round(cast(rating_sum, Numeric) / review_count, 1)),
+        else_=0.0,
+    )
+
+
+def rating_delta_values(deltas: Counter) -> dict:
+    # Changes of the aggregate columns for per-star deltas ({rating: +n / -n})
+    return {
+        "review_count": sum(deltas.values()),
+        "rating_sum": sum(rating * delta for rating, delta in deltas.items()),
+        **{f"rating_{rating}_count": delta for rating, delta in deltas.items() if delta},
+    }
+
+
+def apply_rating_deltas(session: Session, business_id: int, deltas: Counter):
+    """Shift the stored aggregates of a business by `deltas` ({rating: +n / -n}).
+
+    This is one relative UPDATE (count = count + n, ...) executed in the caller's
+    transaction, so it commits or rolls back together with the review write and never
+    has to read the other reviews of the business. It bumps the business revision too."""
+    deltas = {rating: delta for rating, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    values = {
+        column: getattr(models.Business, column) + delta for column, delta in rating_delta_values(deltas).items()
+    }
+    values["average_rating"] = average_rating_expression(values["review_count"], values["rating_sum"])
+    values.update(revision_values())
+
+    session.exec(
+        update(models.Business)
+        .where(models.Business.business_id == business_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def apply_review_delta(session: Session, business_id: int,
+                       added_rating: int | None = None, removed_rating: int | None = None):
+    # A review insert, delete or rating change, expressed as per-star deltas
+    deltas = Counter()
+    if added_rating is not None:
+        deltas[added_rating] += 1
+    if removed_rating is not None:
+        deltas[removed_rating] -= 1
+    apply_rating_deltas(session, business_id, deltas)
+    if added_rating != removed_rating:
+        mark_leaderboards_stale(session, [business_id])
+
+
+def remove_user_reviews_from_aggregates(session: Session, user_id: int) -> list[int]:
+    """Take a user's reviews out of the business aggregates. Deleting a user removes their
+    reviews through ON DELETE CASCADE, which the ORM never sees. Returns the ids of the
+    businesses the user reviewed."""
+    rows = session.exec(
+        select(models.Review.business_id, models.Review.rating, func.count())
+        .where(models.Review.user_id == user_id)
+        .group_by(models.Review.business_id, models.Review.rating)
+    ).all()
+
+    deltas: dict[int, Counter] = {}
+    for business_id, rating, count in rows:
+        deltas.setdefault(business_id, Counter())[rating] -= count
+
+    for business_id, business_deltas in deltas.items():
+        apply_rating_deltas(session, business_id, business_deltas)
+    if deltas:
+        mark_leaderboards_stale(session, list(deltas))
+    return list(deltas)
+
+
+def actual_aggregates_query():
+    # The aggregates as they should be, recomputed from the reviews table. Every business
+    # has a row, zeros for one without reviews
+    return (
+        select(
+            models.Business.business_id,
+            func.count(models.Review.review_id).label("review_count"),
+            func.coalesce(func.sum(models.Review.rating), 0).label("rating_sum"),
+            *[
+                func.count(models.Review.review_id).filter(models.Review.rating == rating).label(f"rating_{rating}_count")
+                for rating in RATINGS
+            ],
+        )
+        .outerjoin(models.Review, models.Review.business_id == models.Business.business_id)
+        .group_by(models.Business.business_id)
+    )
+
+
+def recompute_business_aggregates(session: Session, business_ids) -> list[int]:
+    """Overwrite the aggregates of the businesses selected by `business_ids` (a subquery
+    or a list) with values recomputed from their reviews, e.g. after a bulk import. The
+    rows are locked first and the reviews counted after, so a review write racing with it
+    either committed before the count or applies its delta after it. Returns the
+    businesses ids."""
+    locked = session.exec(
+        select(models.Business.business_id)
+        .where(models.Business.business_id.in_(business_ids))
+        .order_by(models.Business.business_id)
+        .with_for_update()
+    ).all()
+    if not locked:
+        return []
+
+    actual = actual_aggregates_query().where(models.Business.business_id.in_(locked)).subquery()
+    session.exec(
+        update(models.Business)
+        .where(models.Business.business_id == actual.c.business_id)
+        .values(
+            **{column: getattr(actual.c, column) for column in AGGREGATE_COLUMNS},
+            average_rating=average_rating_expression(actual.c.review_count, actual.c.rating_sum),
+            **revision_values(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    mark_leaderboards_stale(session, locked)
+    return list(locked)
+
+
+def reconcile_business_aggregates(session: Session, repair: bool = False) -> list[dict]:
+    """Compare the stored aggregates and average rating of every business with the reviews
+    table.
+
+    Returns one entry per drifted business with its stored and actual values. With
+    repair=True the drifted businesses are recomputed by recompute_business_aggregates,
+    under the lock of their rows: a review written since the comparison is counted too."""
+    actual = actual_aggregates_query().subquery()
+    columns = (*AGGREGATE_COLUMNS, "average_rating")
+    stored_columns = [getattr(models.Business, column) for column in columns]
+    actual_columns = [
+        *[getattr(actual.c, column) for column in AGGREGATE_COLUMNS],
+        cast(average_rating_expression(actual.c.review_count, actual.c.rating_sum), Float),
+    ]
+
+    rows = session.exec(
+        select(models.Business.business_id, *stored_columns, *actual_columns)
+        .join(actual, actual.c.business_id == models.Business.business_id)
+        .where(tuple_(*stored_columns).is_distinct_from(tuple_(*actual_columns)))
+        .order_by(models.Business.business_id)
+    ).all()
+
+    drifted = []
+    for business_id, *values in rows:
+        stored = dict(zip(columns, values[:len(columns)]))
+        expected = dict(zip(columns, values[len(columns):]))
+        drifted.append({"business_id": business_id, "stored": stored, "actual": expected})
+
+    if repair and drifted:
+        recompute_business_aggregates(session, [entry["business_id"] for entry in drifted])
+        session.commit()
+
+    return drifted
@@ -0,0 +1,188 @@
+"""Bulk exports of whole tables for the analytics pulls, as NDJSON or CSV.
+
+The rows come from a server-side cursor, `export_batch_size` at a time, and each batch is
+encoded and sent before the next one is fetched, so an export holds one batch in memory
+whatever the size of the table. Rows are plain tuples of the exported columns, no ORM
+objects are built.
+
+Rows are ordered by primary key, an interrupted export resumes with `after_id` set to the
+last id received. The votes are keyed on (review_id, user_id): they resume after both, with
+`after_id` the last review_id and `after_user_id` the last user_id. Incremental pulls pass `updated_since` (reviews and businesses) or
+`created_from` (votes and users), overlapping the previous pull by a few seconds: a row is
+stamped when it is written, not when its transaction commits."""
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Literal
+
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, Enum as SAEnum, select, tuple_
+
+from .. import models
+from ..core.database import async_engine
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+@dataclass(frozen=True)
+class ExportFilters:
+    business_id: int | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    updated_since: datetime | None = None
+    after_id: int | None = None
+    after_user_id: int | None = None
+
+
+@dataclass(frozen=True)
+class Export:
+    # Exported columns, in the order of the output
+    columns: tuple
+    # Primary key columns, the order of the rows. The resume values (after_id, then
+    # after_user_id) are compared to them as a whole
+    keys: tuple
+    created_at: Any
+    updated_at: Any = None
+    business_id: Any = None
+    # Tables joined to reach business_id
+    joins: tuple = ()
+
+    def statement(self, filters: ExportFilters):
+        conditions = []
+        if filters.business_id is not None:
+            conditions.append(self.filter_column(self.business_id, "business_id") == filters.business_id)
+        if filters.created_from is not None:
+            conditions.append(self.created_at >= filters.created_from)
+        if filters.created_to is not None:
+            conditions.append(self.created_at < filters.created_to)
+        if filters.updated_since is not None:
+            conditions.append(self.filter_column(self.updated_at, "updated_since") >= filters.updated_since)
+        after = self.after(filters)
+        if after is not None:
+            conditions.append(tuple_(*self.keys) > after)
+
+        statement = select(*self.columns)
+        for table, on in self.joins:
+            statement = statement.join(table, on)
+        return statement.where(*conditions).order_by(*self.keys)
+
+    def after(self, filters: ExportFilters) -> tuple | None:
+        # The key of the last row received, one value per key column or none
+        given = (filters.after_id, filters.after_user_id)
+        after, extra = given[:len(self.keys)], given[len(self.keys):]
+        if all(value is None for value in given):
+            return None
+        if any(value is None for value in after) or any(value is not None for value in extra):
+            names = ("after_id", "after_user_id")[:len(self.keys)]
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"This export resumes after {' and '.join(names)}"
+            )
+        return tuple(after)
+
+    @staticmethod
+    def filter_column(column, name: str):
+        if column is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"This export can't be filtered by {name}"
+            )
+        return column
+
+
+Business, Review, ReviewVote, User = models.Business, models.Review, models.ReviewVote, models.User
+
+EXPORTS = {
+    "reviews": Export(
+        columns=(Review.review_id, Review.business_id, Review.user_id, Review.rating, Review.review_title,
+                 Review.review_text, Review.votes_count, Review.created_at, Review.updated_at),
+        keys=(Review.review_id,),
+        created_at=Review.created_at,
+        updated_at=Review.updated_at,
+        business_id=Review.business_id,
+    ),
+    "businesses": Export(
+        columns=(Business.business_id, Business.name, Business.description, Business.location, Business.logo,
+                 Business.number, Business.website, Business.category_id, Business.supervisor_id,
+                 Business.average_rating, Business.review_count, Business.created_at, Business.updated_at),
+        keys=(Business.business_id,),
+        created_at=Business.created_at,
+        updated_at=Business.updated_at,
+        business_id=Business.business_id,
+    ),
+    "votes": Export(
+        columns=(ReviewVote.review_id, ReviewVote.user_id, Review.business_id, ReviewVote.created_at),
+        keys=(ReviewVote.review_id, ReviewVote.user_id),
+        created_at=ReviewVote.created_at,
+        business_id=Review.business_id,
+        joins=((Review, Review.review_id == ReviewVote.review_id),),
+    ),
+    # Never the password hashes
+    "users": Export(
+        columns=(User.user_id, User.username, User.email, User.role, User.created_at),
+        keys=(User.user_id,),
+        created_at=User.created_at,
+    ),
+}
+
+ExportName = Literal["reviews", "businesses", "votes", "users"]
+
+
+def plain(value):
+    # JSON and CSV friendly value of the column types that need it
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def converted_columns(columns) -> set[int]:
+    # Indexes of the columns to go through plain(), from their types rather than checking
+    # every value
+    return {index for index, column in enumerate(columns) if isinstance(column.type, (DateTime, SAEnum))}
+
+
+# One encoder for every row, json.dumps builds a new one per call when given options
+json_encode = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+def encode_ndjson(names: list[str], rows, convert: set[int]) -> str:
+    lines = []
+    for row in rows:
+        record = dict(zip(names, row))
+        for index in convert:
+            record[names[index]] = plain(row[index])
+        lines.append(json_encode(record))
+    return "\n".join(lines) + "\n"
+
+
+def encode_csv(rows, convert: set[int]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if convert:
+        rows = ([plain(value) if index in convert else value for index, value in enumerate(row)] for row in rows)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+async def stream_export(export: Export, statement, format: ExportFormat, batch_size: int) -> AsyncIterator[str]:
+    """Encoded batches of the rows of `statement`, built by export.statement() before the
+    response starts so invalid filters are still answered with a 400"""
+    names = [column.name for column in export.columns]
+    convert = converted_columns(export.columns)
+
+    if format == "csv":
+        yield encode_csv([names], set())
+
+    # A connection of its own, held for the whole export: the request's session is closed
+    # once the response starts
+    async with async_engine.connect() as connection:
+        result = await connection.stream(statement.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            yield encode_ndjson(names, rows, convert) if format == "ndjson" else encode_csv(rows, convert)
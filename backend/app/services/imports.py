@@ -0,0 +1,256 @@
+"""Bulk imports of businesses and historical reviews, e.g. when onboarding a new market.
+
+The file (CSV with a header row, or NDJSON) is read and validated one row at a time
+against BusinessCreate / ReviewImport. Valid rows are COPYed into a temporary staging
+table, `import_batch_size` rows per round trip, then checked against the database in a
+few set-based statements (unknown category, business or user, duplicate names) and
+inserted with one INSERT ... SELECT. The aggregates of the businesses that got reviews are
+recomputed once per business at the end, rather than once per review, and the reviews are
+added to their daily stats per business and day.
+
+A rejected row is reported with its line and the reason and the others are still
+imported. Everything happens in one transaction: the import is applied entirely or, if
+the database fails, not at all."""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterator, Literal, TextIO
+
+from pydantic import ValidationError
+from sqlalchemy import column, func, select, table, text
+from sqlmodel import Session, SQLModel
+
+from .. import models, schemas
+from ..core.config import settings
+from .aggregates import recompute_business_aggregates
+from .leaderboards import mark_leaderboards_stale
+from .rollups import add_imported_review_stats
+
+ImportFormat = Literal["csv", "ndjson"]
+ImportKind = Literal["businesses", "reviews"]
+
+# File extensions -> format, when it isn't given
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+@dataclass(frozen=True)
+class ImportSpec:
+    schema: type[SQLModel]
+    staging: str
+    # Columns copied from the validated rows, after the line number
+    columns: tuple[str, ...]
+    # DELETE ... RETURNING line, error: rows the database rejects, in this order
+    checks: tuple[str, ...]
+    # Moves the staging rows to the table. May return line, error of rows it skipped
+    insert: str
+
+
+IMPORTS: dict[str, ImportSpec] = {
+    "businesses": ImportSpec(
+        schema=schemas.BusinessCreate,
+        staging="""
+            CREATE TEMP TABLE import_businesses (
+                line integer PRIMARY KEY, name text, description text, location text, logo text,
+                number text, website text, category_id integer, supervisor_id integer
+            ) ON COMMIT DROP
+        """,
+        columns=("name", "description", "location", "logo", "number", "website", "category_id", "supervisor_id"),
+        checks=(
+            """DELETE FROM import_businesses s USING import_businesses earlier
+               WHERE s.name = earlier.name AND s.line > earlier.line
+               RETURNING s.line, 'Name already used on line ' || earlier.line""",
+            """DELETE FROM import_businesses s USING businesses b WHERE b.name = s.name
+               RETURNING s.line, 'A business with this name already exists'""",
+            """DELETE FROM import_businesses s
+               WHERE NOT EXISTS (SELECT 1 FROM categories c WHERE c.category_id = s.category_id)
+               RETURNING s.line, 'Category ' || s.category_id || ' not found'""",
+            """DELETE FROM import_businesses s
+               WHERE s.supervisor_id IS NOT NULL
+                 AND NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = s.supervisor_id)
+               RETURNING s.line, 'Supervisor ' || s.supervisor_id || ' not found'""",
+        ),
+        # A business created meanwhile with the same name is skipped rather than failing the import
+        insert="""
+            WITH inserted AS (
+                INSERT INTO businesses (name, description, location, logo, number, website, category_id, supervisor_id)
+                SELECT name, description, location, logo, number, website, category_id, supervisor_id
+                FROM import_businesses ORDER BY line
+                ON CONFLICT (name) DO NOTHING
+                RETURNING name
+            )
+            SELECT line, 'A business with this name already exists' FROM import_businesses
+            WHERE name NOT IN (SELECT name FROM inserted)
+        """,
+    ),
+    "reviews": ImportSpec(
+        schema=schemas.ReviewImport,
+        staging="""
+            CREATE TEMP TABLE import_reviews (
+                line integer PRIMARY KEY, rating integer, review_title text, review_text text,
+                user_id integer, business_id integer, created_at timestamptz
+            ) ON COMMIT DROP
+        """,
+        columns=("rating", "review_title", "review_text", "user_id", "business_id", "created_at"),
+        checks=(
+            """DELETE FROM import_reviews s
+               WHERE NOT EXISTS (SELECT 1 FROM businesses b WHERE b.business_id = s.business_id)
+               RETURNING s.line, 'Business ' || s.business_id || ' not found'""",
+            """DELETE FROM import_reviews s
+               WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = s.user_id)
+               RETURNING s.line, 'User ' || s.user_id || ' not found'""",
+        ),
+        insert="""
+            INSERT INTO reviews (rating, review_title, review_text, user_id, business_id, created_at)
+            SELECT rating, review_title, review_text, user_id, business_id, coalesce(created_at, now())
+            FROM import_reviews ORDER BY line
+        """,
+    ),
+}
+
+
+@dataclass
+class ImportResult:
+    kind: str
+    received: int = 0
+    rejected: int = 0
+    errors: list[schemas.ImportRowError] = field(default_factory=list)
+    business_ids: list[int] = field(default_factory=list)
+
+    def reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < settings.import_max_errors:
+            self.errors.append(schemas.ImportRowError(line=line, error=error))
+
+    def report(self) -> schemas.ImportReport:
+        return schemas.ImportReport(
+            kind=self.kind,
+            received=self.received,
+            imported=self.received - self.rejected,
+            rejected=self.rejected,
+            errors=sorted(self.errors, key=lambda error: error.line),
+            businesses_updated=len(self.business_ids),
+        )
+
+
+def import_format(filename: str | None) -> ImportFormat | None:
+    for extension, format in FORMATS.items():
+        if filename and filename.lower().endswith(extension):
+            return format
+    return None
+
+
+def read_records(file: TextIO, format: ImportFormat) -> Iterator[tuple[int, dict | None, str | None]]:
+    """(line, record, None) per row of the file, or (line, None, error) for an unreadable one"""
+    if format == "csv":
+        reader = csv.DictReader(file)
+        for record in reader:
+            # CSV has no null, an empty field is a missing value
+            yield reader.line_num, {name: value or None for name, value in record.items() if name}, None
+        return
+
+    for line, content in enumerate(file, 1):
+        if not content.strip():
+            continue
+        try:
+            record = json.loads(content)
+        except ValueError as error:
+            yield line, None, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(record, dict):
+            yield line, None, "Expected a JSON object"
+            continue
+        yield line, record, None
+
+
+def describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'row'}: {detail['msg']}" for detail in error.errors()
+    )
+
+
+def copy_value(value) -> str:
+    # COPY text format: \N is NULL, backslashes and line breaks are escaped
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def nul_characters(row, columns) -> str | None:
+    # PostgreSQL text can't hold them, COPY would fail the whole batch
+    names = [name for name in columns if isinstance(getattr(row, name), str) and "\x00" in getattr(row, name)]
+    return "; ".join(f"{name}: NUL characters aren't allowed" for name in names) or None
+
+
+def validated_rows(spec: ImportSpec, records, result: ImportResult) -> Iterator[str]:
+    # COPY lines of the valid rows, the others are rejected on the way
+    for line, record, error in records:
+        result.received += 1
+        if error is None:
+            try:
+                row = spec.schema.model_validate(record)
+            except ValidationError as invalid:
+                error = describe(invalid)
+            else:
+                error = nul_characters(row, spec.columns)
+        if error is not None:
+            result.reject(line, error)
+            continue
+        yield "\t".join([str(line), *(copy_value(getattr(row, name)) for name in spec.columns)]) + "\n"
+
+
+def copy_lines(cursor, staging_table: str, columns: tuple[str, ...], lines: Iterator[str], batch_size: int):
+    sql = f"COPY {staging_table} ({', '.join(columns)}) FROM STDIN"
+    buffer, pending = io.StringIO(), 0
+    for line in lines:
+        buffer.write(line)
+        pending += 1
+        if pending == batch_size:
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            buffer, pending = io.StringIO(), 0
+    if pending:
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+
+
+def import_file(session: Session, kind: ImportKind, file: TextIO, format: ImportFormat) -> ImportResult:
+    """Import the rows of `file` and commit. Works on a psycopg2 session, COPY goes
+    through its cursor"""
+    spec = IMPORTS[kind]
+    staging_table = f"import_{kind}"
+    result = ImportResult(kind)
+
+    session.exec(text(spec.staging))
+    cursor = session.connection().connection.cursor()
+    copy_lines(cursor, staging_table, ("line", *spec.columns),
+               validated_rows(spec, read_records(file, format), result), settings.import_batch_size)
+
+    for check in spec.checks:
+        for line, error in session.exec(text(check)):
+            result.reject(line, error)
+    inserted = session.exec(text(spec.insert))
+    if inserted.returns_rows:
+        for line, error in inserted:
+            result.reject(line, error)
+
+    if kind == "reviews":
+        # Once per business, whatever the number of its reviews in the file
+        business_ids = select(column("business_id")).select_from(table(staging_table)).distinct()
+        result.business_ids = recompute_business_aggregates(session, business_ids)
+        # Dated like the insert dates them
+        reviews = select(
+            column("business_id"), column("rating"),
+            func.coalesce(column("created_at"), func.now()).label("created_at"),
+        ).select_from(table(staging_table)).subquery()
+        add_imported_review_stats(session, reviews)
+    else:
+        # A new business is ranked once it has ranking_min_reviews reviews, maybe none
+        imported = select(column("name")).select_from(table(staging_table))
+        mark_leaderboards_stale(session, select(models.Business.business_id).where(models.Business.name.in_(imported)))
+
+    session.commit()
+    return result
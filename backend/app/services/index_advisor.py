@@ -0,0 +1,180 @@
+"""Runs the hot API paths against the configured database and EXPLAINs every query they
+issue with sequential scans disabled. If the planner still picks a Seq Scan on one of our
+tables, or walks a whole index just to filter its rows, there is no index it can use for
+that query whatever the table size, so this works on a small seeded database as well as
+on production-sized data.
+
+Walking an index in the order of the listing and filtering its rows is fine under a LIMIT:
+the walk stops once the page is full, after about limit / selectivity rows whatever the
+size of the table. That is how the listing filters that aren't part of an index (e.g.
+has_website) are applied."""
+import asyncio
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, SQLModel, select
+
+from .. import models
+from ..core.database import ASYNC_SQLALCHEMY_DATABASE_URL, async_engine, engine
+from ..core.security import create_access_token
+from ..schemas import UserRole
+
+# (path, role of the user the request is made as), paths are formatted with sample ids
+HOT_PATHS = [
+    ("/businesses/?limit=20", None),
+    ("/businesses/category/{category_id}?limit=20", None),
+    ("/businesses/{business_id}", None),
+    ("/businesses/search/?name=cafe", None),
+    ("/businesses/?search=cafe&limit=20", None),
+    ("/businesses/autocomplete/?q=ca", None),
+    ("/reviews/{business_id}?limit=20", None),
+    ("/review-replies/business/{business_id}?limit=20", None),
+    ("/reviews/admin/all?limit=20", UserRole.ADMIN),
+    ("/review-replies/supervisor/reviews?limit=20", UserRole.SUPERVISOR),
+    ("/vote/me?business_id={business_id}", UserRole.ADMIN),
+]
+# Every sort of the business listings, alone and with the filters
+HOT_PATHS += [
+    (f"{listing}?limit=20&sort={sort}{filters}", None)
+    for listing in ("/businesses/", "/businesses/category/{category_id}")
+    for sort in ("name", "rating", "reviews", "newest")
+    for filters in ("", "&min_rating=4", "&has_website=true", "&min_rating=3.5&has_website=false")
+] + [
+    (f"/businesses/?limit=20&sort={sort}&category_id={{category_id}}&min_rating=4", None)
+    for sort in ("name", "rating", "reviews", "newest")
+]
+
+
+@contextmanager
+def capture_statements():
+    # Statements the API sends through asyncpg, as (SQL with $n placeholders, parameters)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def explain_statements(statements, disabled=("seqscan",)) -> list[tuple[str, dict]]:
+    """(statement, plan) for every SELECT, planned with the `disabled` plan types (enable_*
+    settings) turned off. Run through asyncpg as well so the captured placeholders and
+    parameters can be passed back as they are"""
+    explain_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+    plans = []
+    try:
+        async with explain_engine.connect() as connection:
+            for plan_type in disabled:
+                await connection.exec_driver_sql(f"SET enable_{plan_type} = off")
+            for statement, parameters in statements:
+                if not statement.lstrip().upper().startswith("SELECT"):
+                    continue
+                result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                plans.append((statement, result.scalar()[0]["Plan"]))
+            await connection.rollback()
+    finally:
+        await explain_engine.dispose()
+    return plans
+
+
+# Lookup tables small enough that scanning them is always fine
+SMALL_TABLES = {"categories"}
+
+
+# Nodes passing the rows of their (outer) child on as they come, a LIMIT above them stops
+# the scan below. A join's inner side is read whole (hash) or once per outer row
+STREAMING_NODES = {"Limit", "Nested Loop", "Hash Join", "Subquery Scan", "Result"}
+
+
+def full_scans(plan: dict, limited: bool = False) -> list[tuple[str, str]]:
+    # (relation, how it is scanned) for every node of the plan that reads a whole table
+    scans = []
+    node_type = plan["Node Type"]
+    if node_type == "Seq Scan":
+        scans.append((plan["Relation Name"], "sequential scan"))
+    elif (node_type in ("Index Scan", "Index Only Scan") and "Filter" in plan and "Index Cond" not in plan
+          and not limited):
+        scans.append((plan["Relation Name"], f"full scan of {plan['Index Name']} with a filter"))
+
+    limited = node_type == "Limit" or (limited and node_type in STREAMING_NODES)
+    for child in plan.get("Plans", []):
+        scans.extend(full_scans(child, limited and child.get("Parent Relationship") != "Inner"))
+    return scans
+
+
+def limit_sorts(plan: dict, limited: bool = False) -> list[str]:
+    """Sort keys of every Sort feeding a LIMIT: all the rows below it are read and sorted to
+    return a page. Run with enable_sort off, there is no index to read them in order"""
+    sorts = []
+    node_type = plan["Node Type"]
+    if node_type == "Sort" and limited:
+        sorts.append(", ".join(plan["Sort Key"]))
+
+    limited = node_type == "Limit" or (limited and node_type in STREAMING_NODES)
+    for child in plan.get("Plans", []):
+        sorts.extend(limit_sorts(child, limited and child.get("Parent Relationship") != "Inner"))
+    return sorts
+
+
+def sample_context(session: Session) -> tuple[dict, dict]:
+    # Ids to fill the paths with and a token per role, taken from whatever data is seeded
+    business = session.exec(
+        select(models.Business).order_by(models.Business.review_count.desc())
+    ).first()
+    supervisor = session.exec(
+        select(models.User)
+        .join(models.Business, models.Business.supervisor_id == models.User.user_id)
+    ).first()
+    admin = session.exec(select(models.User).where(models.User.role == UserRole.ADMIN)).first()
+
+    ids = {}
+    if business:
+        ids = {"business_id": business.business_id, "category_id": business.category_id}
+
+    tokens = {}
+    for role, user in ((UserRole.ADMIN, admin), (UserRole.SUPERVISOR, supervisor)):
+        if user:
+            tokens[role] = create_access_token({"user_id": user.user_id, "role": user.role})
+    return ids, tokens
+
+
+def check_hot_paths(hot_paths=HOT_PATHS) -> tuple[list[dict], list[str]]:
+    """Returns (findings, skipped paths). A finding is one query of a path that falls back
+    to a full scan of an application table."""
+    from fastapi.testclient import TestClient
+    from ..main import app
+
+    tables = set(SQLModel.metadata.tables) - SMALL_TABLES
+
+    with Session(engine) as session:
+        ids, tokens = sample_context(session)
+
+    findings, skipped = [], []
+    # One client for every request, the async engine's connections belong to its event loop
+    with TestClient(app) as client:
+        for path, role in hot_paths:
+            if not ids or (role and role not in tokens):
+                skipped.append(path)
+                continue
+
+            headers = {"Authorization": f"Bearer {tokens[role]}"} if role else {}
+            url = path.format(**ids)
+            with capture_statements() as statements:
+                response = client.get(url, headers=headers)
+                # Deep pages go through the keyset condition, check that query too
+                next_cursor = response.headers.get("X-Next-Cursor")
+                if next_cursor:
+                    client.get(f"{url}&cursor={next_cursor}", headers=headers)
+
+            for statement, plan in asyncio.run(explain_statements(statements)):
+                for relation, scan in full_scans(plan):
+                    if relation in tables:
+                        findings.append({"path": path, "relation": relation, "scan": scan, "statement": statement})
+
+    return findings, skipped
@@ -0,0 +1,170 @@
+"""Category leaderboards: the best `leaderboard_size` businesses of each category.
+
+Businesses are ranked by their Bayesian average rating, the mean of their ratings plus
+`ranking_prior_weight` imaginary ratings at the mean of the category:
+
+    score = (prior_weight * category_mean + rating_sum) / (prior_weight + review_count)
+
+A business with a single 5-star review stays close to the category mean, one with
+thousands of reviews scores its own average. The score is computed from the aggregates
+stored on businesses, and only businesses with at least `ranking_min_reviews` reviews are
+ranked.
+
+Every write changing what a leaderboard shows (review writes, business edits, moves and
+deletions, imports, user deletions) marks the businesses it changed in leaderboard_dirty,
+with their category, in its own transaction. The mark of a business is only written by
+transactions already holding its row (they just updated it), so marking adds no lock to
+wait for: writes to other businesses of the category never wait on each other.
+
+Every few seconds a refresh takes the marks in a short transaction of its own and commits,
+then rebuilds the leaderboards of their categories in a second one, reading one
+category's businesses each. A mark commits with its write, so the rebuild reads every
+write it took the mark of: the marks of transactions still running are locked, the take
+skips them and a later refresh takes them once committed. A write during the rebuild marks
+its business again, for the next refresh. The other categories are left alone, and when
+nothing changed, looking costs a scan of an empty table. The workers all run the refresh,
+a transaction-level advisory lock makes their rebuilds take turns. When a rebuild fails,
+its marks are put back; marks taken by a worker dying before it commits its rebuild are
+lost, `python -m app.cli refresh-leaderboards --all` rebuilds everything.
+
+After changing the ranking settings, rebuild everything with
+`python -m app.cli refresh-leaderboards --all`."""
+import asyncio
+import logging
+
+from sqlalchemy import Float, Integer, Numeric, cast, column, insert, literal, tuple_, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, delete, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .. import models
+from ..core.cache import response_cache
+from ..core.config import settings
+from ..core.database import async_engine
+
+log = logging.getLogger("uvicorn")
+
+# Key of the advisory lock held while rebuilding, any constant shared by every process
+LEADERBOARD_LOCK_KEY = 72_617_402
+
+Business, Entry, Dirty = models.Business, models.LeaderboardEntry, models.LeaderboardDirty
+
+
+def mark_leaderboards_stale(session: Session, business_ids):
+    """Mark the businesses of `business_ids` (a subquery or a list) stale in the leaderboard
+    of their current category, in the caller's transaction. A business moving or being
+    deleted is marked before, and when moved after too. The marks stay locked until the
+    commit, anywhere in the transaction will do."""
+    businesses = (
+        select(Business.business_id, Business.category_id, func.now())
+        .where(Business.business_id.in_(business_ids))
+        .order_by(Business.business_id)
+    )
+    marks = pg_insert(Dirty).from_select(["business_id", "category_id", "marked_at"], businesses)
+    # An update rather than DO NOTHING: a mark already there is locked too, a refresh can't
+    # take it before this write commits
+    session.exec(marks.on_conflict_do_update(
+        index_elements=[Dirty.business_id, Dirty.category_id], set_={"marked_at": marks.excluded.marked_at}
+    ))
+
+
+def take_stale_marks(session: Session) -> list[tuple[int, int]]:
+    """Delete the committed marks and return them, (business_id, category_id). Statements
+    run after they are taken see every write that marked them, the marks of writes still
+    running are skipped"""
+    committed = select(Dirty.business_id, Dirty.category_id).with_for_update(skip_locked=True)
+    taken = session.exec(
+        delete(Dirty)
+        .where(tuple_(Dirty.business_id, Dirty.category_id).in_(committed))
+        .returning(Dirty.business_id, Dirty.category_id)
+    ).all()
+    return [tuple(mark) for mark in taken]
+
+
+def restore_marks(session: Session, marks: list[tuple[int, int]]):
+    # Marks of a failed rebuild, but not of the categories deleted meanwhile
+    taken = values(column("business_id", Integer), column("category_id", Integer), name="taken").data(marks)
+    restored = (
+        select(taken.c.business_id, taken.c.category_id, func.now())
+        .join(models.Category, models.Category.category_id == taken.c.category_id)
+    )
+    session.exec(
+        pg_insert(Dirty).from_select(["business_id", "category_id", "marked_at"], restored)
+        .on_conflict_do_nothing()
+    )
+
+
+def leaderboards_query(category_ids: list[int]):
+    """Top businesses of the given categories, with their rank, as rows of
+    category_leaderboards"""
+    # Mean rating of the category, over every business of it
+    reviews = func.sum(Business.review_count).over(partition_by=Business.category_id)
+    ratings = func.sum(Business.rating_sum).over(partition_by=Business.category_id)
+    category_mean = func.coalesce(cast(ratings, Numeric) / func.nullif(reviews, 0), 0)
+    weight = literal(settings.ranking_prior_weight, Numeric)
+    score = (weight * category_mean + Business.rating_sum) / (weight + Business.review_count)
+
+    scored = (
+        select(Business.category_id, Business.business_id, Business.name, Business.logo, Business.location,
+               Business.average_rating, Business.review_count, cast(score, Float).label("score"))
+        .where(Business.category_id.in_(category_ids))
+        .subquery()
+    )
+    rank = func.row_number().over(
+        partition_by=scored.c.category_id,
+        order_by=(scored.c.score.desc(), scored.c.review_count.desc(), scored.c.business_id),
+    )
+    ranked = (
+        select(scored, rank.label("rank"))
+        .where(scored.c.review_count >= settings.ranking_min_reviews)
+        .subquery()
+    )
+    columns = ("category_id", "rank", "business_id", "name", "logo", "location", "score",
+               "average_rating", "review_count")
+    return columns, select(*[ranked.c[column] for column in columns]).where(ranked.c.rank <= settings.leaderboard_size)
+
+
+def rebuild_leaderboards(session: Session, category_ids: list[int]):
+    # Waits for the rebuild of another process, the two would write the same entries
+    session.exec(select(func.pg_advisory_xact_lock(LEADERBOARD_LOCK_KEY))).one()
+    session.exec(delete(Entry).where(Entry.category_id.in_(category_ids)))
+    columns, rows = leaderboards_query(category_ids)
+    session.exec(insert(Entry).from_select(columns, rows))
+
+
+def refresh_leaderboards(session: Session, category_ids: list[int] | None = None) -> list[int]:
+    """Rebuild the stale leaderboards, and those of `category_ids`, committing the taking of
+    the marks then the rebuild. Returns the ids of the categories rebuilt."""
+    marks = take_stale_marks(session)
+    session.commit()
+    category_ids = sorted({category_id for _, category_id in marks} | set(category_ids or []))
+    if not category_ids:
+        return []
+
+    try:
+        rebuild_leaderboards(session, category_ids)
+        session.commit()
+    except Exception:
+        session.rollback()
+        if marks:
+            restore_marks(session, marks)
+            session.commit()
+        raise
+    return category_ids
+
+
+async def refresh_stale_leaderboards():
+    async with AsyncSession(async_engine) as session:
+        category_ids = await session.run_sync(refresh_leaderboards)
+
+    if category_ids:
+        await response_cache.invalidate("leaderboards", *[f"leaderboard:{category_id}" for category_id in category_ids])
+
+
+async def run_leaderboard_refresh(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_stale_leaderboards()
+        except Exception:
+            log.exception("Refreshing the leaderboards failed")
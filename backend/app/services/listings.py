@@ -0,0 +1,58 @@
+from sqlmodel import Session, or_, select
+from sqlalchemy.orm import aliased, joinedload
+
+from .. import models
+
+
+def business_listing_query(*filters):
+    # Businesses + their category in one statement, the review count is stored on the business
+    return (
+        select(models.Business)
+        .options(joinedload(models.Business.category))
+        .where(*filters)
+    )
+
+
+def business_listing_page(page, keys, descending: bool):
+    """Businesses of `page`, a paginated select of businesses, with their categories. The
+    page is cut before the categories are joined: joined first, a keyset condition the
+    planner misestimates (deep into the thousands of businesses tied at 0 reviews) can have
+    it join and sort every remaining business instead of reading the index in order."""
+    business = aliased(models.Business, page.subquery())
+    order = [getattr(business, key.key) for key in keys]
+    return (
+        select(business)
+        .options(joinedload(business.category))
+        .order_by(*[key.desc() if descending else key.asc() for key in order])
+    )
+
+
+def business_listing_filters(*, category_id: int | None = None, min_rating: float | None = None,
+                             has_website: bool | None = None) -> list:
+    # category_id leads an index per sort and min_rating is a range of the rating ones, the
+    # other filters are checked on the rows as they are read in the order of the listing
+    filters = []
+    if category_id is not None:
+        filters.append(models.Business.category_id == category_id)
+    if min_rating is not None:
+        filters.append(models.Business.average_rating >= min_rating)
+    if has_website is not None:
+        # An empty website counts as none, the forms send one when the field is left blank
+        has_one = models.Business.website != ""
+        filters.append(has_one if has_website else or_(models.Business.website.is_(None), ~has_one))
+    return filters
+
+
+def to_business_with_review_count(businesses) -> list[dict]:
+    return [
+        {"business": business, "reviews_count": business.review_count}
+        for business in businesses
+    ]
+
+
+def get_business_with_review_count(session: Session, business_id: int) -> dict | None:
+    business = session.exec(business_listing_query(models.Business.business_id == business_id)).first()
+    if not business:
+        return None
+    return to_business_with_review_count([business])[0]
+
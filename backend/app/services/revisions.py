@@ -0,0 +1,37 @@
+from sqlmodel import Session, func, or_, select, update
+
+from .. import models
+
+
+def revision_values() -> dict:
+    """Values that bump a business revision, to merge into an UPDATE of businesses that
+    happens anyway (e.g. the aggregate deltas). clock_timestamp() is read once the row lock
+    is held, so updated_at only moves forward in commit order."""
+    return {
+        "revision": models.Business.revision + 1,
+        "updated_at": func.greatest(models.Business.updated_at, func.clock_timestamp()),
+    }
+
+
+def bump_business_revisions(session: Session, *filters):
+    # One UPDATE in the caller's transaction, for writes that don't touch the aggregates
+    session.exec(
+        update(models.Business)
+        .where(*filters)
+        .values(**revision_values())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def businesses_showing_user(user_id: int):
+    # Businesses whose pages show the user, as a reviewer or as the author of a reply
+    return or_(
+        models.Business.business_id.in_(
+            select(models.Review.business_id).where(models.Review.user_id == user_id)
+        ),
+        models.Business.business_id.in_(
+            select(models.Review.business_id)
+            .join(models.ReviewReply, models.ReviewReply.review_id == models.Review.review_id)
+            .where(models.ReviewReply.supervisor_id == user_id)
+        ),
+    )
@@ -0,0 +1,275 @@
+"""Daily activity of every business for the dashboards, in business_daily_stats: per business
+and UTC day, the reviews written that day with their ratings, how many of those got a reply,
+and the votes cast that day on the reviews of the business. A trend over any range reads a
+row per day of it, whatever the number of reviews behind.
+
+The rows are kept up to date by deltas added in the transaction of every write changing
+them: reviews, replies, votes, user deletions and imports. A review stays on the day it was
+written: changing its rating moves it between the star counts of that day, deleting it
+takes it out with its reply and its votes.
+
+`python -m app.cli backfill-rollups` rebuilds the rows from the reviews, replies and votes,
+once after the table is created and to repair drift."""
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, Literal
+
+from sqlalchemy import Date, cast, literal, literal_column, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, delete, func, select
+
+from .. import models
+from .aggregates import AGGREGATE_COLUMNS, RATINGS, rating_delta_values
+
+StatsInterval = Literal["day", "week", "month"]
+
+STAT_COLUMNS = (*AGGREGATE_COLUMNS, "replied_count", "vote_count")
+
+Review, ReviewReply, ReviewVote, Stats = models.Review, models.ReviewReply, models.ReviewVote, models.BusinessDailyStats
+
+
+def utc_day(moment: datetime) -> date:
+    return moment.astimezone(timezone.utc).date()
+
+
+def day_of(timestamp):
+    # SQL counterpart of utc_day(). The zone is a constant rather than a parameter, a GROUP BY
+    # repeating the expression with a parameter of its own wouldn't match the select list
+    return cast(func.timezone(literal_column("'UTC'"), timestamp), Date)
+
+
+def upsert(statement):
+    # Rows already there are added to
+    return statement.on_conflict_do_update(
+        index_elements=[Stats.business_id, Stats.day],
+        set_={column: getattr(Stats, column) + getattr(statement.excluded, column) for column in STAT_COLUMNS},
+    )
+
+
+def add_daily_stats(session: Session, deltas: Iterable[tuple[int, date | None, dict]]):
+    """Add `deltas`, (business_id, day, {column: delta}), to the daily stats in one
+    statement. A day of None is today by the clock of the database, the day of the
+    created_at of the rows inserted in the same transaction."""
+    merged: dict[tuple, Counter] = defaultdict(Counter)
+    for business_id, day, values in deltas:
+        merged[business_id, day].update(values)
+
+    # In a fixed order, two transactions adding to the same rows can't deadlock
+    rows = [
+        {"business_id": business_id, "day": day_of(func.now()) if day is None else day,
+         **{column: values[column] for column in STAT_COLUMNS}}
+        for (business_id, day), values in sorted(merged.items(), key=lambda item: (item[0][0], item[0][1] or date.max))
+        if any(values.values())
+    ]
+    if rows:
+        session.exec(upsert(pg_insert(Stats).values(rows)))
+
+
+def apply_review_stats(session: Session, business_id: int, day: date | None,
+                       added_rating: int | None = None, removed_rating: int | None = None):
+    # A review written (day None, today) or its rating changed, like apply_review_delta
+    deltas = Counter()
+    if added_rating is not None:
+        deltas[added_rating] += 1
+    if removed_rating is not None:
+        deltas[removed_rating] -= 1
+    add_daily_stats(session, [(business_id, day, rating_delta_values(deltas))])
+
+
+def remove_review_stats(session: Session, review: models.Review):
+    # A review about to be deleted, its reply and votes go away with it
+    replied = session.exec(select(func.count()).where(ReviewReply.review_id == review.review_id)).one()
+    deltas = [(review.business_id, utc_day(review.created_at),
+               {**rating_delta_values(Counter({review.rating: -1})), "replied_count": -replied})]
+
+    votes = session.exec(
+        select(day_of(ReviewVote.created_at), func.count())
+        .where(ReviewVote.review_id == review.review_id)
+        .group_by(day_of(ReviewVote.created_at))
+    )
+    deltas.extend((review.business_id, day, {"vote_count": -count}) for day, count in votes)
+    add_daily_stats(session, deltas)
+
+
+def apply_reply_stats(session: Session, review: models.Review, delta: int):
+    # A reply added (+1) or deleted (-1), counted on the day of the review
+    add_daily_stats(session, [(review.business_id, utc_day(review.created_at), {"replied_count": delta})])
+
+
+def apply_vote_stats(session: Session, business_id: int, day: date | None, delta: int):
+    # A vote cast (+1, day None, today) or withdrawn (-1, on the day it was cast)
+    add_daily_stats(session, [(business_id, day, {"vote_count": delta})])
+
+
+def remove_user_stats(session: Session, user_id: int):
+    """Take out everything deleting a user removes through ON DELETE CASCADE: their
+    reviews with the replies and votes on them, their replies and their votes"""
+    # Their reviews locked first, like delete_review locks one: a vote on them commits before
+    # the counts below or waits for the deletion
+    session.exec(
+        select(Review.review_id).where(Review.user_id == user_id).order_by(Review.review_id).with_for_update()
+    ).all()
+    review_day = day_of(Review.created_at)
+    vote_day = day_of(ReviewVote.created_at)
+    deltas = []
+
+    reviews = session.exec(
+        select(Review.business_id, review_day, Review.rating, func.count(), func.count(ReviewReply.review_reply_id))
+        .outerjoin(ReviewReply, ReviewReply.review_id == Review.review_id)
+        .where(Review.user_id == user_id)
+        .group_by(Review.business_id, review_day, Review.rating)
+    )
+    for business_id, day, rating, count, replied in reviews:
+        deltas.append((business_id, day, {**rating_delta_values(Counter({rating: -count})), "replied_count": -replied}))
+
+    replies = session.exec(
+        select(Review.business_id, review_day, func.count())
+        .join(ReviewReply, ReviewReply.review_id == Review.review_id)
+        .where(ReviewReply.supervisor_id == user_id, Review.user_id != user_id)
+        .group_by(Review.business_id, review_day)
+    )
+    deltas.extend((business_id, day, {"replied_count": -count}) for business_id, day, count in replies)
+
+    # Votes on their reviews, then their votes on the reviews of others. Two queries, each
+    # on its own user_id index
+    votes = [
+        select(Review.business_id, vote_day, func.count())
+        .join(ReviewVote, ReviewVote.review_id == Review.review_id)
+        .where(condition)
+        .group_by(Review.business_id, vote_day)
+        for condition in (Review.user_id == user_id, (ReviewVote.user_id == user_id) & (Review.user_id != user_id))
+    ]
+    for query in votes:
+        deltas.extend((business_id, day, {"vote_count": -count}) for business_id, day, count in session.exec(query))
+    add_daily_stats(session, deltas)
+
+
+def add_imported_review_stats(session: Session, reviews):
+    """Add the reviews of `reviews`, a subquery with business_id, rating and created_at
+    columns, grouped per business and day"""
+    day = day_of(reviews.c.created_at)
+    grouped = (
+        select(
+            reviews.c.business_id, day,
+            func.count(), func.sum(reviews.c.rating),
+            *[func.count().filter(reviews.c.rating == rating) for rating in RATINGS],
+            literal(0), literal(0),
+        )
+        .group_by(reviews.c.business_id, day)
+    )
+    session.exec(upsert(pg_insert(Stats).from_select(["business_id", "day", *STAT_COLUMNS], grouped)))
+
+
+def actual_daily_stats_query(business_ids: list[int]):
+    # The daily stats as they should be, recomputed from the reviews, replies and votes
+    review_day = day_of(Review.created_at)
+    vote_day = day_of(ReviewVote.created_at)
+    zero = literal(0)
+
+    def part(day, counts: dict):
+        return select(Review.business_id.label("business_id"), day.label("day"),
+                      *[counts.get(column, zero).label(column) for column in STAT_COLUMNS])
+
+    reviews = part(review_day, {
+        "review_count": func.count(),
+        "rating_sum": func.sum(Review.rating),
+        **{f"rating_{rating}_count": func.count().filter(Review.rating == rating) for rating in RATINGS},
+    }).where(Review.business_id.in_(business_ids)).group_by(Review.business_id, review_day)
+    replies = (
+        part(review_day, {"replied_count": func.count()})
+        .join(ReviewReply, ReviewReply.review_id == Review.review_id)
+        .where(Review.business_id.in_(business_ids))
+        .group_by(Review.business_id, review_day)
+    )
+    votes = (
+        part(vote_day, {"vote_count": func.count()})
+        .join(ReviewVote, ReviewVote.review_id == Review.review_id)
+        .where(Review.business_id.in_(business_ids))
+        .group_by(Review.business_id, vote_day)
+    )
+
+    every = union_all(reviews, replies, votes).subquery()
+    return (
+        select(every.c.business_id, every.c.day, *[func.sum(every.c[column]) for column in STAT_COLUMNS])
+        .group_by(every.c.business_id, every.c.day)
+    )
+
+
+def rebuild_daily_stats(session: Session, business_ids: list[int]) -> int:
+    """Replace the daily stats of the given businesses with values recomputed from their
+    reviews, replies and votes. The businesses are locked first, like in
+    recompute_business_aggregates, the review and reply writes wait. Returns the number of
+    rows written."""
+    locked = session.exec(
+        select(models.Business.business_id)
+        .where(models.Business.business_id.in_(business_ids))
+        .order_by(models.Business.business_id)
+        .with_for_update()
+    ).all()
+    if not locked:
+        return 0
+
+    session.exec(delete(Stats).where(Stats.business_id.in_(locked)))
+    inserted = session.exec(
+        pg_insert(Stats).from_select(["business_id", "day", *STAT_COLUMNS], actual_daily_stats_query(list(locked)))
+    )
+    return inserted.rowcount
+
+
+def period_start(day: date, interval: StatsInterval) -> date:
+    # Periods are days, weeks from Monday or calendar months
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start: date, interval: StatsInterval) -> date:
+    if interval == "week":
+        return start + timedelta(days=7)
+    if interval == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def stats_point(start: date, values: Counter) -> dict:
+    review_count = values["review_count"]
+    return {
+        "start": start,
+        **{column: values[column] for column in STAT_COLUMNS},
+        "average_rating": round(values["rating_sum"] / review_count, 2) if review_count else None,
+        "reply_rate": round(values["replied_count"] / review_count, 3) if review_count else None,
+    }
+
+
+def business_trend(session: Session, business_id: int, start: date, end: date,
+                   interval: StatsInterval = "day") -> dict:
+    """Activity of a business from `start` to `end` (included), in total and per period,
+    read from the business's daily stats of those days alone"""
+    rows = session.exec(
+        select(Stats.day, *[getattr(Stats, column) for column in STAT_COLUMNS])
+        .where(Stats.business_id == business_id, Stats.day.between(start, end))
+    ).all()
+
+    periods: dict[date, Counter] = defaultdict(Counter)
+    totals = Counter()
+    for day, *values in rows:
+        day_values = dict(zip(STAT_COLUMNS, values))
+        periods[period_start(day, interval)].update(day_values)
+        totals.update(day_values)
+
+    points = []
+    period = period_start(start, interval)
+    while period <= end:
+        points.append(stats_point(period, periods[period]))
+        period = next_period(period, interval)
+
+    return {
+        "business_id": business_id,
+        "start": start,
+        "end": end,
+        "interval": interval,
+        "totals": stats_point(start, totals),
+        "points": points,
+    }
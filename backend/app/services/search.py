@@ -0,0 +1,125 @@
+"""Business search and autocomplete.
+
+The typo tolerance relies on pg_trgm, which ships in PostgreSQL's contrib and isn't there
+on every server. Without it (the migration then skips the trigram index) names match
+when they start with the query instead of being similar to it, every other condition is
+the same. Whether it is installed is looked up once per process: after installing it,
+create the index of the migration and restart the workers."""
+import re
+
+from sqlalchemy import union
+from sqlmodel import Float, Integer, Session, case, desc, func, literal_column, or_, select, text
+
+from .. import models
+from .listings import business_listing_filters, business_listing_query, to_business_with_review_count
+
+# Shorter autocomplete queries get no suggestions, a single letter prefixes too many names
+AUTOCOMPLETE_MIN_LENGTH = 2
+# Name prefix matches read from the index per suggestion asked for, before ranking them
+AUTOCOMPLETE_CANDIDATES = 10
+
+# Set by trigrams_installed()
+trigrams: bool | None = None
+
+
+def trigrams_installed(session: Session) -> bool:
+    global trigrams
+    if trigrams is None:
+        trigrams = session.exec(text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")).scalar()
+    return trigrams
+
+
+def search_document():
+    # Generated tsvector column, indexed by ix_businesses_search_vector
+    return models.Business.__table__.c.search_vector
+
+
+def search_name():
+    # Expression of the trigram (ix_businesses_name_trgm) and prefix (ix_businesses_name_prefix) indexes
+    return func.lower(models.Business.name)
+
+
+def query_terms(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def prefix_tsquery(terms: list[str]):
+    # "pari caf" -> 'pari':* & 'caf':*, so the last word can still be half typed
+    return func.to_tsquery(literal_column("'simple'"), " & ".join(f"{term}:*" for term in terms))
+
+
+def search_businesses(session: Session, text: str, *, category_id: int | None = None,
+                      min_rating: float | None = None, has_website: bool | None = None,
+                      offset: int = 0, limit: int = 20) -> list[dict]:
+    """Ranked business search over name, location, description and category name.
+
+    A business matches when every query word prefixes a word of its search document, when
+    its name is similar enough to the query to tolerate typos (the pg_trgm % operator, which
+    uses pg_trgm.similarity_threshold, 0.3 by default) or starts with it without pg_trgm,
+    or when its category name matches. Each of those conditions is backed by its own index
+    so Postgres can OR them in a bitmap scan. The filters are those of the listings."""
+    terms = query_terms(text)
+    if not terms:
+        return []
+
+    query_text = " ".join(terms)
+    tsquery = prefix_tsquery(terms)
+    document = search_document()
+    name = search_name()
+    category_name = func.lower(models.Category.name)
+
+    if trigrams_installed(session):
+        name_matches = name.op("%")(query_text)
+        name_score = func.similarity(name, query_text)
+        category_matches = or_(category_name.op("%")(query_text),
+                               category_name.contains(query_text, autoescape=True))
+    else:
+        name_matches = name.startswith(query_text, autoescape=True)
+        name_score = case((name_matches, 1.0), else_=0.0)
+        category_matches = category_name.contains(query_text, autoescape=True)
+
+    # Categories are a handful of rows, resolve the matching ones up front so the business
+    # condition stays a plain (indexed) category_id = ANY(...)
+    category_ids = session.exec(select(models.Category.category_id).where(category_matches)).all()
+
+    conditions = [document.op("@@")(tsquery), name_matches]
+    if category_ids:
+        conditions.append(models.Business.category_id.in_(category_ids))
+
+    rank = (
+        func.ts_rank(document, tsquery)
+        + name_score.cast(Float)
+        + models.Business.category_id.in_(category_ids or [-1]).cast(Integer) * 0.1
+    ).label("rank")
+
+    filters = business_listing_filters(category_id=category_id, min_rating=min_rating, has_website=has_website)
+    businesses = session.exec(
+        business_listing_query(or_(*conditions), *filters)
+        .order_by(desc(rank), models.Business.business_id).offset(offset).limit(limit)
+    ).all()
+    return to_business_with_review_count(businesses)
+
+
+def autocomplete_businesses(session: Session, text: str, limit: int = 10) -> list[models.Business]:
+    """Suggestions while typing: names starting with the text first, then businesses with
+    any word starting with each typed word, most reviewed first.
+
+    Only the first AUTOCOMPLETE_CANDIDATES * limit matches of each condition are ranked, as
+    the indexes return them: a prefix of two letters can match a good part of the table,
+    ranking all of it isn't worth it for suggestions refined with every key stroke."""
+    terms = query_terms(text)
+    if len(text.strip()) < AUTOCOMPLETE_MIN_LENGTH or not terms:
+        return []
+
+    name = search_name()
+    starts_with_name = name.startswith(text.lower(), autoescape=True)
+    candidates = union(*[
+        select(models.Business.business_id).where(condition).limit(limit * AUTOCOMPLETE_CANDIDATES)
+        for condition in (starts_with_name, search_document().op("@@")(prefix_tsquery(terms)))
+    ]).subquery()
+    return session.exec(
+        select(models.Business)
+        .where(models.Business.business_id.in_(select(candidates.c.business_id)))
+        .order_by(desc(starts_with_name), desc(models.Business.review_count), models.Business.business_id)
+        .limit(limit)
+    ).all()
@@ -0,0 +1,154 @@
+"""Review vote counts, stored on reviews.votes_count.
+
+A vote request only inserts or deletes its review_votes row and, once committed, records
+its +1 or -1 in `vote_counter`. Every few seconds the counter flushes: the net change of
+each review voted on since the last flush is added to its count in one UPDATE, so a popular
+review takes one row update per flush instead of one per vote, whatever its number of votes.
+
+The flush locks the reviews FOR NO KEY UPDATE: flushes of several workers take turns on a
+review, while the votes (FOR KEY SHARE on the review, and the foreign key check of their
+insert) never wait for one. The deltas of the committed votes are only lost when a worker
+crashes before flushing them, those counts stay behind until `python -m app.cli
+reconcile-votes --repair` recounts them from review_votes.
+
+The daily stats of the businesses (see rollups.py) aren't left to the flush: a vote adds
+to the vote_count of its day in its own transaction, so a crash loses none and a rebuild of
+the stats never counts a vote twice."""
+import asyncio
+import logging
+from collections import Counter
+
+from sqlalchemy import case
+from sqlmodel import Session, func, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .. import models
+from ..core.cache import response_cache
+from ..core.database import async_engine
+from .revisions import bump_business_revisions
+
+log = logging.getLogger("uvicorn")
+
+
+def actual_votes_count():
+    # Correlated count of a review's rows in review_votes
+    return (
+        select(func.count())
+        .where(models.ReviewVote.review_id == models.Review.review_id)
+        .correlate(models.Review)
+        .scalar_subquery()
+    )
+
+
+def lock_reviews(session: Session, review_ids):
+    # In a fixed order, two flushes of the same reviews can't deadlock. FOR NO KEY UPDATE
+    # doesn't conflict with the votes' FOR KEY SHARE
+    session.exec(
+        select(models.Review.review_id)
+        .where(models.Review.review_id.in_(review_ids))
+        .order_by(models.Review.review_id)
+        .with_for_update(key_share=True)
+    ).all()
+
+
+def changed_businesses(session: Session, business_ids) -> list[int]:
+    business_ids = sorted(set(business_ids))
+    if business_ids:
+        bump_business_revisions(session, models.Business.business_id.in_(business_ids))
+    return business_ids
+
+
+def apply_vote_deltas(session: Session, deltas: dict[int, int]) -> list[int]:
+    """Add the net change of their votes to votes_count of the given reviews. Returns the ids
+    of the businesses showing them, their revision is bumped."""
+    deltas = {review_id: delta for review_id, delta in deltas.items() if delta}
+    if not deltas:
+        return []
+
+    lock_reviews(session, deltas)
+    business_ids = session.exec(
+        update(models.Review)
+        .where(models.Review.review_id.in_(deltas))
+        .values(votes_count=models.Review.votes_count + case(deltas, value=models.Review.review_id, else_=0))
+        .returning(models.Review.business_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    return changed_businesses(session, business_ids)
+
+
+def recount_votes(session: Session, review_ids: list[int]) -> list[int]:
+    """Overwrite votes_count of the given reviews with their actual count. Returns the ids
+    of the businesses showing a review whose count changed, their revision is bumped."""
+    lock_reviews(session, review_ids)
+
+    actual = actual_votes_count()
+    business_ids = session.exec(
+        update(models.Review)
+        .where(models.Review.review_id.in_(review_ids), models.Review.votes_count != actual)
+        .values(votes_count=actual)
+        .returning(models.Review.business_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    return changed_businesses(session, business_ids)
+
+
+class VoteCounter:
+    """Reviews voted on by this worker since the last flush, with the net change of their
+    votes. A review whose votes cancelled out is skipped"""
+
+    def __init__(self):
+        self.pending: Counter = Counter()
+
+    def record(self, review_id: int, delta: int):
+        self.pending[review_id] += delta
+
+    async def flush(self):
+        pending, self.pending = self.pending, Counter()
+        if not any(pending.values()):
+            return
+
+        try:
+            async with AsyncSession(async_engine) as session:
+                business_ids = await session.run_sync(apply_vote_deltas, dict(pending))
+                await session.commit()
+        except Exception:
+            # Keep them for the next flush
+            self.pending.update(pending)
+            raise
+
+        await response_cache.invalidate(*[f"reviews:{business_id}" for business_id in business_ids])
+
+    async def run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Flushing vote counts failed")
+
+
+vote_counter = VoteCounter()
+
+
+def reconcile_vote_counts(session: Session, repair: bool = False) -> list[dict]:
+    """Compare votes_count of every review with review_votes. Returns one entry per drifted
+    review, with repair=True they are recounted. Counts of the reviews voted on since the
+    last flush of a running worker show up as drifted, and a recount of them would count
+    those votes twice when the worker flushes: run it with the app stopped."""
+    actual = actual_votes_count()
+    rows = session.exec(
+        select(models.Review.review_id, models.Review.votes_count, actual)
+        .where(models.Review.votes_count != actual)
+        .order_by(models.Review.review_id)
+    ).all()
+
+    drifted = [
+        {"review_id": review_id, "stored": stored, "actual": expected}
+        for review_id, stored, expected in rows
+    ]
+
+    if repair and drifted:
+        recount_votes(session, [entry["review_id"] for entry in drifted])
+        session.commit()
+
+    return drifted
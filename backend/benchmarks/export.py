@@ -0,0 +1,129 @@
+"""Streaming export benchmark.
+
+Exports a table through /exports/{table} and reports the rows, bytes, time to the first
+byte, throughput, and how much the resident memory of the process grew while it ran, which
+stays flat for a streamed export whatever the size of the table. Meant to run on a database
+filled by benchmarks.seed, from the backend directory:
+
+    python -m benchmarks.seed --truncate --reviews 10000000 --votes 0
+    python -m benchmarks.export --table reviews --format ndjson
+
+By default the app runs in this process and the response is read straight from the ASGI
+app (httpx's ASGI transport would collect the whole body before returning it). --base-url
+reads from a running server instead, the memory reported is then that of this client.
+"""
+import argparse
+import asyncio
+import resource
+import time
+
+import httpx
+
+from app.core.database import async_engine, engine
+from app.core.security import create_access_token
+from app.main import app
+
+TABLES = ("reviews", "businesses", "votes", "users")
+
+# Seeded as the admin by benchmarks.seed
+ADMIN_USER_ID = 1
+
+
+def resident_mb() -> float:
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+class Reading:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.status = None
+        self.first_byte = None
+        self.bytes = 0
+        self.lines = 0
+        self.resident_before = resident_mb()
+        self.resident_peak = self.resident_before
+
+    def chunk(self, body: bytes):
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter() - self.started
+        self.bytes += len(body)
+        self.lines += body.count(b"\n")
+        # Sampled every ~64 MB of output, reading /proc costs more than a chunk
+        if self.bytes // 2 ** 26 != (self.bytes - len(body)) // 2 ** 26:
+            self.resident_peak = max(self.resident_peak, resident_mb())
+
+
+async def read_in_process(path: str, query: str, headers: dict, reading: Reading):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        "client": ("127.0.0.1", 0), "server": ("benchmark", 80),
+    }
+    disconnected = asyncio.Event()
+
+    async def receive():
+        # No request body, then wait like a client that stays connected
+        if not getattr(receive, "sent", False):
+            receive.sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            reading.status = message["status"]
+        elif message["type"] == "http.response.body":
+            reading.chunk(message.get("body", b""))
+
+    async with app.router.lifespan_context(app):
+        try:
+            await app(scope, receive, send)
+        finally:
+            disconnected.set()
+
+
+async def read_over_http(base_url: str, path: str, query: str, headers: dict, reading: Reading):
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        async with client.stream("GET", f"{path}?{query}", headers=headers) as response:
+            reading.status = response.status_code
+            async for body in response.aiter_raw():
+                reading.chunk(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.export")
+    parser.add_argument("--table", choices=TABLES, default="reviews")
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    parser.add_argument("--query", default="", help="Extra filters, e.g. business_id=1 or updated_since=2026-01-01")
+    parser.add_argument("--base-url", help="Read from a running server, e.g. http://127.0.0.1:8000")
+    args = parser.parse_args()
+
+    engine.echo = False
+    async_engine.echo = False
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': ADMIN_USER_ID, 'role': 'admin'})}"}
+    path = f"/exports/{args.table}"
+    query = "&".join(part for part in (f"format={args.format}", args.query) if part)
+
+    reading = Reading()
+    if args.base_url:
+        asyncio.run(read_over_http(args.base_url, path, query, headers, reading))
+    else:
+        asyncio.run(read_in_process(path, query, headers, reading))
+    reading.resident_peak = max(reading.resident_peak, resident_mb())
+    elapsed = time.perf_counter() - reading.started
+
+    if reading.status != 200:
+        raise SystemExit(f"Export answered {reading.status}")
+    # NDJSON has a line per row, CSV a header line first (and more lines for values with newlines)
+    rows = reading.lines - (1 if args.format == "csv" else 0)
+    print(f"{args.table} as {args.format}: {rows} rows, {reading.bytes / 2 ** 20:.1f} MB in {elapsed:.1f} s")
+    print(f"first byte after {reading.first_byte * 1000:.0f} ms, {rows / elapsed:.0f} rows/s, "
+          f"{reading.bytes / 2 ** 20 / elapsed:.1f} MB/s")
+    print(f"resident memory {reading.resident_before:.0f} MB before, peak {reading.resident_peak:.0f} MB "
+          f"(+{reading.resident_peak - reading.resident_before:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
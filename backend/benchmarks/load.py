@@ -0,0 +1,209 @@
+"""Load scenario against the API.
+
+Replays the main user journeys (listing, search, review page, a burst of votes, a burst of
+logins) with concurrent clients and reports, per step, latency percentiles, throughput,
+status codes and the SQL statements each request sent. Meant to run on a database filled
+by benchmarks.seed, from the backend directory:
+
+    python -m benchmarks.load --requests 2000 --concurrency 50 --save before.json
+    python -m benchmarks.load --requests 2000 --concurrency 50 --compare before.json
+
+By default the app runs in this process (lifespan included) behind an ASGI transport, which
+is what lets the statements be counted. --base-url sends the requests to a running server
+instead, without statement counts. Set CACHE_BACKEND=none to measure the routes rather than
+the response cache. With --compare the exit status is 1 when a step sends more statements
+per request than in the saved run, or its p95 grew by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+from sqlalchemy import event, text
+
+from app.core.database import async_engine, engine
+from app.core.security import create_access_token
+from app.main import app
+
+from .search import CITIES, KINDS, percentile
+from .seed import PASSWORD, Zipf
+
+STEPS = ("listing", "search", "review_page", "vote_burst", "login_burst")
+
+
+class Scenario:
+    """Requests of every step, drawn with the popularity skew of the seeded data"""
+
+    def __init__(self, zipf: float, seed: int):
+        with engine.connect() as connection:
+            self.users, self.categories, self.businesses, self.reviews = connection.execute(text(
+                "SELECT (SELECT max(user_id) FROM users), (SELECT max(category_id) FROM categories), "
+                "(SELECT max(business_id) FROM businesses), (SELECT max(review_id) FROM reviews)"
+            )).one()
+        if not self.businesses or not self.reviews:
+            raise SystemExit("No data to run against, seed the database first (python -m benchmarks.seed)")
+
+        self.rng = random.Random(seed)
+        self.business = Zipf(self.businesses, zipf, self.rng)
+        self.review = Zipf(self.reviews, zipf, self.rng)
+        self.category = Zipf(self.categories, zipf, self.rng)
+        self.tokens: dict[int, str] = {}
+
+    def token(self, user_id: int) -> dict:
+        if user_id not in self.tokens:
+            self.tokens[user_id] = create_access_token({"user_id": user_id, "role": "user"})
+        return {"Authorization": f"Bearer {self.tokens[user_id]}"}
+
+    def request(self, step: str) -> dict:
+        # Keyword arguments of httpx.AsyncClient.request
+        if step == "listing":
+            if self.rng.random() < 0.5:
+                return {"method": "GET", "url": "/businesses/?limit=20"}
+            return {"method": "GET", "url": f"/businesses/category/{self.category.id()}?limit=20"}
+        if step == "search":
+            words = [self.rng.choice(KINDS).lower()]
+            if self.rng.random() < 0.5:
+                words.append(self.rng.choice(CITIES).lower())
+            return {"method": "GET", "url": "/businesses/search/", "params": {"name": " ".join(words)}}
+        if step == "review_page":
+            return {"method": "GET", "url": f"/reviews/{self.business.id()}?limit=20"}
+        if step == "vote_burst":
+            # Some land on reviews already voted on by the user, a 409 is a normal outcome
+            return {"method": "POST", "url": "/vote/", "json": {"review_id": self.review.id(), "direction": 1},
+                    "headers": self.token(self.rng.randrange(1, self.users + 1))}
+        if step == "login_burst":
+            user_id = self.rng.randrange(1, self.users + 1)
+            return {"method": "POST", "url": "/login",
+                    "data": {"username": f"user{user_id}@example.com", "password": PASSWORD}}
+        raise ValueError(step)
+
+
+@asynccontextmanager
+async def api_client(base_url: str | None):
+    if base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            yield client
+        return
+    # In process, with the startup and shutdown of the app around the run. Unhandled
+    # exceptions come back as 500s instead of ending the run
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            yield client
+
+
+async def run_step(client: httpx.AsyncClient, requests: list[dict], concurrency: int) -> dict:
+    latencies, statuses = [], {}
+    queue = iter(requests)
+
+    async def worker():
+        for request in queue:
+            started = time.perf_counter()
+            try:
+                status = (await client.request(**request)).status_code
+            except httpx.HTTPError:
+                status = "error"
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    scenario = Scenario(args.zipf, args.seed)
+    statements = [0]
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements[0] += 1
+
+    results = {}
+    async with api_client(args.base_url) as client:
+        if not args.base_url:
+            event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+        try:
+            for step in args.steps:
+                # Seeded per step, a step sends the same requests whichever steps run with it
+                scenario.rng.seed(f"{args.seed}:{step}")
+                requests = [scenario.request(step) for _ in range(args.requests)]
+                statements[0] = 0
+                result = await run_step(client, requests, args.concurrency)
+                # Includes the work a request leaves to the app, e.g. the vote flushes
+                result["statements"] = None if args.base_url else statements[0] / result["requests"]
+                results[step] = result
+        finally:
+            if not args.base_url:
+                event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    return results
+
+
+def report(results: dict):
+    print(f"{'step':<14}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'SQL/req':>9}  statuses")
+    for step, result in results.items():
+        statements = "-" if result["statements"] is None else f"{result['statements']:.2f}"
+        statuses = ", ".join(f"{status}: {count}" for status, count in result["statuses"].items())
+        print(f"{step:<14}{result['requests']:>9}{result['throughput']:>9.0f}{result['p50']:>9.1f}"
+              f"{result['p95']:>9.1f}{result['p99']:>9.1f}{statements:>9}  {statuses}")
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for step, result in results.items():
+        before = baseline.get(step)
+        if not before:
+            continue
+        if result["statements"] is not None and before["statements"] is not None \
+                and result["statements"] > before["statements"] + 0.01:
+            found.append(f"{step}: {before['statements']:.2f} -> {result['statements']:.2f} SQL statements per request")
+        if result["p95"] > before["p95"] * (1 + tolerance):
+            found.append(f"{step}: p95 {before['p95']:.1f} -> {result['p95']:.1f} ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per step")
+    parser.add_argument("--concurrency", type=int, default=20, help="Clients sending requests at the same time")
+    parser.add_argument("--steps", nargs="+", choices=STEPS, default=list(STEPS))
+    parser.add_argument("--base-url", help="Send the requests to a running server, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Skew of the ids requested, as in benchmarks.seed")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed of the requests")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="p95 growth allowed by --compare")
+    args = parser.parse_args()
+
+    engine.echo = False
+    async_engine.echo = False
+    results = asyncio.run(run(args))
+    report(results)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            found = regressions(results, json.load(file), args.tolerance)
+        for regression in found:
+            print(f"regression {regression}")
+        if found:
+            raise SystemExit(1)
+        print("No regression against the saved run")
+
+
+if __name__ == "__main__":
+    main()
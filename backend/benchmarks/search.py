@@ -0,0 +1,127 @@
+"""Business search latency benchmark.
+
+Loads synthetic businesses into the configured database (in a "Benchmark" category, so
+they can be removed again with --cleanup) and times the search and autocomplete queries.
+Run from the backend directory:
+
+    python -m benchmarks.search --businesses 1000000 --runs 200
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app import models
+from app.core.database import engine
+from app.services import search
+
+BENCHMARK_CATEGORY = "Benchmark"
+
+ADJECTIVES = ["Golden", "Blue", "Happy", "Little", "Royal", "Green", "Urban", "Old", "Sunny", "Silver",
+              "Red", "Grand", "Cozy", "Lucky", "Wild", "Modern", "Rustic", "Crystal", "Bright", "Hidden"]
+KINDS = ["Cafe", "Bistro", "Bakery", "Gym", "Garage", "Salon", "Pharmacy", "Pizzeria", "Bookshop", "Studio",
+         "Florist", "Hotel", "Clinic", "Brewery", "Market", "Tailor", "Dental", "Sushi", "Laundry", "Agency"]
+CITIES = ["Paris", "Lyon", "Marseille", "Lille", "Nantes", "Bordeaux", "Toulouse", "Nice", "Rennes", "Tours"]
+
+QUERIES = {
+    "search: one word": ("search", "bakery"),
+    "search: two words": ("search", "golden bistro"),
+    "search: word + city": ("search", "pizzeria lyon"),
+    "search: typo": ("search", "bakry"),
+    "search: half typed": ("search", "brew"),
+    "autocomplete: 2 chars": ("autocomplete", "go"),
+    "autocomplete: word": ("autocomplete", "royal ca"),
+}
+
+
+def sql_array(values: list[str]) -> str:
+    return "ARRAY[" + ", ".join(f"'{value}'" for value in values) + "]"
+
+
+def seed(count: int):
+    with Session(engine) as session:
+        category = session.exec(select(models.Category).where(models.Category.name == BENCHMARK_CATEGORY)).first()
+        if not category:
+            category = models.Category(name=BENCHMARK_CATEGORY, icon="benchmark")
+            session.add(category)
+            session.commit()
+            session.refresh(category)
+        category_id = category.category_id
+
+    # Generated server side, a million rows take seconds instead of a million round trips
+    with engine.begin() as connection:
+        connection.execute(text(f"""
+            INSERT INTO businesses (name, description, location, logo, category_id, average_rating)
+            SELECT adjective || ' ' || kind || ' #' || i,
+                   'Family run ' || lower(kind) || ' in the heart of ' || city,
+                   city,
+                   'benchmark.png',
+                   :category_id,
+                   round((1 + random() * 4)::numeric, 1)
+            FROM (
+                SELECT i,
+                       ({sql_array(ADJECTIVES)})[1 + i % {len(ADJECTIVES)}] AS adjective,
+                       ({sql_array(KINDS)})[1 + (i / {len(ADJECTIVES)}) % {len(KINDS)}] AS kind,
+                       ({sql_array(CITIES)})[1 + (i / 7) % {len(CITIES)}] AS city
+                FROM generate_series(1, :count) AS i
+            ) generated
+            ON CONFLICT (name) DO NOTHING
+        """), {"category_id": category_id, "count": count})
+        connection.execute(text("ANALYZE businesses"))
+
+
+def cleanup():
+    with engine.begin() as connection:
+        # Businesses go with their category (ON DELETE CASCADE)
+        connection.execute(text("DELETE FROM categories WHERE name = :name"), {"name": BENCHMARK_CATEGORY})
+
+
+def percentile(samples: list[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def run(runs: int):
+    with Session(engine) as session:
+        total = session.exec(select(models.Business.business_id).order_by(models.Business.business_id.desc())).first()
+        print(f"businesses table: ~{total or 0} rows, {runs} runs per query\n")
+        print(f"{'query':<26}{'results':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+
+        for label, (kind, query) in QUERIES.items():
+            samples = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                if kind == "search":
+                    results = search.search_businesses(session, query, limit=20)
+                else:
+                    results = search.autocomplete_businesses(session, query, limit=10)
+                samples.append((time.perf_counter() - started) * 1000)
+                session.rollback()
+
+            print(f"{label:<26}{len(results):>8}{statistics.median(samples):>10.2f}"
+                  f"{percentile(samples, 95):>10.2f}{percentile(samples, 99):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.search")
+    parser.add_argument("--businesses", type=int, default=0, help="Synthetic businesses to load before timing")
+    parser.add_argument("--runs", type=int, default=100, help="Timed runs per query")
+    parser.add_argument("--cleanup", action="store_true", help="Remove the synthetic businesses afterwards")
+    args = parser.parse_args()
+
+    engine.echo = False
+    if args.businesses:
+        started = time.perf_counter()
+        seed(args.businesses)
+        print(f"Loaded {args.businesses} businesses in {time.perf_counter() - started:.1f}s")
+    try:
+        run(args.runs)
+    finally:
+        if args.cleanup:
+            cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Benchmark dataset generator.
+
+Fills an empty database (or one emptied with --truncate) with users, categories, businesses,
+reviews and votes, streamed in with COPY. Popularity is skewed like real traffic: businesses
+get their reviews, reviews their votes and categories their businesses following a Zipf
+distribution, so a few businesses have thousands of reviews and most have a handful. The
+same --seed always produces the same data. Run from the backend directory:
+
+    python -m benchmarks.seed --businesses 100000 --reviews 10000000 --votes 50000000 --truncate
+
+Every user's password is "benchmark", benchmarks.load logs them in with it. Review
+aggregates and vote counts are computed once at the end instead of row by row.
+"""
+import argparse
+import io
+import math
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlmodel import func, select, update
+
+from app import models
+from app.core import security
+from app.core.database import engine
+from app.schemas import UserRole
+from app.services.aggregates import AGGREGATE_COLUMNS, actual_aggregates_query, average_rating_expression
+
+from .search import ADJECTIVES, CITIES, KINDS
+
+PASSWORD = "benchmark"
+# Share of each star rating, most reviews are positive
+RATING_WEIGHTS = {1: 0.10, 2: 0.07, 3: 0.13, 4: 0.28, 5: 0.42}
+# Reviews are spread over this many days before now
+REVIEW_DAYS = 730
+# Large prime, multiplying ranks by it modulo the row count scatters the popular ids
+SCATTER = 2654435761
+TABLES = ("users", "categories", "businesses", "reviews", "review_votes", "review_replies")
+
+
+class Zipf:
+    """Ranks 1..n where rank k is drawn with a probability proportional to 1 / k^s, sampled
+    by inverting the continuous approximation of the distribution (no n-sized table)"""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.n = n
+        self.s = s
+        self.rng = rng
+
+    def rank(self) -> int:
+        u = self.rng.random()
+        if abs(self.s - 1) < 1e-9:
+            rank = math.exp(u * math.log(self.n + 1))
+        else:
+            a = 1 - self.s
+            rank = (u * ((self.n + 1) ** a - 1) + 1) ** (1 / a)
+        return min(int(rank), self.n)
+
+    def id(self) -> int:
+        # Rank -> row id, so the popular rows aren't all at the start of the table
+        return (self.rank() * SCATTER) % self.n + 1
+
+
+def copy_rows(cursor, table: str, columns: tuple[str, ...], rows, chunk: int) -> int:
+    """COPY `rows` (tuples) into `table`, `chunk` rows per round trip. Values must not contain
+    tabs, newlines or backslashes, None is written as NULL."""
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    buffer = io.StringIO()
+    pending = total = 0
+    for row in rows:
+        buffer.write("\t".join("\\N" if value is None else str(value) for value in row))
+        buffer.write("\n")
+        pending += 1
+        if pending == chunk:
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            total += pending
+            buffer, pending = io.StringIO(), 0
+    if pending:
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+        total += pending
+    return total
+
+
+def user_rows(count: int, password_hash: str):
+    for user_id in range(1, count + 1):
+        # The first user administers the benchmark data. The enum column stores member names
+        role = (UserRole.ADMIN if user_id == 1 else UserRole.USER).name
+        yield user_id, f"user{user_id}", f"user{user_id}@example.com", password_hash, role
+
+
+def category_rows(count: int):
+    for category_id in range(1, count + 1):
+        yield category_id, f"Category {category_id}", f"bench-icon-{category_id}"
+
+
+def business_rows(count: int, categories: Zipf, rng: random.Random):
+    for business_id in range(1, count + 1):
+        adjective = ADJECTIVES[business_id % len(ADJECTIVES)]
+        kind = KINDS[(business_id // len(ADJECTIVES)) % len(KINDS)]
+        city = CITIES[rng.randrange(len(CITIES))]
+        website = f"https://business{business_id}.example" if rng.random() < 0.5 else None
+        yield (business_id, f"{adjective} {kind} #{business_id}", f"Family run {kind.lower()} in the heart of {city}",
+               city, "benchmark.png", website, categories.id())
+
+
+def review_rows(count: int, users: int, businesses: Zipf, rng: random.Random):
+    ratings, weights = list(RATING_WEIGHTS), list(RATING_WEIGHTS.values())
+    now = datetime.now(timezone.utc)
+    for review_id in range(1, count + 1):
+        rating = rng.choices(ratings, weights)[0]
+        created_at = now - timedelta(seconds=rng.randrange(REVIEW_DAYS * 86400))
+        yield (review_id, rating, f"{rating} stars", f"Benchmark review {review_id}",
+               rng.randrange(1, users + 1), businesses.id(), created_at.isoformat())
+
+
+def vote_rows(count: int, users: int, reviews: Zipf):
+    """`count` votes spread evenly over the users, each user votes on reviews drawn from
+    the Zipf distribution. A review drawn twice for the same user is voted on once, so the
+    most popular reviews end up with at most one vote per user."""
+    per_user, extra = divmod(count, users)
+    for user_id in range(1, users + 1):
+        wanted = per_user + (1 if user_id <= extra else 0)
+        for review_id in sorted({reviews.id() for _ in range(wanted)}):
+            yield review_id, user_id
+
+
+def recompute_counters(connection):
+    # Aggregates of every business and vote counts of every review, one UPDATE each
+    actual = actual_aggregates_query().subquery()
+    connection.execute(
+        update(models.Business)
+        .where(models.Business.business_id == actual.c.business_id)
+        .values(
+            **{column: getattr(actual.c, column) for column in AGGREGATE_COLUMNS},
+            average_rating=average_rating_expression(actual.c.review_count, actual.c.rating_sum),
+        )
+    )
+    votes = (
+        select(models.ReviewVote.review_id, func.count().label("votes_count"))
+        .group_by(models.ReviewVote.review_id)
+        .subquery()
+    )
+    connection.execute(
+        update(models.Review)
+        .where(models.Review.review_id == votes.c.review_id)
+        .values(votes_count=votes.c.votes_count)
+    )
+
+
+def seed(args: argparse.Namespace):
+    rng = random.Random(args.seed)
+    password_hash = security.hash_password(PASSWORD)
+
+    with engine.begin() as connection:
+        existing = connection.execute(text("SELECT EXISTS (SELECT 1 FROM businesses) OR EXISTS (SELECT 1 FROM users)")).scalar()
+        if existing and not args.truncate:
+            raise SystemExit("The database already has data, run again with --truncate to replace it")
+        if args.truncate:
+            connection.execute(text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE"))
+
+        cursor = connection.connection.cursor()
+        steps = [
+            ("users", ("user_id", "username", "email", "password", "role"),
+             user_rows(args.users, password_hash)),
+            ("categories", ("category_id", "name", "icon"),
+             category_rows(args.categories)),
+            ("businesses", ("business_id", "name", "description", "location", "logo", "website", "category_id"),
+             business_rows(args.businesses, Zipf(args.categories, args.zipf, rng), rng)),
+            ("reviews", ("review_id", "rating", "review_title", "review_text", "user_id", "business_id", "created_at"),
+             review_rows(args.reviews, args.users, Zipf(args.businesses, args.zipf, rng), rng)),
+            ("review_votes", ("review_id", "user_id"),
+             vote_rows(args.votes, args.users, Zipf(args.reviews, args.zipf, rng)) if args.reviews else ()),
+        ]
+        for table, columns, rows in steps:
+            started = time.perf_counter()
+            loaded = copy_rows(cursor, table, columns, rows, args.chunk)
+            print(f"{table:<14}{loaded:>12} rows in {time.perf_counter() - started:.1f}s")
+
+        # Ids were given explicitly, move the sequences past them
+        for table, column in (("users", "user_id"), ("categories", "category_id"),
+                              ("businesses", "business_id"), ("reviews", "review_id")):
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                f"(SELECT coalesce(max({column}), 0) + 1 FROM {table}), false)"
+            ))
+
+        started = time.perf_counter()
+        recompute_counters(connection)
+        print(f"counters recomputed in {time.perf_counter() - started:.1f}s")
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"ANALYZE {', '.join(TABLES)}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.seed")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--businesses", type=int, default=100000)
+    parser.add_argument("--reviews", type=int, default=1000000)
+    parser.add_argument("--votes", type=int, default=5000000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Skew of the popularity distributions, 0 is uniform")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed, the same seed gives the same data")
+    parser.add_argument("--chunk", type=int, default=100000, help="Rows per COPY round trip")
+    parser.add_argument("--truncate", action="store_true", help="Empty every table first")
+    args = parser.parse_args()
+
+    engine.echo = False
+    started = time.perf_counter()
+    seed(args)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
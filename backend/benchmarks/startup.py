@@ -0,0 +1,106 @@
+"""Import time budget of a worker.
+
+Imports app.main in fresh interpreters under `python -X importtime` and reports the median
+time it took, the modules taking the most of it, and any module meant to be imported lazily
+(see DEFERRED) that was imported at boot. Run from the backend directory, e.g. in CI:
+
+    python -m benchmarks.startup --runs 5 --budget-ratio 1.8
+
+The budget is relative: the median is compared to the median import of the framework alone
+(see BASELINE), measured the same way on the same machine, so a slower runner doesn't fail
+it. --budget-ms (or STARTUP_BUDGET_MS) adds an absolute limit, for a known machine.
+
+The exit status is 1 when the median is over budget or a deferred module was imported.
+-X importtime adds its own overhead, compare numbers measured the same way only.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Top-level packages a worker must not import at boot, and what imports them instead
+DEFERRED = {
+    "alembic": "app.cli migrate, or DATABASE_MIGRATE_ON_STARTUP",
+    "mako": "alembic",
+    "passlib": "the password hashing processes",
+    "jose": "the first token signed or checked, or the warm-up",
+    "httpx": "the warm-up",
+}
+
+# What any worker of this stack imports, whatever the app does with it
+BASELINE = ("fastapi", "sqlmodel", "sqlalchemy.ext.asyncio", "asyncpg", "pydantic_settings")
+
+BACKEND_DIRECTORY = os.path.join(os.path.dirname(__file__), "..")
+
+
+def import_times(*modules: str) -> dict[str, tuple[int, int]]:
+    """module -> (self, cumulative) microseconds, from a fresh interpreter importing `modules`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        cwd=BACKEND_DIRECTORY, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise SystemExit(f"Importing {', '.join(modules)} failed:\n{result.stderr[-2000:]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def median_import_ms(runs: list[dict], modules) -> tuple[float, list[float]]:
+    # Modules imported one after the other, each cumulative time counts what the previous
+    # ones didn't import already
+    totals = [sum(times.get(module, (0, 0))[1] for module in modules) / 1000 for times in runs]
+    return statistics.median(totals), totals
+
+
+def main():
+    budget_ms = os.environ.get("STARTUP_BUDGET_MS")
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--module", default="app.main", help="Module a worker imports")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to import it in")
+    parser.add_argument("--budget-ratio", type=float, default=1.8,
+                        help="Median import time allowed, relative to importing the framework alone")
+    parser.add_argument("--budget-ms", type=float, default=float(budget_ms) if budget_ms else None,
+                        help="Median import time allowed in ms, none by default")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list, by their own import time")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    median, totals = median_import_ms(runs, [args.module])
+    baseline, _ = median_import_ms([import_times(*BASELINE) for _ in range(args.runs)], BASELINE)
+    ratio = median / baseline
+
+    # Own time of each module, median over the runs
+    modules = {name: statistics.median(times.get(name, (0, 0))[0] for times in runs) / 1000 for name in runs[0]}
+    print(f"{'module':<50}{'self ms':>9}")
+    for name, own in sorted(modules.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<50}{own:>9.1f}")
+    print(f"\n{args.module}: median {median:.0f} ms over {args.runs} runs "
+          f"(min {min(totals):.0f}, max {max(totals):.0f})")
+    print(f"framework alone: median {baseline:.0f} ms, {args.module} takes {ratio:.2f}x that, "
+          f"budget {args.budget_ratio:.2f}x" + (f" and {args.budget_ms:.0f} ms" if args.budget_ms else ""))
+
+    failed = False
+    imported = sorted({name.split(".")[0] for name in runs[0]} & DEFERRED.keys())
+    for package in imported:
+        print(f"{package} is imported at boot, it should only be imported by {DEFERRED[package]}")
+        failed = True
+    if ratio > args.budget_ratio:
+        print(f"Over budget by {(ratio - args.budget_ratio) * baseline:.0f} ms")
+        failed = True
+    if args.budget_ms and median > args.budget_ms:
+        print(f"Over the absolute budget by {median - args.budget_ms:.0f} ms")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+    print("Within budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Fixtures of the API tests.
+
+The tests run against a PostgreSQL database of their own, on the server of the settings
+(.env): DATABASE_NAME with a _test suffix, or TEST_DATABASE_NAME. It is created and
+migrated on the first run, and every test using `data` starts from the same small set of
+rows. The app runs in process through a TestClient shared by the whole session, the async
+engine's connections belong to its event loop."""
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import pytest
+
+from app.core.config import settings
+
+settings.database_name = os.environ.get("TEST_DATABASE_NAME", f"{settings.database_name}_test")
+# Nothing running in the background between the statements of a test: no warm-up, and the
+# votes and leaderboards are flushed or refreshed by the tests that need it
+settings.warmup_paths = ""
+settings.vote_flush_interval_seconds = 3600
+settings.leaderboard_refresh_interval_seconds = 3600
+settings.database_migrate_on_startup = False
+settings.database_echo = False
+# Cheapest bcrypt cost, the users of every test are hashed again
+settings.password_bcrypt_rounds = 4
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine, event, text  # noqa: E402
+from sqlmodel import Session, SQLModel  # noqa: E402
+
+from app import models  # noqa: E402
+from app.core.cache import response_cache  # noqa: E402
+from app.core.database import SQLALCHEMY_DATABASE_URL, async_engine, engine  # noqa: E402
+from app.core.principals import principal_cache  # noqa: E402
+from app.core.security import create_access_token, hash_password, token_cache  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.aggregates import recompute_business_aggregates  # noqa: E402
+from app.services.rollups import rebuild_daily_stats  # noqa: E402
+from app.services.votes import recount_votes, vote_counter  # noqa: E402
+
+PASSWORD = "password1"
+
+
+def create_database():
+    # CREATE DATABASE can't run in a transaction, nor on the database it creates
+    server = create_engine(SQLALCHEMY_DATABASE_URL.rsplit("/", 1)[0] + "/postgres", isolation_level="AUTOCOMMIT")
+    with server.connect() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": settings.database_name}
+        ).first()
+        if not exists:
+            connection.execute(text(f'CREATE DATABASE "{settings.database_name}"'))
+    server.dispose()
+
+
+@pytest.fixture(scope="session")
+def database():
+    from app.core.migrations import migrate
+
+    create_database()
+    migrate()
+    yield engine
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    with TestClient(app) as client:
+        yield client
+
+
+@dataclass
+class Data:
+    admin: models.User
+    supervisor: models.User
+    users: list[models.User]
+    categories: list[models.Category]
+    businesses: list[models.Business]
+    reviews: list[models.Review] = field(default_factory=list)
+
+    @staticmethod
+    def headers(user: models.User) -> dict:
+        token = create_access_token({"user_id": user.user_id, "role": user.role})
+        return {"Authorization": f"Bearer {token}"}
+
+
+def reset_database():
+    tables = ", ".join(table.name for table in SQLModel.metadata.sorted_tables)
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+
+    # What the app keeps in memory about the rows of the previous test
+    response_cache.backend.entries.clear()
+    response_cache.backend.versions.clear()
+    principal_cache.entries.clear()
+    token_cache.entries.clear()
+    vote_counter.pending.clear()
+
+
+@pytest.fixture
+def data(client) -> Data:
+    """Three categories, 25 businesses (the first one supervised), two reviewers with a
+    review each on most businesses, a vote and a reply. Aggregates, vote counts and daily
+    stats are computed like the backfills do."""
+    reset_database()
+    with Session(engine, expire_on_commit=False) as session:
+        password = hash_password(PASSWORD)
+        admin = models.User(username="admin", email="admin@example.com", password=password, role="admin")
+        supervisor = models.User(username="supervisor", email="supervisor@example.com", password=password,
+                                 role="supervisor")
+        users = [models.User(username=f"user{i}", email=f"user{i}@example.com", password=password) for i in range(2)]
+        categories = [models.Category(name=f"Category {i}", icon=f"icon-{i}") for i in range(3)]
+        session.add_all([admin, supervisor, *users, *categories])
+        session.flush()
+
+        businesses = [
+            models.Business(
+                name=f"Business {i:02}", location="Paris", logo="logo.png", category_id=categories[i % 3].category_id,
+                supervisor_id=supervisor.user_id if i == 0 else None, website="https://example.com" if i % 2 else None,
+            )
+            for i in range(25)
+        ]
+        session.add_all(businesses)
+        session.flush()
+
+        reviews = [
+            models.Review(rating=(i + j) % 5 + 1, review_title=f"Review {i}-{j}", review_text="Text",
+                          user_id=user.user_id, business_id=business.business_id)
+            for i, business in enumerate(businesses) if i % 5
+            for j, user in enumerate(users)
+        ]
+        session.add_all(reviews)
+        session.flush()
+        session.add(models.ReviewVote(review_id=reviews[0].review_id, user_id=users[1].user_id))
+        session.add(models.ReviewReply(review_id=reviews[0].review_id, supervisor_id=supervisor.user_id,
+                                       reply_text="Thanks"))
+        session.flush()
+
+        business_ids = [business.business_id for business in businesses]
+        recompute_business_aggregates(session, business_ids)
+        recount_votes(session, [review.review_id for review in reviews])
+        rebuild_daily_stats(session, business_ids)
+        session.commit()
+        for row in (admin, supervisor, *users, *businesses, *reviews):
+            session.refresh(row)
+
+    return Data(admin, supervisor, users, categories, businesses, reviews)
+
+
+@pytest.fixture
+def flush_votes(client):
+    """Flushes the vote counter like its periodic task, on the app's event loop"""
+    return lambda: client.portal.call(vote_counter.flush)
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def __call__(self, connection, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@pytest.fixture
+def count_statements():
+    """Context manager collecting the SQL statements the app's async engine sends"""
+    @contextmanager
+    def counting():
+        counter = StatementCounter()
+        event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+        try:
+            yield counter
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", counter)
+    return counting
+
@@ -0,0 +1,87 @@
+import asyncio
+
+from app.core.cache import MemoryBackend
+
+
+def test_business_page_is_served_from_the_cache(client, data):
+    path = f"/businesses/{data.businesses[1].business_id}"
+    first = client.get(path)
+    second = client.get(path)
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == first.json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+
+
+def test_business_edit_invalidates_its_page(client, data):
+    business = data.businesses[1]
+    path = f"/businesses/{business.business_id}"
+    client.get(path)
+
+    response = client.patch(path, json={"name": "Renamed"}, headers=data.headers(data.admin))
+    assert response.status_code == 200
+
+    after = client.get(path)
+    assert after.headers["X-Cache"] == "MISS"
+    assert after.json()["business"]["name"] == "Renamed"
+    # Other businesses keep their cached page
+    other = f"/businesses/{data.businesses[2].business_id}"
+    client.get(other)
+    assert client.get(other).headers["X-Cache"] == "HIT"
+
+
+def test_new_review_invalidates_the_business_and_its_reviews(client, data):
+    business = data.businesses[1]
+    client.get(f"/businesses/{business.business_id}")
+    reviews_before = client.get(f"/reviews/{business.business_id}").json()
+
+    response = client.post(f"/reviews/{business.business_id}", headers=data.headers(data.admin),
+                           json={"rating": 5, "review_title": "New", "review_text": "Text"})
+    assert response.status_code == 200, response.text
+
+    page = client.get(f"/businesses/{business.business_id}")
+    assert page.headers["X-Cache"] == "MISS"
+    assert page.json()["reviews_count"] == business.review_count + 1
+
+    reviews = client.get(f"/reviews/{business.business_id}")
+    assert reviews.headers["X-Cache"] == "MISS"
+    assert len(reviews.json()) == len(reviews_before) + 1
+
+
+def test_category_rename_invalidates_the_business_pages(client, data):
+    business = data.businesses[0]
+    path = f"/businesses/{business.business_id}"
+    client.get(path)
+
+    response = client.patch(f"/categories/{business.category_id}", json={"name": "Renamed"},
+                            headers=data.headers(data.admin))
+    assert response.status_code == 200
+
+    assert client.get(path).json()["business"]["category"]["name"] == "Renamed"
+
+
+def test_vote_flush_invalidates_the_reviews(client, data, flush_votes):
+    review = data.reviews[2]
+    path = f"/reviews/{review.business_id}"
+    client.get(path)
+
+    response = client.post("/vote/", json={"review_id": review.review_id, "direction": 1},
+                           headers=data.headers(data.users[0]))
+    assert response.status_code == 201, response.text
+    flush_votes()
+
+    votes = {entry["Review"]["review_id"]: entry["votes_count"] for entry in client.get(path).json()}
+    assert votes[review.review_id] == 1
+
+
+def test_versions_outlive_evicted_entries():
+    backend = MemoryBackend(max_entries=1)
+
+    async def scenario():
+        await backend.bump_versions(["business:1"])
+        await backend.set("a", b"1", ttl=60)
+        await backend.set("b", b"2", ttl=60)
+        return await backend.get("a"), await backend.get("b"), await backend.get_versions(["business:1"])
+
+    assert asyncio.run(scenario()) == (None, b"2", [1])
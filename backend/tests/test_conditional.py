@@ -0,0 +1,70 @@
+from datetime import timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+
+import pytest
+
+from app.api.conditional import CACHE_CONTROL
+
+
+def later(http_date: str, seconds: int) -> str:
+    return format_datetime(parsedate_to_datetime(http_date) + timedelta(seconds=seconds), usegmt=True)
+
+
+def business_paths(data) -> list[str]:
+    business = data.businesses[1].business_id
+    return [f"/businesses/{business}", f"/reviews/{business}", f"/review-replies/business/{business}"]
+
+
+@pytest.mark.parametrize("index", range(3))
+def test_matching_etag_is_not_modified(client, data, index):
+    path = business_paths(data)[index]
+    first = client.get(path)
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == CACHE_CONTROL
+
+    # Answered by the revision lookup, then by the response cache
+    for _ in range(2):
+        response = client.get(path, headers={"If-None-Match": first.headers["ETag"]})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == first.headers["ETag"]
+        assert response.headers["Cache-Control"] == CACHE_CONTROL
+
+    assert client.get(path, headers={"If-None-Match": 'W/"other"'}).status_code == 200
+
+
+def test_etag_changes_with_the_business(client, data):
+    path = f"/businesses/{data.businesses[1].business_id}"
+    etag = client.get(path).headers["ETag"]
+
+    response = client.patch(path, json={"location": "Lyon"}, headers=data.headers(data.admin))
+    assert response.status_code == 200
+
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["business"]["location"] == "Lyon"
+
+
+def test_if_modified_since_needs_an_earlier_second(client, data):
+    path = f"/businesses/{data.businesses[1].business_id}"
+    last_modified = client.get(path).headers["Last-Modified"]
+
+    # A write later in the same second would carry the same date
+    assert client.get(path, headers={"If-Modified-Since": last_modified}).status_code == 200
+    assert client.get(path, headers={"If-Modified-Since": later(last_modified, -1)}).status_code == 200
+    assert client.get(path, headers={"If-Modified-Since": later(last_modified, 1)}).status_code == 304
+    assert client.get(path, headers={"If-Modified-Since": "not a date"}).status_code == 200
+
+
+def test_if_none_match_takes_precedence(client, data):
+    path = f"/businesses/{data.businesses[1].business_id}"
+    last_modified = client.get(path).headers["Last-Modified"]
+
+    response = client.get(path, headers={"If-None-Match": 'W/"other"', "If-Modified-Since": later(last_modified, 60)})
+    assert response.status_code == 200
+
+
+def test_missing_business_is_not_found(client, data):
+    response = client.get("/businesses/999999", headers={"If-None-Match": "*"})
+    assert response.status_code == 404
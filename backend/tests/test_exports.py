@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+
+def export(client, data, name: str, **params) -> list[dict]:
+    response = client.get(f"/exports/{name}", params=params, headers=data.headers(data.admin))
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_interrupted_exports_resume_after_the_last_row(client, data):
+    # Two votes on a review, then one on a later review
+    for review, user in [(data.reviews[2], data.users[0]), (data.reviews[2], data.users[1]), (data.reviews[4], data.users[0])]:
+        response = client.post("/vote/", json={"review_id": review.review_id, "direction": 1}, headers=data.headers(user))
+        assert response.status_code == 201
+
+    votes = export(client, data, "votes")
+    assert len(votes) == 4
+    for position, last in enumerate(votes):
+        resumed = export(client, data, "votes", after_id=last["review_id"], after_user_id=last["user_id"])
+        assert resumed == votes[position + 1:]
+
+    reviews = export(client, data, "reviews")
+    assert export(client, data, "reviews", after_id=reviews[2]["review_id"]) == reviews[3:]
+
+
+@pytest.mark.parametrize("name, params", [
+    ("votes", {"after_id": 1}),
+    ("votes", {"after_user_id": 1}),
+    ("reviews", {"after_id": 1, "after_user_id": 1}),
+])
+def test_resume_values_must_match_the_keys(client, data, name, params):
+    response = client.get(f"/exports/{name}", params=params, headers=data.headers(data.admin))
+    assert response.status_code == 400
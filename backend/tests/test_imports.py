@@ -0,0 +1,50 @@
+import json
+
+
+def import_file(client, data, kind: str, name: str, content: str) -> dict:
+    response = client.post(f"/imports/{kind}", files={"file": (name, content.encode())},
+                           headers=data.headers(data.admin))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_invalid_rows_are_rejected_the_others_imported(client, data):
+    business = data.businesses[0]
+    user = data.users[0]
+    review = {"rating": 4, "review_title": "Title", "review_text": "Text", "user_id": user.user_id,
+              "business_id": business.business_id}
+    rows = [
+        review,
+        {**review, "rating": 7},
+        {**review, "business_id": 999999},
+        {**review, "user_id": 999999},
+        {**review, "review_text": "Te\x00xt"},
+        review,
+    ]
+    content = "\n".join(json.dumps(row) for row in rows) + "\nnot json\n"
+
+    report = import_file(client, data, "reviews", "reviews.ndjson", content)
+    assert (report["received"], report["imported"], report["rejected"]) == (7, 2, 5)
+    errors = {error["line"]: error["error"] for error in report["errors"]}
+    assert sorted(errors) == [2, 3, 4, 5, 7]
+    assert errors[3] == "Business 999999 not found"
+    assert errors[4] == "User 999999 not found"
+    assert errors[5] == "review_text: NUL characters aren't allowed"
+
+    page = client.get(f"/businesses/{business.business_id}").json()
+    assert page["reviews_count"] == 2
+
+
+def test_csv_businesses_with_nul_characters_are_rejected(client, data):
+    category_id = data.categories[0].category_id
+    content = (
+        "name,location,logo,category_id\n"
+        f"Imported,Paris,logo.png,{category_id}\n"
+        f"Nul\x00,Paris,logo.png,{category_id}\n"
+        f"Nul location,Par\x00is,logo.png,{category_id}\n"
+    )
+    report = import_file(client, data, "businesses", "businesses.csv", content)
+    assert (report["imported"], report["rejected"]) == (1, 2)
+    assert [error["error"] for error in report["errors"]] == [
+        "name: NUL characters aren't allowed", "location: NUL characters aren't allowed",
+    ]
@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlmodel import Session, select
+
+from app import models
+from app.core.database import engine
+from app.services import leaderboards
+from app.services.leaderboards import mark_leaderboards_stale, refresh_leaderboards
+
+
+@pytest.fixture
+def refresh(client):
+    """Refreshes the stale leaderboards like the periodic task, returns the categories rebuilt"""
+    def refreshing() -> list[int]:
+        with Session(engine) as session:
+            return refresh_leaderboards(session)
+    return refreshing
+
+
+def entries(category_id: int) -> dict[int, models.LeaderboardEntry]:
+    with Session(engine) as session:
+        rows = session.exec(select(models.LeaderboardEntry).where(models.LeaderboardEntry.category_id == category_id))
+        return {entry.business_id: entry for entry in rows}
+
+
+def test_only_the_marked_categories_are_rebuilt(client, data, refresh):
+    categories = [category.category_id for category in data.categories]
+    # Marked by the aggregates of the fixture
+    assert refresh() == categories
+    assert refresh() == []
+
+    business = data.businesses[1]
+    response = client.post(f"/reviews/{business.business_id}", headers=data.headers(data.admin),
+                           json={"rating": 5, "review_title": "New", "review_text": "Text"})
+    assert response.status_code == 200
+    assert refresh() == [business.category_id]
+    assert entries(business.category_id)[business.business_id].review_count == business.review_count + 1
+
+
+def test_moved_and_deleted_businesses_leave_the_leaderboards(client, data, refresh):
+    refresh()
+    moved, deleted = data.businesses[1], data.businesses[4]
+    target = data.categories[0].category_id
+    assert moved.business_id in entries(moved.category_id) and deleted.business_id in entries(deleted.category_id)
+
+    headers = data.headers(data.admin)
+    assert client.patch(f"/businesses/{moved.business_id}", json={"category_id": target},
+                        headers=headers).status_code == 200
+    assert client.delete(f"/businesses/{deleted.business_id}", headers=headers).status_code == 204
+
+    assert refresh() == sorted({moved.category_id, deleted.category_id, target})
+    assert moved.business_id not in entries(moved.category_id)
+    assert moved.business_id in entries(target)
+    assert deleted.business_id not in entries(deleted.category_id)
+
+    # Fields the leaderboards don't show leave them alone
+    assert client.patch(f"/businesses/{moved.business_id}", json={"description": "New"},
+                        headers=headers).status_code == 200
+    assert refresh() == []
+
+
+def test_marks_of_running_transactions_wait_for_their_commit(client, data, refresh):
+    refresh()
+    business = data.businesses[1]
+
+    with Session(engine) as writer:
+        mark_leaderboards_stale(writer, [business.business_id])
+        # Not committed yet: the refresh can't see the write, nor take its mark
+        assert refresh() == []
+        writer.commit()
+
+    assert refresh() == [business.category_id]
+
+
+def review(client, data, business, user):
+    return client.post(f"/reviews/{business.business_id}", headers=data.headers(user),
+                       json={"rating": 5, "review_title": "New", "review_text": "Text"})
+
+
+def test_writes_dont_wait_for_a_running_refresh(client, data, refresh, monkeypatch):
+    refresh()
+    business, other = data.businesses[1], data.businesses[4]
+    assert business.category_id == other.category_id
+    assert review(client, data, business, data.admin).status_code == 200
+
+    responses = []
+    rebuild = leaderboards.rebuild_leaderboards
+
+    def rebuilding(session, category_ids):
+        rebuild(session, category_ids)
+        # Rebuilt, not committed yet: a rating change on the business marked for it and a
+        # review of another business of the category
+        writes = [
+            executor.submit(client.patch, f"/reviews/{data.reviews[0].review_id}", json={"rating": 1},
+                            headers=data.headers(data.users[0])),
+            executor.submit(review, client, data, other, data.admin),
+        ]
+        responses.extend(write.result(timeout=5) for write in writes)
+
+    monkeypatch.setattr(leaderboards, "rebuild_leaderboards", rebuilding)
+    # Shut down once the refresh is over: a write that timed out waits for its rollback
+    with ThreadPoolExecutor(1) as executor:
+        assert refresh() == [business.category_id]
+    assert [response.status_code for response in responses] == [200, 200]
+
+    # Marked again for the next refresh
+    monkeypatch.setattr(leaderboards, "rebuild_leaderboards", rebuild)
+    assert refresh() == [business.category_id]
+    assert entries(business.category_id)[other.business_id].review_count == other.review_count + 1
+
+
+def test_marks_of_a_failed_rebuild_are_put_back(client, data, refresh, monkeypatch):
+    def failing(session, category_ids):
+        raise RuntimeError("Rebuild failed")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(leaderboards, "rebuild_leaderboards", failing)
+        with pytest.raises(RuntimeError):
+            refresh()
+
+    categories = [category.category_id for category in data.categories]
+    assert refresh() == categories
@@ -0,0 +1,47 @@
+import pytest
+
+
+def listing_paths(data) -> list[str]:
+    business = data.businesses[1].business_id
+    category = data.categories[0].category_id
+    return [
+        "/businesses/",
+        "/businesses/?sort=rating&min_rating=1",
+        "/businesses/?search=business",
+        f"/businesses/category/{category}",
+        f"/businesses/category/{category}?sort=reviews&has_website=false",
+        f"/reviews/{business}",
+        f"/review-replies/business/{business}",
+    ]
+
+
+@pytest.mark.parametrize("index", range(7))
+def test_listing_statements_dont_grow_with_the_page(client, data, count_statements, index):
+    path = listing_paths(data)[index]
+    separator = "&" if "?" in path else "?"
+
+    # Lookups made once per process (e.g. whether pg_trgm is installed) happen here
+    client.get(f"{path}{separator}limit=1&warm=up")
+
+    counts = []
+    for limit in (1, 2, 20):
+        with count_statements() as statements:
+            response = client.get(f"{path}{separator}limit={limit}")
+        assert response.status_code == 200, response.text
+        assert 0 < len(response.json()) <= limit
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1] == counts[2], counts
+    # The rows and, for the business pages, the revision lookup
+    assert counts[0] <= 3, counts
+
+
+def test_listing_returns_review_counts_and_categories(client, data):
+    listing = client.get("/businesses/?limit=25").json()
+
+    by_id = {entry["business"]["business_id"]: entry for entry in listing}
+    for business in data.businesses:
+        entry = by_id[business.business_id]
+        assert entry["reviews_count"] == business.review_count
+        assert entry["business"]["category"]["name"] == f"Category {data.businesses.index(business) % 3}"
+    assert [entry["business"]["name"] for entry in listing] == sorted(entry["business"]["name"] for entry in listing)
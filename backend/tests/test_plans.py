@@ -0,0 +1,60 @@
+"""The listings read their pages in index order, whatever the sort and filters: planned
+with sequential scans and sorts disabled (see services/index_advisor.py), a plan still
+holding one has no index to use. The search paths rank by relevance and are left out."""
+import asyncio
+
+import pytest
+from sqlmodel import Session, SQLModel
+
+from app import models
+from app.core.database import engine
+from app.schemas import UserRole
+from app.services.index_advisor import (
+    HOT_PATHS,
+    SMALL_TABLES,
+    capture_statements,
+    explain_statements,
+    full_scans,
+    limit_sorts,
+)
+
+LISTING_PATHS = [(path, role) for path, role in HOT_PATHS if "limit=" in path and "search" not in path]
+DISABLED = ("seqscan", "sort")
+
+
+def plans_of(client, url: str, headers: dict) -> list[tuple[str, dict]]:
+    # A first page and the next one, which goes through the keyset condition
+    with capture_statements() as statements:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.text
+        next_cursor = response.headers.get("X-Next-Cursor")
+        assert next_cursor, url
+        assert client.get(f"{url}&cursor={next_cursor}", headers=headers).status_code == 200
+    return asyncio.run(explain_statements(statements, DISABLED))
+
+
+@pytest.mark.parametrize("path, role", LISTING_PATHS, ids=[path for path, _ in LISTING_PATHS])
+def test_listing_pages_are_read_in_index_order(client, data, path, role):
+    users = {UserRole.ADMIN: data.admin, UserRole.SUPERVISOR: data.supervisor}
+    headers = data.headers(users[role]) if role else {}
+    # Reviewed, and supervised for the supervisor's listing
+    business = data.businesses[1]
+    with Session(engine) as session:
+        session.get(models.Business, data.businesses[0].business_id).supervisor_id = None
+        session.flush()
+        session.get(models.Business, business.business_id).supervisor_id = data.supervisor.user_id
+        session.commit()
+    # Small pages, every listing has a second one
+    url = path.format(business_id=business.business_id, category_id=business.category_id).replace("limit=20", "limit=1")
+
+    tables = set(SQLModel.metadata.tables) - SMALL_TABLES
+    for statement, plan in plans_of(client, url, headers):
+        scans = [(relation, scan) for relation, scan in full_scans(plan) if relation in tables]
+        assert scans == [], statement
+        assert limit_sorts(plan) == [], statement
+
+
+def test_unindexed_orders_are_caught(data):
+    statements = [("SELECT * FROM businesses ORDER BY description LIMIT 5", ())]
+    [(_, plan)] = asyncio.run(explain_statements(statements, DISABLED))
+    assert limit_sorts(plan) == ["description"]
@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.mark.parametrize("update", [{"rating": 7}, {"rating": 0}, {"rating": None}, {"review_text": None}])
+def test_invalid_updates_are_rejected(client, data, update):
+    review = data.reviews[0]
+    business_path = f"/businesses/{review.business_id}"
+    before = client.get(business_path).json()
+
+    response = client.patch(f"/reviews/{review.review_id}", json=update, headers=data.headers(data.users[0]))
+    assert response.status_code == 422
+    assert client.get(business_path).json() == before
+
+
+def test_rating_updates_move_the_aggregates(client, data):
+    # Rated 2 and 3 by the two reviewers of the business
+    review = data.reviews[0]
+    response = client.patch(f"/reviews/{review.review_id}", json={"rating": 5}, headers=data.headers(data.users[0]))
+    assert response.status_code == 200 and response.json()["rating"] == 5
+    assert client.get(f"/businesses/{review.business_id}").json()["business"]["average_rating"] == 4.0
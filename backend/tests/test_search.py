@@ -0,0 +1,46 @@
+import pytest
+from sqlmodel import Session
+
+from app.core.database import engine
+from app.services.search import trigrams_installed
+
+
+def names(response) -> list[str]:
+    assert response.status_code == 200, response.text
+    return [entry["business"]["name"] for entry in response.json()]
+
+
+def test_listing_search_goes_through_the_ranked_search(client, data):
+    found = names(client.get("/businesses/?search=business 1"))
+    assert sorted(found) == [f"Business {i}" for i in range(10, 20)]
+
+    # The filters of the listings still apply
+    with_website = names(client.get("/businesses/?search=business 1&has_website=true"))
+    assert sorted(with_website) == [f"Business {i}" for i in range(11, 20, 2)]
+
+
+def test_search_matches_words_prefixes_and_categories(client, data):
+    assert names(client.get("/businesses/search/?name=busi 07")) == ["Business 07"]
+    # Every business of "Category 2" matches through its category
+    category = names(client.get("/businesses/search/?name=category 2&limit=100"))
+    assert sorted(category) == [f"Business {i:02}" for i in range(2, 25, 3)]
+    assert client.get("/businesses/search/?name=nothing like it").status_code == 404
+
+
+def test_search_tolerates_typos_with_pg_trgm(client, data):
+    with Session(engine) as session:
+        if not trigrams_installed(session):
+            pytest.skip("pg_trgm isn't installed on this server")
+    assert "Business 07" in names(client.get("/businesses/search/?name=busines 07"))
+
+
+def test_autocomplete_ranks_the_name_prefixes(client, data):
+    response = client.get("/businesses/autocomplete/?q=business 2&limit=5")
+    assert response.status_code == 200
+    suggestions = [suggestion["name"] for suggestion in response.json()]
+    assert len(suggestions) == 5
+    # Names starting with the text come first
+    assert all(name.lower().startswith("business 2") for name in suggestions)
+
+    # A single letter gets no suggestions
+    assert client.get("/businesses/autocomplete/?q=b").json() == []
@@ -0,0 +1,16 @@
+import subprocess
+import sys
+
+from benchmarks.startup import BACKEND_DIRECTORY, DEFERRED
+
+
+def test_a_worker_boots_without_the_deferred_packages():
+    # In a fresh interpreter, the tests imported them already
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, app.main; print('\\n'.join(sys.modules))"],
+        cwd=BACKEND_DIRECTORY, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    imported = {name.split(".")[0] for name in result.stdout.split()}
+    assert sorted(imported & DEFERRED.keys()) == []
@@ -0,0 +1,64 @@
+from sqlmodel import Session, select
+
+from app import models
+from app.core.database import engine
+from app.services.rollups import STAT_COLUMNS, actual_daily_stats_query, rebuild_daily_stats
+
+
+def stored_stats(session: Session) -> set[tuple]:
+    rows = session.exec(select(models.BusinessDailyStats)).all()
+    return {
+        (row.business_id, row.day, *[getattr(row, column) for column in STAT_COLUMNS])
+        for row in rows if any(getattr(row, column) for column in STAT_COLUMNS)
+    }
+
+
+def assert_stats_match_a_rebuild(data):
+    business_ids = [business.business_id for business in data.businesses]
+    with Session(engine) as session:
+        actual = {tuple(row) for row in session.exec(actual_daily_stats_query(business_ids))}
+        assert stored_stats(session) == actual
+
+        # Rebuilding doesn't change anything, whatever the vote flush has pending
+        rebuild_daily_stats(session, business_ids)
+        assert stored_stats(session) == actual
+        session.rollback()
+
+
+def vote(client, data, review, direction: int, user=None):
+    return client.post("/vote/", json={"review_id": review.review_id, "direction": direction},
+                       headers=data.headers(user or data.users[0]))
+
+
+def test_votes_are_counted_in_their_transaction(client, data, flush_votes):
+    review = data.reviews[2]
+    path = f"/stats/businesses/{review.business_id}"
+    before = client.get(path, headers=data.headers(data.admin)).json()["totals"]["vote_count"]
+
+    assert vote(client, data, review, 1).status_code == 201
+    # Before any flush
+    assert client.get(path, headers=data.headers(data.admin)).json()["totals"]["vote_count"] == before + 1
+    assert_stats_match_a_rebuild(data)
+
+    assert vote(client, data, review, 0).status_code == 201
+    assert client.get(path, headers=data.headers(data.admin)).json()["totals"]["vote_count"] == before
+    flush_votes()
+    assert_stats_match_a_rebuild(data)
+
+
+def test_votes_of_deleted_reviews_and_users_leave_the_stats(client, data):
+    admin = data.headers(data.admin)
+    assert vote(client, data, data.reviews[2], 1).status_code == 201
+    assert vote(client, data, data.reviews[4], 1, user=data.users[1]).status_code == 201
+
+    assert client.delete(f"/reviews/{data.reviews[2].review_id}", headers=admin).status_code == 204
+    assert_stats_match_a_rebuild(data)
+    # Their reviews go with the votes on them, reviews[0] and reviews[4] have one each
+    assert client.delete(f"/users/{data.users[0].user_id}", headers=admin).status_code == 204
+    assert_stats_match_a_rebuild(data)
+
+
+def test_votes_on_missing_reviews(client, data):
+    assert vote(client, data, models.Review(review_id=999999), 1).status_code == 404
+    assert vote(client, data, data.reviews[2], 0).status_code == 404
+    assert vote(client, data, data.reviews[0], 1, user=data.users[1]).status_code == 409
@@ -0,0 +1,40 @@
+from sqlmodel import Session
+
+from app.core.database import engine
+from app.services.aggregates import reconcile_business_aggregates
+from app.services.votes import reconcile_vote_counts
+
+
+def votes_of(client, review) -> int:
+    reviews = client.get(f"/reviews/{review.business_id}").json()
+    return next(entry["votes_count"] for entry in reviews if entry["Review"]["review_id"] == review.review_id)
+
+
+def test_deleting_a_voter_takes_their_votes_off_the_reviews(client, data):
+    review = data.reviews[0]
+    assert votes_of(client, review) == 1
+
+    response = client.delete(f"/users/{data.users[1].user_id}", headers=data.headers(data.admin))
+    assert response.status_code == 204
+
+    # Without waiting for a vote flush
+    assert votes_of(client, review) == 0
+    with Session(engine) as session:
+        assert reconcile_vote_counts(session) == []
+        assert reconcile_business_aggregates(session) == []
+
+
+def test_deleting_a_reviewer_takes_their_reviews_out(client, data):
+    business = data.businesses[1]
+    response = client.delete(f"/users/{data.users[0].user_id}", headers=data.headers(data.admin))
+    assert response.status_code == 204
+
+    page = client.get(f"/businesses/{business.business_id}").json()
+    assert page["reviews_count"] == business.review_count - 1
+    with Session(engine) as session:
+        assert reconcile_business_aggregates(session) == []
+
+
+def test_admins_cant_delete_themselves(client, data):
+    response = client.delete(f"/users/{data.admin.user_id}", headers=data.headers(data.admin))
+    assert response.status_code == 400
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlmodel import Session
+
+from app import models
+from app.core.database import engine
+from app.services.votes import apply_vote_deltas, reconcile_vote_counts
+
+
+def vote(client, data, review, direction: int, user):
+    return client.post("/vote/", json={"review_id": review.review_id, "direction": direction},
+                       headers=data.headers(user))
+
+
+def stored_votes(review) -> int:
+    with Session(engine) as session:
+        return session.get(models.Review, review.review_id).votes_count
+
+
+def test_flushes_add_the_net_change_of_the_votes(client, data, flush_votes):
+    review = data.reviews[2]
+    assert vote(client, data, review, 1, data.users[0]).status_code == 201
+    assert vote(client, data, review, 1, data.users[1]).status_code == 201
+    assert vote(client, data, review, 0, data.users[0]).status_code == 201
+    assert stored_votes(review) == 0
+
+    flush_votes()
+    assert stored_votes(review) == 1
+    with Session(engine) as session:
+        assert reconcile_vote_counts(session) == []
+
+        # Added to the stored count, the votes aren't counted again
+        session.get(models.Review, review.review_id).votes_count = 10
+        session.commit()
+    assert vote(client, data, review, 1, data.users[0]).status_code == 201
+    flush_votes()
+    assert stored_votes(review) == 11
+
+
+def test_votes_dont_wait_for_a_running_flush(client, data):
+    review = data.reviews[2]
+    with Session(engine) as flush, ThreadPoolExecutor(1) as executor:
+        # Locked and updated, not committed yet
+        apply_vote_deltas(flush, {review.review_id: 1})
+        voting = executor.submit(vote, client, data, review, 1, data.users[0])
+        try:
+            assert voting.result(timeout=5).status_code == 201
+        finally:
+            flush.rollback()
@@ -69,18 +69,28 @@ export default function BusinessPage() {
     setFetchLoading(true);
     setError(null);
     try {
-      const response = await fetch("http://127.0.0.1:8000/businesses");
-      if (!response.ok) {
-        const errorData = await response.json();
-        throw new Error(
-          errorData.detail || `HTTP error! status: ${response.status}`
-        );
-      }
-      // Get the data in the new format (BusinessWithReviewCount[])
-      const responseData = await response.json();
+      // Every business by name, sorted by the API a page at a time: follow
+      // X-Next-Cursor until the last one
+      const businesses: BusinessWithReviewCount[] = [];
+      let cursor: string | null = null;
+      do {
+        const params = new URLSearchParams({ sort: "name", limit: "100" });
+        if (cursor) params.set("cursor", cursor);
+        const response = await fetch(`http://127.0.0.1:8000/businesses/?${params}`);
+        if (!response.ok) {
+          const errorData = await response.json();
+          throw new Error(
+            errorData.detail || `HTTP error! status: ${response.status}`
+          );
+        }
+        // Get the data in the new format (BusinessWithReviewCount[])
+        const page: BusinessWithReviewCount[] = await response.json();
+        businesses.push(...page);
+        cursor = response.headers.get("X-Next-Cursor");
+      } while (cursor);
 
       // Set the data directly - we'll handle the nested structure in the UI
-      setBusinessesData(responseData);
+      setBusinessesData(businesses);
     } catch (e: any) {
       console.error("Failed to fetch Businesses:", e);
       setError(e.message);
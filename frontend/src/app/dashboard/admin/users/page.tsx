@@ -80,20 +80,29 @@ export default function UsersPage() {
       if (!token) {
         throw new Error("Authentication token not found. Please log in.");
       }
-      const response = await fetch("http://127.0.0.1:8000/users", {
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
-        },
-      });
-      if (!response.ok) {
-        const errorData = await response.json();
-        throw new Error(
-          errorData.detail || `HTTP error! status: ${response.status}`
-        );
-      }
-      const data: User[] = await response.json();
-      setUsersData(data);
+      // The API returns a page at a time, follow X-Next-Cursor until the last one
+      const users: User[] = [];
+      let cursor: string | null = null;
+      do {
+        const params = new URLSearchParams({ limit: "1000" });
+        if (cursor) params.set("cursor", cursor);
+        const response = await fetch(`http://127.0.0.1:8000/users/?${params}`, {
+          headers: {
+            "Content-Type": "application/json",
+            Authorization: `Bearer ${token}`,
+          },
+        });
+        if (!response.ok) {
+          const errorData = await response.json();
+          throw new Error(
+            errorData.detail || `HTTP error! status: ${response.status}`
+          );
+        }
+        const page: User[] = await response.json();
+        users.push(...page);
+        cursor = response.headers.get("X-Next-Cursor");
+      } while (cursor);
+      setUsersData(users);
     } catch (e: any) {
       console.error("Failed to fetch users:", e);
       setError(e.message);
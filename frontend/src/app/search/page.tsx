@@ -7,7 +7,13 @@ import BusinessesGrid from "@/components/custom/seach-page/businesses-grid";
 export default function SearchResultsPage() {
   const searchParams = useSearchParams();
   const query = searchParams.get("query");
-  const { businesses, loading } = useBusinessesBySearch(query);
+  // Optional filters of the URL, applied by the API
+  const categoryId = searchParams.get("category_id");
+  const minRating = searchParams.get("min_rating");
+  const { businesses, loading } = useBusinessesBySearch(query, {
+    category_id: categoryId ? Number(categoryId) : undefined,
+    min_rating: minRating ? Number(minRating) : undefined,
+  });
 
   if (loading) return <p>Loading...</p>;
 
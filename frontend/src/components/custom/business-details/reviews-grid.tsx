@@ -84,7 +84,7 @@ export default function ReviewsGrid(props: ReviewsGridProps) {
       if (token && user) {
         try {
           const votesResponse = await fetch(
-            `http://127.0.0.1:8000/user-votes?user_id=${user.user_id}`,
+            `http://127.0.0.1:8000/vote/me?business_id=${props.business.business_id}`,
             {
               headers: {
                 "Authorization": `Bearer ${token}`
@@ -1,13 +1,17 @@
 import { useState, useEffect } from "react";
 import {
   Business,
+  BusinessListingParams,
   BusinessWithReviewCount,
+  BUSINESS_PAGE_SIZE,
   getBusinessesByCategory,
   getAllBusinesses,
   extractBusiness
 } from "@/services/businesses";
 
-export function useBusinessesByCategory(categoryId: number | null) {
+// Best rated first unless another sort is asked for, one page sorted and filtered by the API
+export function useBusinessesByCategory(categoryId: number | null, params: BusinessListingParams = {}) {
+  const { sort = "rating", limit = BUSINESS_PAGE_SIZE, min_rating, has_website } = params;
   const [businesses, setBusinesses] = useState<BusinessWithReviewCount[]>([]);
   const [loading, setLoading] = useState(false);
 
@@ -20,7 +24,7 @@ export function useBusinessesByCategory(categoryId: number | null) {
     const fetchBusinesses = async () => {
       setLoading(true);
       try {
-        const data = await getBusinessesByCategory(categoryId);
+        const data = await getBusinessesByCategory(categoryId, { sort, limit, min_rating, has_website });
         setBusinesses(data);
       } catch (err) {
         console.error("Failed to fetch businesses:", err);
@@ -30,12 +34,17 @@ export function useBusinessesByCategory(categoryId: number | null) {
     };
 
     fetchBusinesses();
-  }, [categoryId]);
+  }, [categoryId, sort, limit, min_rating, has_website]);
 
   return { businesses, loading };
 }
 
-export function useBusinessesBySearch(query: string | null) {
+// Best matches first, the API ranks the results of a search
+export function useBusinessesBySearch(
+  query: string | null,
+  params: { category_id?: number; min_rating?: number; limit?: number } = {}
+) {
+  const { category_id, min_rating, limit = BUSINESS_PAGE_SIZE } = params;
   const [businesses, setBusinesses] = useState<BusinessWithReviewCount[]>([]);
   const [loading, setLoading] = useState(false);
   
@@ -48,7 +57,7 @@ export function useBusinessesBySearch(query: string | null) {
     const fetchBusinesses = async () => {
       setLoading(true);
       try {
-        const data = await getAllBusinesses({ search: query });
+        const data = await getAllBusinesses({ search: query, category_id, min_rating, limit });
         setBusinesses(data);
       } catch (err) {
         console.error("Failed to fetch businesses:", err);
@@ -58,7 +67,7 @@ export function useBusinessesBySearch(query: string | null) {
     };
     
     fetchBusinesses();
-  }, [query]);
+  }, [query, category_id, min_rating, limit]);
   
   return { businesses, loading };
 }
@@ -23,16 +23,30 @@ export interface BusinessWithReviewCount {
   reviews_count: number;
 }
 
-export const getAllBusinesses = async (params?: {
+// Orders and filters applied by the API, so pages come back already sorted
+export type BusinessSort = "name" | "rating" | "reviews" | "newest";
+
+// Businesses shown per page of the grids, the API's own default is 100
+export const BUSINESS_PAGE_SIZE = 12;
+
+export interface BusinessListingParams {
   limit?: number;
   offset?: number;
+  cursor?: string;
+  sort?: BusinessSort;
+  min_rating?: number;
+  has_website?: boolean;
+}
+
+export const getAllBusinesses = async (params?: BusinessListingParams & {
   search?: string;
+  category_id?: number;
 }): Promise<BusinessWithReviewCount[]> => apiClient.get("/businesses", { params });
 
 
 export const getBusinessesByCategory = async (
   categoryId: number | null,
-  params?: { limit?: number; offset?: number }
+  params?: BusinessListingParams
 ): Promise<BusinessWithReviewCount[]> => {
   if (categoryId === null) {
     return Promise.resolve([]);
@@ -0,0 +1,33 @@
+import apiClient from "@/lib/api-client";
+
+export type StatsInterval = "day" | "week" | "month";
+
+export interface StatsPoint {
+  start: string;
+  review_count: number;
+  rating_sum: number;
+  rating_1_count: number;
+  rating_2_count: number;
+  rating_3_count: number;
+  rating_4_count: number;
+  rating_5_count: number;
+  replied_count: number;
+  vote_count: number;
+  average_rating: number | null;
+  reply_rate: number | null;
+}
+
+export interface BusinessTrend {
+  business_id: number;
+  start: string;
+  end: string;
+  interval: StatsInterval;
+  totals: StatsPoint;
+  points: StatsPoint[];
+}
+
+// Dates as YYYY-MM-DD (UTC days), the last 30 days when omitted. Admins and the business's supervisor only
+export const getBusinessTrend = async (
+  businessId: number | string,
+  params?: { start?: string; end?: string; interval?: StatsInterval }
+): Promise<BusinessTrend> => apiClient.get(`/stats/businesses/${businessId}`, { params });